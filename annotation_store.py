@@ -0,0 +1,211 @@
+import os
+import json
+import math
+import shutil
+import numpy as np
+from obspy import Stream, Trace, UTCDateTime
+
+"""
+Almacén persistente de anotaciones (probabilidades de los modelos) y formas de onda por archivo.
+
+Al terminar `process_file` solo quedaban los PNG y los CSV con los picks que superan los umbrales;
+cualquier análisis posterior (otros umbrales, otra duración de ventana para los gráficos) obligaba
+a ejecutar los modelos de nuevo. Este almacén guarda cada traza como un archivo `.npy` independiente,
+que se puede abrir con `np.load(..., mmap_mode='r')` para leer un intervalo de tiempo sin cargar el
+día completo en memoria, junto con un índice JSON con el inicio, la frecuencia de muestreo y el
+número de muestras de cada traza.
+
+Estructura en disco:
+    <carpeta>/index.json
+    <carpeta>/<banda>/<tipo>/<red.estación.loc.canal>[_<n>].npy
+
+donde `<tipo>` es el nombre del modelo ("PhaseNet", "EQTransformer", "GPD") o "waveform".
+"""
+
+# Nombre de la carpeta del almacén dentro de la carpeta de resultados de cada archivo.
+ANNOTATION_STORE_FOLDER = "anotaciones"
+# Tipo usado para las formas de onda (original y filtradas).
+WAVEFORM_KIND = "waveform"
+# Correspondencia entre las claves de `process_stream_with_models` y los nombres de los modelos.
+PREDICTION_KINDS = {
+    "pn_preds": "PhaseNet",
+    "eqt_preds": "EQTransformer",
+    "gpd_preds": "GPD"
+}
+
+
+class AnnotationStore:
+    """
+    Lectura y escritura del almacén de anotaciones de un archivo procesado.
+
+    Las trazas leídas son vistas de solo lectura sobre archivos mapeados en memoria: el sistema
+    operativo carga únicamente las páginas del intervalo pedido. Si se necesita modificar los datos
+    (por ejemplo, filtrarlos), hay que copiarlos antes (`trace.copy()` o `trace.data.copy()`).
+    """
+
+    def __init__(self, store_dir, waveforms=False):
+        """
+        Args:
+            store_dir (str): Carpeta del almacén.
+            waveforms (bool, optional): Si es True, `write_band` también guarda la forma de onda de
+                cada banda (la original con su tipo de dato, las filtradas en float32). Por defecto False.
+        """
+        self.store_dir = store_dir
+        self.waveforms = waveforms
+        self.index_path = os.path.join(store_dir, "index.json")
+        self._index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Advertencia: índice de anotaciones ilegible en {self.index_path}: {e}")
+        return {'traces': {}, 'metadata': {}}
+
+    def _save_index(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def exists(self):
+        """Indica si el almacén contiene alguna traza."""
+        return bool(self._index['traces'])
+
+    def clear(self):
+        """Elimina todo el contenido del almacén (se usa antes de reprocesar un archivo)."""
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        self._index = {'traces': {}, 'metadata': {}}
+
+    def get_metadata(self, key, default=None):
+        """Lee un valor de los metadatos del almacén (por ejemplo, los umbrales usados)."""
+        return self._index.get('metadata', {}).get(key, default)
+
+    def set_metadata(self, key, value):
+        """Guarda un valor serializable en JSON en los metadatos del almacén."""
+        self._index.setdefault('metadata', {})[key] = value
+        self._save_index()
+
+    def write_stream(self, band, kind, stream, dtype=None):
+        """
+        Guarda cada traza de `stream` como un `.npy` y la registra en el índice.
+
+        Args:
+            band (str): Tipo de filtro ("original", "0.5-2Hz", ...).
+            kind (str): Nombre del modelo o `WAVEFORM_KIND`.
+            stream (obspy.core.stream.Stream): Trazas a guardar.
+            dtype (numpy.dtype, optional): Tipo de dato en disco. Por defecto, el de cada traza.
+        """
+        # Reemplaza lo que hubiera de esta banda y tipo.
+        for key in [k for k, e in self._index['traces'].items() if e['band'] == band and e['kind'] == kind]:
+            del self._index['traces'][key]
+        folder = os.path.join(self.store_dir, band, kind)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+
+        for tr in sorted(stream, key=lambda t: (t.id, t.stats.starttime)):
+            # Una misma traza puede aparecer en varios segmentos si el archivo tiene huecos.
+            name = tr.id
+            n = 1
+            while f"{band}/{kind}/{name}" in self._index['traces']:
+                name = f"{tr.id}_{n}"
+                n += 1
+            rel_path = os.path.join(band, kind, f"{name}.npy")
+            data = np.ascontiguousarray(tr.data, dtype=dtype)
+            np.save(os.path.join(self.store_dir, rel_path), data)
+            self._index['traces'][f"{band}/{kind}/{name}"] = {
+                'band': band,
+                'kind': kind,
+                'network': tr.stats.network,
+                'station': tr.stats.station,
+                'location': tr.stats.location,
+                'channel': tr.stats.channel,
+                'start_ns': tr.stats.starttime.ns,
+                'sampling_rate': float(tr.stats.sampling_rate),
+                'npts': int(len(data)),
+                'dtype': str(data.dtype),
+                'file': rel_path
+            }
+        self._save_index()
+
+    def write_band(self, band, predictions, waveform=None):
+        """
+        Guarda las anotaciones de los tres modelos para una banda y, si el almacén se creó con
+        `waveforms=True`, también la forma de onda de esa banda.
+
+        Args:
+            band (str): Tipo de filtro.
+            predictions (dict): Salida de `process_stream_with_models`.
+            waveform (obspy.core.stream.Stream, optional): Stream (original o filtrado) de la banda.
+        """
+        for pred_key, stream in predictions.items():
+            self.write_stream(band, PREDICTION_KINDS.get(pred_key, pred_key), stream, dtype=np.float32)
+        if self.waveforms and waveform is not None:
+            dtype = None if band == "original" else np.float32
+            self.write_stream(band, WAVEFORM_KIND, waveform, dtype=dtype)
+
+    def entries(self, band=None, kind=None):
+        """Retorna las entradas del índice, opcionalmente filtradas por banda y tipo."""
+        return [e for e in self._index['traces'].values()
+                if (band is None or e['band'] == band) and (kind is None or e['kind'] == kind)]
+
+    def bands(self):
+        """Bandas presentes en el almacén."""
+        return sorted({e['band'] for e in self._index['traces'].values()})
+
+    def time_range(self):
+        """
+        Returns:
+            tuple: (inicio, fin) como `UTCDateTime` cubriendo todas las trazas, o (None, None) si está vacío.
+        """
+        entries = list(self._index['traces'].values())
+        if not entries:
+            return None, None
+        start_ns = min(e['start_ns'] for e in entries)
+        end_ns = max(e['start_ns'] + round((e['npts'] - 1) * 1e9 / e['sampling_rate']) for e in entries)
+        return UTCDateTime(ns=start_ns), UTCDateTime(ns=end_ns)
+
+    def read(self, band, kind, starttime=None, endtime=None):
+        """
+        Lee un intervalo de tiempo de las trazas de una banda y tipo sin cargar el resto del archivo.
+
+        Args:
+            band (str): Tipo de filtro.
+            kind (str): Nombre del modelo o `WAVEFORM_KIND`.
+            starttime (obspy.core.utcdatetime.UTCDateTime, optional): Inicio del intervalo.
+            endtime (obspy.core.utcdatetime.UTCDateTime, optional): Fin del intervalo (incluido).
+
+        Returns:
+            obspy.core.stream.Stream: Trazas con datos mapeados en memoria (solo lectura).
+        """
+        stream = Stream()
+        for entry in self.entries(band, kind):
+            sr = entry['sampling_rate']
+            start_ns = entry['start_ns']
+            i0, i1 = 0, entry['npts']
+            if starttime is not None:
+                i0 = max(0, math.ceil((starttime.ns - start_ns) * sr / 1e9 - 1e-6))
+            if endtime is not None:
+                i1 = min(i1, math.floor((endtime.ns - start_ns) * sr / 1e9 + 1e-6) + 1)
+            if i1 <= i0:
+                continue
+            data = np.load(os.path.join(self.store_dir, entry['file']), mmap_mode='r')
+            stream += Trace(data=data[i0:i1], header={
+                'network': entry['network'],
+                'station': entry['station'],
+                'location': entry['location'],
+                'channel': entry['channel'],
+                'starttime': UTCDateTime(ns=start_ns + round(i0 * 1e9 / sr)),
+                'sampling_rate': sr
+            })
+        return stream
+
+    def read_band(self, band, starttime=None, endtime=None):
+        """
+        Lee las anotaciones de los tres modelos de una banda con las mismas claves que retorna
+        `process_stream_with_models`, para poder pasarlas a las funciones de graficación.
+        """
+        return {pred_key: self.read(band, kind, starttime, endtime) for pred_key, kind in PREDICTION_KINDS.items()}
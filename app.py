@@ -1,19 +1,39 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, Response, stream_with_context
 import os
+import json
+import queue
 import shutil
-import zipfile
 import uuid
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import threading
 import time
-import glob
-from seismic_processor import SeismicProcessor
+from seismic_processor import (SeismicProcessor, repick_results, stored_thresholds, rerender_results,
+                               load_image_sets, compare_datasets, render_window_image, DEFAULT_IMAGE_SET, FILTERS,
+                               RENDER_POLICIES, STRIP_DPI)
+from result_cache import ResultCache
+from render_cache import RenderCache
+from window_renderer import save_thumbnail, THUMBNAIL_FORMAT
+from chunk_cache import ChunkInferenceCache
+from realtime import FileReplaySource, RealtimeDetector
+from checkpoint import JobCheckpoint, find_job_checkpoints
+from pick_catalog import PickCatalog
+from summary import SummaryAggregator
+from zip_stream import select_result_files, stream_zip
+from results_manifest import ResultsManifest
+from annotation_store import ANNOTATION_STORE_FOLDER
+from waveform_pyramid import ensure_pyramid, encode_traces, DEFAULT_POINTS, MAX_POINTS
+from obspy import UTCDateTime
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['RESULTS_FOLDER'] = 'results'
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['RESULT_CACHE_MAX_BYTES'] = 20 * 1024 * 1024 * 1024  # 20GB para la caché de resultados
+app.config['RENDER_CACHE_MAX_BYTES'] = 2 * 1024 * 1024 * 1024  # 2GB para las imágenes dibujadas bajo demanda
+app.config['THUMBNAIL_CACHE_MAX_BYTES'] = 512 * 1024 * 1024  # 512MB para las miniaturas de la página de resultados
+app.config['PICK_CATALOG_PATH'] = os.path.join('catalog', 'picks.sqlite')  # Catálogo de picks de todos los trabajos
 
 # Crear carpetas necesarias
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -21,7 +41,20 @@ os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
 
 # Variables globales para el procesamiento
 processing_status = {}
+realtime_sessions = {}  # Sesiones de detección continua: session_id -> RealtimeDetector
+REALTIME_SESSION_TTL_SECONDS = 600  # Tiempo que se conserva una sesión terminada para consultar sus picks
+job_checkpoints = {}  # Checkpoints persistentes de los trabajos: job_id -> JobCheckpoint
+job_summaries = {}  # Resúmenes acumulados durante el procesamiento: job_id -> SummaryAggregator
+pyramid_lock = threading.Lock()  # Evita que dos peticiones construyan a la vez la pirámide de un trabajo antiguo
 processor = SeismicProcessor(dataset="stead") 
+result_cache = ResultCache(os.path.join(app.config['CACHE_FOLDER'], 'results'),
+                           max_bytes=app.config['RESULT_CACHE_MAX_BYTES'])
+render_cache = RenderCache(os.path.join(app.config['CACHE_FOLDER'], 'render'),
+                           max_bytes=app.config['RENDER_CACHE_MAX_BYTES'])
+thumbnail_cache = RenderCache(os.path.join(app.config['CACHE_FOLDER'], 'thumbnails'),
+                              max_bytes=app.config['THUMBNAIL_CACHE_MAX_BYTES'], suffix=f".{THUMBNAIL_FORMAT}")
+pick_catalog = PickCatalog(app.config['PICK_CATALOG_PATH'])
+THUMBNAIL_MIMETYPE = f"image/{THUMBNAIL_FORMAT}"
 
 def allowed_file(filename):
     """Verifica si el archivo tiene una extensión permitida"""
@@ -37,14 +70,55 @@ def update_progress(job_id, current, total, message):
         'percentage': int((current / total) * 100) if total > 0 else 0,
         'completed': current >= total
     }
+    persist_status(job_id)
+
+def persist_status(job_id):
+    """Guarda el estado del trabajo en su checkpoint para que `/progress` sobreviva a un reinicio"""
+    checkpoint = job_checkpoints.get(job_id)
+    if checkpoint is not None and job_id in processing_status:
+        checkpoint.save_progress(processing_status[job_id])
+
+def process_files_async(job_id, mseed_files, output_dir, window_length_minutes, dataset, lazy_render=False,
+                        render_policy="all", strip_dpi=None, picks_only=False, chunk_inference=False):
+    """
+    Procesa archivos de manera asíncrona (con `lazy_render`, los gráficos se dibujan al pedirlos;
+    con `render_policy="detections"`, solo los de las ventanas con picks o detecciones; con
+    `picks_only`, solo se escriben los CSV y los gráficos se dibujan al pedirlos desde el almacén;
+    con `chunk_inference`, la inferencia se reutiliza por bloques de una hora entre trabajos y los
+    picks salen de esas anotaciones, no de `classify()` sobre el archivo completo)
+    """
+    # El checkpoint se conserva si los parámetros coinciden (trabajo reanudado tras un reinicio)
+    params = {
+        'job_id': job_id,
+        'mseed_files': mseed_files,
+        'window_length_minutes': window_length_minutes,
+        'dataset': dataset
+    }
+    if lazy_render:
+        params['lazy_render'] = True
+    if picks_only:
+        params['picks_only'] = True
+    if chunk_inference:
+        params['chunk_inference'] = True
+    if render_policy != "all":
+        params['render_policy'] = render_policy
+        params['strip_dpi'] = strip_dpi
+    checkpoint = JobCheckpoint(output_dir, params=params)
+    job_checkpoints[job_id] = checkpoint
+    summary = SummaryAggregator(output_dir)
+    job_summaries[job_id] = summary
 
-def process_files_async(job_id, mseed_files, output_dir, window_length_minutes, dataset):
-    """Procesa archivos de manera asíncrona"""
     try:
         def progress_callback(current, total, message):
             update_progress(job_id, current, total, message)
 
-        current_processor = SeismicProcessor(dataset=dataset)
+        # Opcional: los picks cerca de los bordes de los bloques pueden diferir de los de `classify()`
+        chunk_cache = None
+        if chunk_inference:
+            chunk_cache = ChunkInferenceCache(os.path.join(app.config['CACHE_FOLDER'], 'chunks'), dataset)
+        current_processor = SeismicProcessor(dataset=dataset, result_cache=result_cache, chunk_cache=chunk_cache,
+                                             store_annotations=True, store_waveforms=True, lazy_render=lazy_render,
+                                             render_policy=render_policy, strip_dpi=strip_dpi)
         # Asegurarse de que los modelos se carguen con el dataset correcto
         if not current_processor.load_models():
             raise Exception(f"No se pudieron cargar los modelos con el dataset: {dataset}")
@@ -57,7 +131,10 @@ def process_files_async(job_id, mseed_files, output_dir, window_length_minutes,
             mseed_files,
             output_dir,
             window_length_minutes=window_length_minutes,
-            progress_callback=progress_callback
+            progress_callback=progress_callback,
+            checkpoint=checkpoint,
+            summary=summary,
+            picks_only=picks_only
         )
 
         # Asegurar que el diccionario de resultados contenga las rutas necesarias
@@ -67,14 +144,25 @@ def process_files_async(job_id, mseed_files, output_dir, window_length_minutes,
         if 'results_folder' not in processor_results:
             processor_results['results_folder'] = output_dir
 
-        # Marcar como completado
+        # Carga los picks del trabajo en el catálogo global (un fallo aquí no invalida los resultados)
+        processing_status[job_id]['message'] = "Cargando picks en el catálogo..."
+        try:
+            pick_catalog.load_job(job_id, output_dir)
+        except Exception as e:
+            print(f"Advertencia: no se pudieron cargar los picks de {job_id} en el catálogo: {e}")
+
+        # Marcar como completado (con el rendimiento en estaciones-día por hora, si se procesó algo)
+        message = 'Procesamiento completado exitosamente'
+        if processor_results.get('station_days_per_hour'):
+            message += f" ({processor_results['station_days_per_hour']:.1f} estaciones-día/hora)"
         processing_status[job_id].update({
             'completed': True,
             'results': processor_results, # Usar los resultados aumentados
-            'message': 'Procesamiento completado exitosamente',
+            'message': message,
             'window_length': window_length_minutes,
             'dataset': dataset
         })
+        persist_status(job_id)
 
     except Exception as e:
         processing_status[job_id] = {
@@ -85,103 +173,167 @@ def process_files_async(job_id, mseed_files, output_dir, window_length_minutes,
             'completed': True,
             'error': True
         }
+        persist_status(job_id)
 
-def organize_images_by_type(job_id_full_name, results_folder): # Cambiado para aceptar el nombre completo de la carpeta del trabajo
-    """
-    Organiza las imágenes por tipo y por archivo MSEED original procesado.
-    La estructura de la carpeta es: results_folder/<mseed_file_id>/resultados_imagenes_filtrados/filtro/imagen.png
-    Las imágenes tienen nombres como: FILENAME_window_X_FILTER_detections.png
-    """
+def compare_datasets_async(job_id, mseed_files, output_dir, window_length_minutes, datasets):
+    """Procesa archivos con los modelos de varios datasets de manera asíncrona (comparación de datasets)"""
+    # El checkpoint se conserva si los parámetros coinciden (trabajo reanudado tras un reinicio)
+    checkpoint = JobCheckpoint(output_dir, params={
+        'job_id': job_id,
+        'mseed_files': mseed_files,
+        'window_length_minutes': window_length_minutes,
+        'dataset': datasets[0],
+        'datasets': datasets
+    })
+    job_checkpoints[job_id] = checkpoint
+    # El resumen que se consulta en `/summary` es el del dataset principal
+    summary = SummaryAggregator(os.path.join(output_dir, datasets[0]))
+    job_summaries[job_id] = summary
 
-    all_images_data = {}
-    total_windows_per_file = {}
+    try:
+        def progress_callback(current, total, message):
+            update_progress(job_id, current, total, message)
 
-    if not os.path.exists(results_folder):
-        print(f"La carpeta de resultados no existe: {results_folder}")
-        return all_images_data, total_windows_per_file
+        update_progress(job_id, 0, len(mseed_files), "Iniciando comparación de datasets...")
+        processor_results = compare_datasets(
+            mseed_files,
+            datasets,
+            output_dir,
+            window_length_minutes=window_length_minutes,
+            progress_callback=progress_callback,
+            checkpoint=checkpoint,
+            summary=summary
+        )
+        # La página de resultados muestra los gráficos del dataset principal ('base_output_directory',
+        # ver `displayed_results_folder`); la descarga incluye los resultados de todos los datasets
+        # y la comparación.
+        processor_results['images_folder'] = output_dir
+        processor_results['results_folder'] = output_dir
 
-    # El nombre de la carpeta de resultados del trabajo ya se pasa como job_id_full_name
-    # Por ejemplo: '0fc400d3-0494-4833-9fee-a5863b90a63f_20250710_170549'
+        processing_status[job_id]['message'] = "Cargando picks en el catálogo..."
+        try:
+            pick_catalog.load_job(job_id, processor_results['base_output_directory'])
+        except Exception as e:
+            print(f"Advertencia: no se pudieron cargar los picks de {job_id} en el catálogo: {e}")
 
-    # Mapear los tipos de filtros disponibles (carpetas en disco)
-    filter_names_expected = [
-        '0.5-2Hz', '1-15Hz', '2-4Hz', '5-10Hz', 'comparison', 'original'
-    ]
+        processing_status[job_id].update({
+            'completed': True,
+            'results': processor_results,
+            'message': 'Comparación de datasets completada exitosamente',
+            'window_length': window_length_minutes,
+            'dataset': datasets[0],
+            'datasets': datasets
+        })
+        persist_status(job_id)
 
-    # Iterar a través de cada directorio de archivo MSEED original dentro de results_folder
-    mseed_file_dirs = [d for d in os.listdir(results_folder) if os.path.isdir(os.path.join(results_folder, d))]
-    
-    for mseed_file_id in mseed_file_dirs:
-        mseed_results_base_path = os.path.join(results_folder, mseed_file_id, 'resultados_imagenes_filtrados')
+    except Exception as e:
+        processing_status[job_id] = {
+            'current': 0,
+            'total': 1,
+            'message': f'Error: {str(e)}',
+            'percentage': 0,
+            'completed': True,
+            'error': True
+        }
+        persist_status(job_id)
+
+def resume_interrupted_jobs():
+    """
+    Recupera el estado de los trabajos a partir de sus checkpoints tras un reinicio del servidor.
+    Los trabajos terminados vuelven a estar disponibles en `/progress` y `/results`; los que no
+    terminaron se relanzan y continúan desde el último archivo y banda completos.
+    """
+    for checkpoint in find_job_checkpoints(app.config['RESULTS_FOLDER']):
+        params = checkpoint.params
+        job_id = params.get('job_id')
+        if not job_id or job_id in processing_status:
+            continue
 
-        if not os.path.exists(mseed_results_base_path):
-            print(f"Debug: No se encontró la carpeta de imágenes filtradas para {mseed_file_id}: {mseed_results_base_path}")
+        job_checkpoints[job_id] = checkpoint
+        status = dict(checkpoint.progress)
+        if status.get('rerender', {}).get('completed') is False:
+            status['rerender'].update({'completed': True, 'error': True,
+                                       'message': 'Error: regeneración de gráficos interrumpida por un reinicio'})
+        if status.get('completed') and ('results' in status or status.get('error')):
+            processing_status[job_id] = status
             continue
 
-        temp_file_grouping_for_id = {
-            'comparison': [],
-            'original': [],
-            'filtered': {
-                '0.5-2Hz': [],
-                '2-4Hz': [],
-                '5-10Hz': [],
-                '1-15Hz': []
+        missing = [f for f in params['mseed_files'] if not os.path.exists(f)]
+        if missing:
+            processing_status[job_id] = {
+                'current': 0,
+                'total': 1,
+                'message': f'Error: no se puede reanudar, faltan archivos subidos ({len(missing)})',
+                'percentage': 0,
+                'completed': True,
+                'error': True
             }
-        }
+            persist_status(job_id)
+            continue
 
-        for filter_name in filter_names_expected:
-            filter_dir_path = os.path.join(mseed_results_base_path, filter_name)
-            if os.path.exists(filter_dir_path):
-                images_in_filter_dir = sorted(glob.glob(os.path.join(filter_dir_path, '*.png')))
-
-                for img_full_path in images_in_filter_dir:
-                    img_filename = os.path.basename(img_full_path)
-                    
-                    full_relative_path_for_template = os.path.join(
-                        job_id_full_name,
-                        mseed_file_id,
-                        'resultados_imagenes_filtrados',
-                        filter_name,
-                        img_filename
-                    )
-
-                    if filter_name in ['comparison', 'original']:
-                        temp_file_grouping_for_id[filter_name].append(full_relative_path_for_template)
-                    else:
-                        temp_file_grouping_for_id['filtered'][filter_name].append(full_relative_path_for_template)
-        
-        temp_file_grouping_for_id['comparison'].sort()
-        temp_file_grouping_for_id['original'].sort()
-        for f_type in temp_file_grouping_for_id['filtered']:
-            temp_file_grouping_for_id['filtered'][f_type].sort()
-
-        all_images_data[mseed_file_id] = temp_file_grouping_for_id
-
-        windows_count = 0
-        for filt_imgs in temp_file_grouping_for_id['filtered'].values():
-            windows_count = max(windows_count, len(filt_imgs))
-        windows_count = max(windows_count, len(temp_file_grouping_for_id['comparison']))
-        windows_count = max(windows_count, len(temp_file_grouping_for_id['original']))
-        
-        total_windows_per_file[mseed_file_id] = windows_count
+        status.update({
+            'message': 'Reanudando procesamiento tras reinicio...',
+            'completed': False,
+            'window_length': params['window_length_minutes'],
+            'dataset': params['dataset'],
+            'lazy_render': params.get('lazy_render', False),
+            'render_policy': params.get('render_policy', 'all'),
+            'picks_only': params.get('picks_only', False),
+            'chunk_inference': params.get('chunk_inference', False)
+        })
+        processing_status[job_id] = status
+        print(f"Reanudando trabajo {job_id} desde {checkpoint.job_dir}")
 
-    print(f"Debug - Estructura corregida:")
-    print(f"Debug - all_images_data keys: {list(all_images_data.keys())}")
-    for key, data in all_images_data.items():
-        print(f"Debug - {key}: comparison={len(data['comparison'])}, original={len(data['original'])}")
-        for filt, imgs in data['filtered'].items():
-            print(f"Debug - {key} {filt}: {len(imgs)} imágenes")
+        if params.get('datasets'):
+            status['datasets'] = params['datasets']
+            thread = threading.Thread(
+                target=compare_datasets_async,
+                args=(job_id, params['mseed_files'], checkpoint.job_dir,
+                      params['window_length_minutes'], params['datasets'])
+            )
+            thread.daemon = True
+            thread.start()
+            continue
 
-    return all_images_data, total_windows_per_file
+        thread = threading.Thread(
+            target=process_files_async,
+            args=(job_id, params['mseed_files'], checkpoint.job_dir,
+                  params['window_length_minutes'], params['dataset'], params.get('lazy_render', False),
+                  params.get('render_policy', 'all'), params.get('strip_dpi'), params.get('picks_only', False),
+                  params.get('chunk_inference', False))
+        )
+        thread.daemon = True
+        thread.start()
 
-    print(f"Debug - Estructura corregida:")
-    print(f"Debug - all_images_data keys: {list(all_images_data.keys())}")
-    for key, data in all_images_data.items():
-        print(f"Debug - {key}: comparison={len(data['comparison'])}, original={len(data['original'])}")
-        for filt, imgs in data['filtered'].items():
-            print(f"Debug - {key} {filt}: {len(imgs)} imágenes")
+def displayed_results_folder(results):
+    """
+    Carpeta cuyos gráficos y almacenes muestra la página de resultados: la del trabajo o, en una
+    comparación de datasets, la del dataset principal (`<trabajo>/<dataset>`).
+    """
+    return results.get('base_output_directory') or results.get('images_folder', '')
+
+def organize_images_by_type(image_prefix, results_folder, image_set=DEFAULT_IMAGE_SET, window_length_minutes=2):
+    """
+    Organiza las imágenes por tipo y por archivo MSEED original procesado a partir del manifiesto
+    del conjunto de imágenes (ver `results_manifest`), sin recorrer las carpetas del trabajo.
+    La estructura de la carpeta es: results_folder/<mseed_file_id>/<image_set>/filtro/imagen.png,
+    donde `image_set` es 'resultados_imagenes_filtrados' o un conjunto re-renderizado.
+    Para trabajos anteriores al manifiesto, este se construye (y guarda) una sola vez.
+    `image_prefix` es `results_folder` relativa a la carpeta de resultados de la aplicación
+    (el prefijo de las rutas de las imágenes).
 
-    return all_images_data, total_windows_per_file
+    Returns:
+        tuple: (imágenes por archivo y tipo, ventanas por archivo, picks por imagen).
+    """
+    if not os.path.exists(results_folder):
+        print(f"La carpeta de resultados no existe: {results_folder}")
+        return {}, {}, {}
+
+    manifest = ResultsManifest.load(results_folder, image_set)
+    if manifest is None:
+        print(f"Construyendo el manifiesto de {image_prefix} ({image_set})")
+        manifest = ResultsManifest.build(results_folder, image_set, window_length_minutes)
+    return manifest.images_by_type(image_prefix, bands=[f['type'] for f in FILTERS])
 
 def count_total_windows(images_data):
     """Cuenta el total de ventanas basado en las imágenes de comparación"""
@@ -234,6 +386,21 @@ def upload_files():
 
     # Obtener el dataset seleccionado
     dataset = request.form.get('dataset', 'stead') # 'stead' como valor por defecto
+    # Datasets adicionales para un trabajo de comparación (separados por comas)
+    compare_with = [d.strip() for d in request.form.get('compare_datasets', '').split(',') if d.strip()]
+    datasets = list(dict.fromkeys([dataset] + compare_with))
+    # Modo diferido: los gráficos por ventana se dibujan al pedirlos (no aplica a las comparaciones)
+    lazy_render = request.form.get('lazy_render') == 'true' and len(datasets) == 1
+    # Solo picks: carga, filtrado, inferencia y CSV, sin gráficos (no aplica a las comparaciones)
+    picks_only = request.form.get('picks_only') == 'true' and len(datasets) == 1
+    # Inferencia reutilizada por bloques entre trabajos solapados (opcional: los picks cerca de los
+    # bordes de los bloques pueden diferir de los de `classify()` sobre el archivo completo)
+    chunk_inference = request.form.get('chunk_inference') == 'true' and len(datasets) == 1
+    # Política de dibujo: todas las ventanas o solo las que tienen picks o detecciones
+    render_policy = request.form.get('render_policy', 'all')
+    if render_policy not in RENDER_POLICIES:
+        return jsonify({'error': f'Política de dibujo desconocida: {render_policy}'}), 400
+    strip_dpi = STRIP_DPI if request.form.get('render_strips') == 'true' else None
     
     # Validar archivos
     valid_files = []
@@ -271,23 +438,36 @@ def upload_files():
         'percentage': 0,
         'completed': False,
         'window_length': window_length_minutes,
-        'dataset': dataset # Guardar el dataset en el estado del trabajo
+        'dataset': dataset, # Guardar el dataset en el estado del trabajo
+        'lazy_render': lazy_render,
+        'render_policy': render_policy,
+        'picks_only': picks_only,
+        'chunk_inference': chunk_inference
     }
     
     # Iniciar procesamiento en hilo separado
-    thread = threading.Thread(
-        target=process_files_async,
-        args=(job_id, saved_files, job_results_dir, window_length_minutes, dataset)
-    )
+    if len(datasets) > 1:
+        processing_status[job_id]['datasets'] = datasets
+        thread = threading.Thread(
+            target=compare_datasets_async,
+            args=(job_id, saved_files, job_results_dir, window_length_minutes, datasets)
+        )
+    else:
+        thread = threading.Thread(
+            target=process_files_async,
+            args=(job_id, saved_files, job_results_dir, window_length_minutes, dataset, lazy_render,
+                  render_policy, strip_dpi, picks_only, chunk_inference)
+        )
     thread.daemon = True
     thread.start()
     
     return jsonify({
         'job_id': job_id,
-        'message': f'Se subieron {len(saved_files)} archivos. Procesamiento iniciado con ventanas de {window_length_minutes} minutos y dataset {dataset}.',
+        'message': f'Se subieron {len(saved_files)} archivos. Procesamiento iniciado con ventanas de {window_length_minutes} minutos y dataset {", ".join(datasets)}.',
         'files_count': len(saved_files),
         'window_length': window_length_minutes,
-        'dataset': dataset
+        'dataset': dataset,
+        'datasets': datasets
     })
 
 @app.route('/progress/<job_id>')
@@ -312,6 +492,14 @@ def show_results(job_id):
         return render_template('error.j2', error=status.get('message', 'Error desconocido')), 500
     
     results = status.get('results', {})
+
+    # Conjunto de imágenes a mostrar: el original o uno re-renderizado con otra duración de ventana
+    image_sets = {DEFAULT_IMAGE_SET: {'window_length_minutes': status.get('window_length', 2)}}
+    images_folder = displayed_results_folder(results)
+    image_sets.update(load_image_sets(images_folder))
+    image_set = request.args.get('image_set', DEFAULT_IMAGE_SET)
+    if image_set not in image_sets:
+        return render_template('error.j2', error='Conjunto de imágenes no encontrado'), 404
     
     # Preparar datos de resultados
     results_data = {
@@ -319,72 +507,32 @@ def show_results(job_id):
         'total_files': results.get('total_files', 0),
         'processing_time': results.get('processing_time', 0),
         'success': results.get('success', False),
-        'window_length': status.get('window_length', 2),
-        'dataset': status.get('dataset', 'stead')
+        'window_length': image_sets[image_set]['window_length_minutes'],
+        'dataset': status.get('dataset', 'stead'),
+        'datasets': status.get('datasets', [])
     }
     
-    # images_folder ya es la ruta completa como 'results/job_id_timestamp'
-    images_folder = results.get('images_folder', '') 
-    
-    # Obtener solo el nombre de la carpeta del trabajo (job_id_timestamp)
-    job_id_full_name = os.path.basename(images_folder)
+    # Prefijo de las rutas de las imágenes: 'job_id_timestamp' o, en una comparación de datasets,
+    # 'job_id_timestamp/<dataset>'
+    image_prefix = os.path.relpath(images_folder, app.config['RESULTS_FOLDER'])
+
+    # Imágenes y picks por ventana desde el manifiesto del conjunto (un solo archivo JSON)
+    all_images_data, total_windows_per_file, window_picks = organize_images_by_type(
+        image_prefix, images_folder, image_set, results_data['window_length'])
 
-    # Usar la función corregida, pasando el nombre completo de la carpeta del trabajo
-    all_images_data, total_windows_per_file = organize_images_by_type(job_id_full_name, images_folder)
-    
-    # Debug: Imprimir datos para verificar
-    print(f"Debug - images_folder: {images_folder}")
-    print(f"Debug - all_images_data keys: {list(all_images_data.keys())}")
-    print(f"Debug - total_windows_per_file: {total_windows_per_file}")
-    
     # Calcular el total de ventanas global sumando las ventanas por archivo
     total_windows_global = sum(total_windows_per_file.values())
-    
-    # Si no hay ventanas, intentar contar todas las imágenes disponibles
-    if total_windows_global == 0:
-        print("Debug - No se encontraron ventanas, contando todas las imágenes...")
-        # Contar todas las imágenes PNG en la carpeta de resultados
-        all_images = []
-        for root, dirs, files in os.walk(images_folder):
-            for file in files:
-                if file.endswith('.png'):
-                    all_images.append(os.path.join(root, file))
-        
-        print(f"Debug - Total imágenes encontradas: {len(all_images)}")
-        if all_images:
-            total_windows_global = len(all_images)
-            # Actualizar también el diccionario para mostrar al menos las imágenes encontradas
-            if not all_images_data:
-                all_images_data['detected_files'] = {
-                    'comparison': [],
-                    'original': [],
-                    'filtered': {'0.5-2Hz': [], '2-4Hz': [], '5-10Hz': [], '1-15Hz': []}
-                }
-                
-                # Distribuir las imágenes según su ruta
-                for img_path in all_images:
-                    rel_path = os.path.relpath(img_path, images_folder)
-                    if 'comparison' in rel_path.lower():
-                        all_images_data['detected_files']['comparison'].append(rel_path)
-                    elif 'original' in rel_path.lower():
-                        all_images_data['detected_files']['original'].append(rel_path)
-                    elif '0.5-2hz' in rel_path.lower():
-                        all_images_data['detected_files']['filtered']['0.5-2Hz'].append(rel_path)
-                    elif '2-4hz' in rel_path.lower():
-                        all_images_data['detected_files']['filtered']['2-4Hz'].append(rel_path)
-                    elif '5-10hz' in rel_path.lower():
-                        all_images_data['detected_files']['filtered']['5-10Hz'].append(rel_path)
-                    elif '1-15hz' in rel_path.lower():
-                        all_images_data['detected_files']['filtered']['1-15Hz'].append(rel_path)
-                
-                total_windows_per_file['detected_files'] = total_windows_global
-    
-    print(f"Debug - Total ventanas final: {total_windows_global}")
-    
+
     return render_template('results.j2', 
                          job_id=job_id,
                          results=results_data,
+                         thresholds=stored_thresholds(images_folder),
+                         image_sets=image_sets,
+                         image_set=image_set,
+                         rerender_running=status.get('rerender', {}).get('completed') is False,
+                         bands=["original"] + [f['type'] for f in FILTERS],
                          all_images_data=all_images_data,
+                         window_picks=window_picks,
                          total_windows=total_windows_global,
                          total_windows_per_file=total_windows_per_file,
                          base_path=app.config['RESULTS_FOLDER'])
@@ -392,19 +540,105 @@ def show_results(job_id):
 @app.route('/serve_image/<job_id>/<path:image_path>')
 def serve_image(job_id, image_path):
     """Sirve imágenes de resultados"""
-    # Construir la ruta completa de la imagen
-    full_path = os.path.join(app.config['RESULTS_FOLDER'], image_path)
-    
-    # Verificar que el archivo existe y es seguro
-    if os.path.exists(full_path) and os.path.isfile(full_path):
-        return send_file(full_path)
-    else:
-        print(f"Debug: Imagen NO ENCONTRADA en ruta: {full_path}")
+    try:
+        source_path = resolve_image(image_path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        print(f"Error dibujando {image_path}: {e}")
+        return jsonify({'error': f'Error al generar la imagen: {str(e)}'}), 500
+    if source_path is None:
+        print(f"Debug: Imagen NO ENCONTRADA: {image_path}")
         return jsonify({'error': 'Imagen no encontrada'}), 404
+    return send_file(source_path)
+
+@app.route('/thumbnail/<job_id>/<path:image_path>')
+def serve_thumbnail(job_id, image_path):
+    """
+    Sirve la miniatura de una imagen de resultados. Se genera la primera vez que se pide (dibujando
+    antes la imagen si el trabajo es diferido) y queda en su propia caché LRU.
+    """
+    full_path = os.path.join(app.config['RESULTS_FOLDER'], image_path)
+    # Las imágenes del trabajo pueden reescribirse (re-renderizado): la clave incluye su fecha.
+    key = f"{image_path}@{os.stat(full_path).st_mtime_ns}" if os.path.isfile(full_path) else image_path
+    cached_path = thumbnail_cache.get(key)
+    if cached_path is not None:
+        return send_file(cached_path, mimetype=THUMBNAIL_MIMETYPE)
+    try:
+        source_path = resolve_image(image_path)
+        if source_path is None:
+            return jsonify({'error': 'Imagen no encontrada'}), 404
+        cached_path = thumbnail_cache.get_or_render(key, lambda path: save_thumbnail(source_path, path))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        print(f"Error generando la miniatura de {image_path}: {e}")
+        return jsonify({'error': f'Error al generar la miniatura: {str(e)}'}), 500
+    return send_file(cached_path, mimetype=THUMBNAIL_MIMETYPE)
+
+def resolve_image(image_path):
+    """
+    Ruta en disco de una imagen de resultados: el PNG del trabajo o, en modo diferido, su copia en
+    la caché de imágenes, que se dibuja la primera vez que se pide.
+
+    Args:
+        image_path (str): Ruta de la imagen relativa a la carpeta de resultados.
+
+    Returns:
+        str: Ruta del PNG, o None si la imagen no existe.
+
+    Raises:
+        ValueError: Si la ventana de una imagen diferida no está en el almacén.
+    """
+    results_folder = os.path.abspath(app.config['RESULTS_FOLDER'])
+    full_path = os.path.abspath(os.path.join(results_folder, image_path))
+    if not full_path.startswith(results_folder + os.sep):
+        return None
+    if os.path.isfile(full_path):
+        return full_path
+
+    # Trabajos en modo diferido: la imagen se dibuja la primera vez y se sirve desde la caché
+    cached_path = render_cache.get(image_path)
+    if cached_path is not None:
+        return cached_path
+    lazy_image = find_lazy_image(image_path)
+    if lazy_image is None:
+        return None
+    file_dir, basename, kind, window_index, window_length_minutes = lazy_image
+    return render_cache.get_or_render(image_path, lambda path: render_window_image(
+        file_dir, basename, kind, window_index, window_length_minutes, path))
+
+def find_lazy_image(image_path):
+    """
+    Busca una imagen diferida en el manifiesto de su trabajo. La ruta tiene la forma
+    `<trabajo>/<archivo>/<conjunto>/<tipo>/<imagen>`; solo se aceptan imágenes registradas.
+
+    Returns:
+        tuple: (carpeta del archivo, nombre base, tipo, índice de ventana, duración de ventana en
+            minutos), o None si la imagen no es de un archivo procesado en modo diferido.
+    """
+    parts = image_path.split('/')
+    if len(parts) != 5 or any(part in ('', '.', '..') for part in parts):
+        return None
+    job_folder, basename, image_set, kind, filename = parts
+    job_dir = os.path.join(app.config['RESULTS_FOLDER'], job_folder)
+    manifest = ResultsManifest.load(job_dir, image_set)
+    if manifest is None:
+        return None
+    window_index = manifest.lazy_image(basename, kind, filename)
+    if window_index is None:
+        return None
+    return (os.path.join(job_dir, basename), basename, kind, window_index,
+            manifest.data['window_length_minutes'])
 
 @app.route('/download/<job_id>')
 def download_results(job_id):
-    """Descarga los resultados como ZIP"""
+    """
+    Descarga los resultados como ZIP, generado mientras se envía (sin archivo temporal).
+
+    Parámetros opcionales: contents ("all", "csv", "images" o "comparison"), band (tipo de filtro)
+    y file (nombre base de un archivo del trabajo).
+    """
     if job_id not in processing_status:
         return jsonify({'error': 'Trabajo no encontrado'}), 404
 
@@ -416,24 +650,274 @@ def download_results(job_id):
     if 'results_folder' not in results or not os.path.exists(results['results_folder']):
         return jsonify({'error': 'Carpeta de resultados no encontrada o no válida'}), 404
 
-    job_specific_results_dir = results['results_folder']
+    contents = request.args.get('contents', 'all')
+    band = request.args.get('band') or None
+    file = request.args.get('file') or None
+    if band is not None and band not in ["original"] + [f['type'] for f in FILTERS]:
+        return jsonify({'error': f'Banda desconocida: {band}'}), 400
+    try:
+        entries = select_result_files(results['results_folder'], contents=contents, band=band, file=file)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    if not entries:
+        return jsonify({'error': 'No hay archivos para la selección indicada'}), 404
+
     window_length = status.get('window_length', 2)
-    dataset_name = status.get('dataset', 'stead')
-    zip_filename = f"resultados_{job_id}_ventana_{window_length}min_dataset_{dataset_name}.zip"
-    zip_path = os.path.join(app.config['RESULTS_FOLDER'], zip_filename)
+    dataset_name = "-".join(status.get('datasets') or [status.get('dataset', 'stead')])
+    selection = "".join(f"_{part}" for part in (
+        None if contents == 'all' else contents, band, file
+    ) if part)
+    zip_filename = secure_filename(
+        f"resultados_{job_id}_ventana_{window_length}min_dataset_{dataset_name}{selection}.zip"
+    )
 
+    return Response(
+        stream_with_context(stream_zip(entries)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'}
+    )
+
+@app.route('/repick/<job_id>', methods=['POST'])
+def repick_job(job_id):
+    """
+    Recalcula los picks y detecciones de un trabajo terminado con umbrales nuevos a partir de las
+    anotaciones guardadas (sin ejecutar los modelos) y reescribe los CSV y el resumen.
+
+    Cuerpo JSON: {"thresholds": {"EQTransformer": {"P_threshold": 0.5, ...}, "GPD": {...}, ...}}
+    """
+    if job_id not in processing_status:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    status = processing_status[job_id]
+    if not status.get('completed', False) or status.get('error', False):
+        return jsonify({'error': 'El trabajo aún no ha terminado correctamente'}), 400
+
+    results_folder = status.get('results', {}).get('results_folder')
+    if not results_folder or not os.path.isdir(results_folder):
+        return jsonify({'error': 'Carpeta de resultados no encontrada o no válida'}), 404
+
+    payload = request.get_json(silent=True) or {}
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(job_specific_results_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, job_specific_results_dir)
-                    zipf.write(file_path, arcname)
+        repick = repick_results(results_folder, payload.get('thresholds', {}))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    pick_catalog.load_job(job_id, results_folder)
+    job_summaries.pop(job_id, None)
 
-        return send_file(zip_path, as_attachment=True, download_name=zip_filename)
+    return jsonify({
+        'message': f"Picks recalculados en {repick['elapsed_seconds']:.1f} s",
+        'thresholds': repick['thresholds'],
+        'files': {name: info['picks'] for name, info in repick['files'].items()},
+        'elapsed_seconds': repick['elapsed_seconds']
+    })
+
+def rerender_async(job_id, results_folder, window_length_minutes):
+    """Genera un nuevo conjunto de imágenes de un trabajo terminado en segundo plano"""
+    def progress_callback(current, total, message):
+        processing_status[job_id]['rerender'].update({
+            'current': current,
+            'total': total,
+            'message': message,
+            'percentage': int((current / total) * 100) if total > 0 else 0
+        })
+        persist_status(job_id)
 
+    try:
+        rerender = rerender_results(results_folder, window_length_minutes, progress_callback=progress_callback)
+        processing_status[job_id]['rerender'].update({
+            'completed': True,
+            'image_set': rerender['image_set'],
+            'message': f"Gráficos con ventanas de {window_length_minutes} minutos generados"
+        })
     except Exception as e:
-        return jsonify({'error': f'Error creando ZIP: {str(e)}'}), 500
+        processing_status[job_id]['rerender'].update({
+            'completed': True,
+            'error': True,
+            'message': f'Error: {str(e)}'
+        })
+    persist_status(job_id)
+
+@app.route('/rerender/<job_id>', methods=['POST'])
+def rerender_job(job_id):
+    """
+    Regenera las imágenes de un trabajo terminado con otra duración de ventana a partir de las formas
+    de onda y anotaciones guardadas. Las imágenes se escriben en un conjunto nuevo y versionado; el
+    avance se consulta en `/progress/<job_id>` (clave 'rerender').
+
+    Cuerpo JSON: {"window_length": <minutos>}
+    """
+    if job_id not in processing_status:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    status = processing_status[job_id]
+    if not status.get('completed', False) or status.get('error', False):
+        return jsonify({'error': 'El trabajo aún no ha terminado correctamente'}), 400
+    if status.get('rerender', {}).get('completed') is False:
+        return jsonify({'error': 'Ya hay una regeneración de gráficos en curso para este trabajo'}), 409
+
+    results_folder = status.get('results', {}).get('results_folder')
+    if not results_folder or not os.path.isdir(results_folder):
+        return jsonify({'error': 'Carpeta de resultados no encontrada o no válida'}), 404
+
+    payload = request.get_json(silent=True) or {}
+    is_valid, window_length_or_error = validate_window_length(payload.get('window_length'))
+    if not is_valid:
+        return jsonify({'error': window_length_or_error}), 400
+
+    status['rerender'] = {
+        'current': 0,
+        'total': 1,
+        'message': 'Preparando regeneración de gráficos...',
+        'percentage': 0,
+        'completed': False,
+        'window_length': window_length_or_error
+    }
+    persist_status(job_id)
+
+    thread = threading.Thread(target=rerender_async, args=(job_id, results_folder, window_length_or_error))
+    thread.daemon = True
+    thread.start()
+
+    return jsonify({'message': f'Regenerando gráficos con ventanas de {window_length_or_error} minutos'})
+
+@app.route('/summary/<job_id>')
+def job_summary(job_id):
+    """
+    Resumen de un trabajo: picks por archivo, banda y modelo, y estadísticas de confianza.
+    Mientras el trabajo se procesa, incluye solo las bandas terminadas hasta el momento.
+    """
+    if job_id not in processing_status:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    status = processing_status[job_id]
+    summary = job_summaries.get(job_id)
+    if summary is None:
+        # Trabajo recuperado tras un reinicio: el resumen se lee de los archivos de cada resultado.
+        results_folder = displayed_results_folder(status.get('results', {}))
+        if not results_folder or not os.path.isdir(results_folder):
+            return jsonify({'error': 'Carpeta de resultados no encontrada o no válida'}), 404
+        summary = SummaryAggregator(results_folder)
+        for name in sorted(os.listdir(results_folder)):
+            if os.path.isdir(os.path.join(results_folder, name)):
+                summary.load_file(name)
+        job_summaries[job_id] = summary
+
+    snapshot = summary.snapshot()
+    snapshot['completed'] = status.get('completed', False)
+    return jsonify(snapshot)
+
+@app.route('/catalog/picks')
+def catalog_picks():
+    """
+    Consulta el catálogo de picks de todos los trabajos.
+
+    Parámetros (todos opcionales): job_id, network, station, location, trace_id, model,
+    band (tipo de filtro), phase, start y end (ISO 8601, sobre peak_time), min_peak_value,
+    limit (máximo 1000) y cursor (valor `next_cursor` de la página anterior).
+    """
+    args = request.args
+    try:
+        starttime = UTCDateTime(args['start']) if args.get('start') else None
+        endtime = UTCDateTime(args['end']) if args.get('end') else None
+        min_peak_value = float(args['min_peak_value']) if args.get('min_peak_value') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Parámetros de tiempo o de peak_value no válidos'}), 400
+    limit = min(max(args.get('limit', 100, type=int), 1), 1000)
+
+    try:
+        page = pick_catalog.query(
+            starttime=starttime, endtime=endtime, min_peak_value=min_peak_value,
+            limit=limit, cursor=args.get('cursor'),
+            job_id=args.get('job_id'), network=args.get('network'), station=args.get('station'),
+            location=args.get('location'), trace_id=args.get('trace_id'), model=args.get('model'),
+            filter_type=args.get('band'), phase=args.get('phase')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+def job_pyramid(job_id, file_name):
+    """
+    Almacén y pirámide de un archivo de un trabajo terminado (la pirámide se construye si falta,
+    en trabajos anteriores a ella).
+
+    Returns:
+        tuple: (AnnotationStore, WaveformPyramid), o None si el trabajo o el archivo no tienen almacén.
+    """
+    status = processing_status.get(job_id)
+    if status is None or not status.get('completed', False):
+        return None
+    if file_name in ('.', '..') or file_name != os.path.basename(file_name):
+        return None
+    images_folder = displayed_results_folder(status.get('results', {}))
+    if not images_folder:
+        return None
+    store_dir = os.path.join(images_folder, file_name, ANNOTATION_STORE_FOLDER)
+    if not os.path.isdir(store_dir):
+        return None
+    with pyramid_lock:
+        return ensure_pyramid(store_dir)
+
+@app.route('/waveform/<job_id>/<file_name>')
+def waveform_index(job_id, file_name):
+    """
+    Trazas disponibles para el explorador de señal de un archivo: bandas, tipos (forma de onda y
+    modelos) y el intervalo de tiempo del registro.
+    """
+    found = job_pyramid(job_id, file_name)
+    if found is None:
+        return jsonify({'error': 'No hay formas de onda guardadas para este archivo'}), 404
+    store, _ = found
+    starttime, endtime = store.time_range()
+    kinds = {}
+    for entry in store.entries():
+        kinds.setdefault(entry['band'], set()).add(entry['kind'])
+    return jsonify({
+        'file': file_name,
+        'start': str(starttime),
+        'end': str(endtime),
+        'bands': {band: sorted(band_kinds) for band, band_kinds in sorted(kinds.items())},
+        'max_points': MAX_POINTS
+    })
+
+@app.route('/waveform/<job_id>/<file_name>/<band>/<kind>')
+def waveform_data(job_id, file_name, band, kind):
+    """
+    Mínimos y máximos de las trazas de una banda y tipo en un intervalo, al nivel de la pirámide
+    con a lo sumo `points` cajas por traza.
+
+    Parámetros (opcionales): start y end (ISO 8601; por defecto, el registro completo) y points
+    (por defecto `DEFAULT_POINTS`, máximo `MAX_POINTS`).
+
+    La respuesta es binaria: los pares [mínimo, máximo] de cada traza, seguidos, como Float32
+    little-endian. La cabecera `X-Waveform-Layout` describe las trazas en ese orden (JSON: 'id',
+    'level', 'start' en segundos desde la época, 'step' en segundos y 'bins').
+    """
+    found = job_pyramid(job_id, file_name)
+    if found is None:
+        return jsonify({'error': 'No hay formas de onda guardadas para este archivo'}), 404
+    store, pyramid = found
+    args = request.args
+    try:
+        start_ns = UTCDateTime(args['start']).ns if args.get('start') else None
+        end_ns = UTCDateTime(args['end']).ns if args.get('end') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Parámetros de tiempo no válidos'}), 400
+    points = min(max(args.get('points', DEFAULT_POINTS, type=int), 1), MAX_POINTS)
+
+    layout, payload = encode_traces(pyramid.read(store, band, kind, start_ns, end_ns, points))
+    return Response(payload, mimetype='application/octet-stream',
+                    headers={'X-Waveform-Layout': json.dumps(layout), 'Cache-Control': 'private, max-age=3600'})
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Estadísticas de las cachés de resultados, imágenes diferidas y miniaturas (tasa de aciertos y uso de disco)"""
+    stats = result_cache.stats()
+    stats['render'] = render_cache.stats()
+    stats['thumbnails'] = thumbnail_cache.stats()
+    return jsonify(stats)
 
 @app.route('/image/<path:image_path>')
 def serve_image_legacy(image_path):
@@ -456,16 +940,153 @@ def cleanup_job(job_id):
         # Eliminar de memoria
         if job_id in processing_status:
             del processing_status[job_id]
+        job_summaries.pop(job_id, None)
         
         return jsonify({'message': 'Trabajo limpiado exitosamente'})
     
     except Exception as e:
         return jsonify({'error': f'Error limpiando trabajo: {str(e)}'}), 500
 
+def realtime_session_dir(session_id):
+    """Carpeta del archivo subido de una sesión de detección continua"""
+    return os.path.join(app.config['UPLOAD_FOLDER'], f"realtime_{session_id}")
+
+def evict_finished_realtime_sessions():
+    """
+    Libera las sesiones que terminaron solas (fin del archivo o error) hace más de
+    `REALTIME_SESSION_TTL_SECONDS`, junto con su archivo subido.
+    """
+    now = time.time()
+    for session_id, detector in list(realtime_sessions.items()):
+        if detector.finished_at is not None and now - detector.finished_at > REALTIME_SESSION_TTL_SECONDS:
+            realtime_sessions.pop(session_id, None)
+            shutil.rmtree(realtime_session_dir(session_id), ignore_errors=True)
+
+@app.route('/realtime/start', methods=['POST'])
+def start_realtime():
+    """
+    Inicia una sesión de detección continua reproduciendo un archivo MSEED subido
+    (sustituto local de un flujo SeedLink) a velocidad real o acelerada.
+    """
+    file = request.files.get('file')
+    if not file or not allowed_file(file.filename):
+        return jsonify({'error': 'Se requiere un archivo MSEED válido'}), 400
+
+    try:
+        speed = float(request.form.get('speed', 1.0))
+        step_seconds = float(request.form.get('step_seconds', 10.0))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'La velocidad y el paso deben ser numéricos'}), 400
+    if speed <= 0 or step_seconds <= 0:
+        return jsonify({'error': 'La velocidad y el paso deben ser positivos'}), 400
+
+    dataset = request.form.get('dataset', 'stead')
+    filter_type = request.form.get('filter_type', 'original')
+    if filter_type not in ["original"] + [f['type'] for f in FILTERS]:
+        return jsonify({'error': f'Filtro desconocido: {filter_type}'}), 400
+
+    evict_finished_realtime_sessions()
+
+    session_id = str(uuid.uuid4())
+    session_dir = realtime_session_dir(session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    filepath = os.path.join(session_dir, secure_filename(file.filename))
+    file.save(filepath)
+
+    rt_processor = SeismicProcessor(dataset=dataset)
+    if not rt_processor.load_models():
+        shutil.rmtree(session_dir, ignore_errors=True)
+        return jsonify({'error': f'No se pudieron cargar los modelos con el dataset: {dataset}'}), 500
+
+    detector = RealtimeDetector(
+        FileReplaySource(filepath, speed=speed),
+        rt_processor.pn_model, rt_processor.eqt_model, rt_processor.gpd_model,
+        filter_type=filter_type, step_seconds=step_seconds
+    )
+    detector.start()
+    realtime_sessions[session_id] = detector
+
+    return jsonify({
+        'session_id': session_id,
+        'message': f'Detección continua iniciada (velocidad x{speed}, dataset {dataset}, filtro {filter_type})'
+    })
+
+@app.route('/realtime/<session_id>/status')
+def realtime_status(session_id):
+    """Métricas de la sesión: paquetes, pasos, picks, latencia de extremo a extremo y backlog"""
+    evict_finished_realtime_sessions()
+    detector = realtime_sessions.get(session_id)
+    if detector is None:
+        return jsonify({'error': 'Sesión no encontrada'}), 404
+    return jsonify(detector.status())
+
+@app.route('/realtime/<session_id>/picks')
+def realtime_picks(session_id):
+    """Últimos picks publicados por la sesión (parámetro opcional `limit`)"""
+    detector = realtime_sessions.get(session_id)
+    if detector is None:
+        return jsonify({'error': 'Sesión no encontrada'}), 404
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({'picks': detector.picks[-limit:]})
+
+@app.route('/realtime/<session_id>/events')
+def realtime_events(session_id):
+    """Publica los picks nuevos como Server-Sent Events a medida que aparecen"""
+    detector = realtime_sessions.get(session_id)
+    if detector is None:
+        return jsonify({'error': 'Sesión no encontrada'}), 404
+
+    subscription = detector.subscribe()
+
+    def generate():
+        try:
+            while True:
+                try:
+                    pick = subscription.get(timeout=15)
+                except queue.Empty:
+                    if not detector.stats['running']:
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(pick)}\n\n"
+        finally:
+            detector.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@app.route('/realtime/<session_id>/stop', methods=['POST'])
+def stop_realtime(session_id):
+    """Detiene una sesión de detección continua y borra su archivo subido"""
+    detector = realtime_sessions.pop(session_id, None)
+    if detector is None:
+        return jsonify({'error': 'Sesión no encontrada'}), 404
+    detector.stop()
+    shutil.rmtree(realtime_session_dir(session_id), ignore_errors=True)
+    return jsonify({'message': 'Sesión detenida', 'status': detector.status()})
+
 @app.errorhandler(413)
 def too_large(e):
     return jsonify({'error': 'Archivo demasiado grande. Máximo 500MB'}), 413
 
+_jobs_resumed = False
+
+def resume_jobs_on_startup():
+    """
+    Reanuda una sola vez los trabajos interrumpidos al iniciar la aplicación, se sirva con
+    `python app.py`, `flask run` o un servidor WSGI. No se hace en el proceso padre del recargador
+    de debug (`FLASK_DEBUG=1`), que no atiende peticiones, para no lanzar cada trabajo dos veces,
+    ni cuando el módulo se importa como `__mp_main__` en los procesos de renderizado.
+    """
+    global _jobs_resumed
+    if _jobs_resumed or __name__ == '__mp_main__':
+        return
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    _jobs_resumed = True
+    resume_interrupted_jobs()
+
+resume_jobs_on_startup()
+
 if __name__ == '__main__':
     print("Iniciando aplicación Flask...")
     print("Cargando modelos sísmicos (dataset por defecto 'stead')...")
@@ -478,4 +1099,6 @@ if __name__ == '__main__':
         print(f"Advertencia: No se pudieron cargar los modelos al inicio: {e}")
         print("Los modelos se cargarán cuando sea necesario con el dataset seleccionado por el usuario.")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # El modo debug (con recargador) se activa con FLASK_DEBUG=1, como en `flask run`; los trabajos
+    # interrumpidos ya se reanudaron al importar el módulo (ver `resume_jobs_on_startup`).
+    app.run(debug=app.debug, host='0.0.0.0', port=5000)
@@ -0,0 +1,169 @@
+import os
+import json
+import shutil
+import threading
+from obspy import read
+
+"""
+Puntos de control (checkpoints) persistentes para trabajos largos.
+
+Un trabajo de decenas de archivos puede tardar horas; si el servidor se reinicia a mitad, el estado
+en memoria (`processing_status`) se pierde y el trabajo tendría que repetirse desde el principio.
+`JobCheckpoint` guarda en la carpeta de resultados del trabajo qué archivos y qué etapas de cada
+archivo (cada banda de filtrado y cada tipo de gráfico) ya terminaron, junto con las predicciones
+de las bandas terminadas, para que un trabajo reanudado continúe desde la última etapa completa.
+"""
+
+# Nombre del archivo de checkpoint dentro de la carpeta de resultados del trabajo.
+CHECKPOINT_FILENAME = "job_checkpoint.json"
+# Carpeta (dentro de la carpeta del trabajo) con las predicciones de las bandas ya procesadas.
+CHECKPOINT_DATA_FOLDER = "_checkpoint"
+
+
+class JobCheckpoint:
+    """
+    Estado persistente de un trabajo: parámetros, progreso y etapas terminadas por archivo.
+
+    Las etapas se identifican con cadenas: `"band:<filtro>"` para la inferencia y los CSV de una
+    banda, y `"plots:individual"` / `"plots:comparison"` para los gráficos. Cada cambio se escribe
+    de forma atómica (archivo temporal + reemplazo), así que un corte en cualquier momento deja
+    el último estado completo en disco.
+    """
+
+    def __init__(self, job_dir, params=None):
+        """
+        Args:
+            job_dir (str): Carpeta de resultados del trabajo.
+            params (dict, optional): Parámetros del trabajo (`job_id`, `mseed_files`,
+                `window_length_minutes`, `dataset`). Si se indican y difieren de los guardados,
+                el checkpoint anterior se descarta. Si es None, se carga el checkpoint existente.
+        """
+        self.job_dir = job_dir
+        self.path = os.path.join(job_dir, CHECKPOINT_FILENAME)
+        self.data_dir = os.path.join(job_dir, CHECKPOINT_DATA_FOLDER)
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+        if params is not None and (self._state is None or self._state.get('params') != params):
+            self._state = {'params': params, 'progress': {}, 'files': {}}
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+            self._save()
+        elif self._state is None:
+            self._state = {'params': {}, 'progress': {}, 'files': {}}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: checkpoint ilegible en {self.path}, se ignora: {e}")
+            return None
+
+    def _save(self):
+        os.makedirs(self.job_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def params(self):
+        return self._state['params']
+
+    @property
+    def progress(self):
+        return self._state['progress']
+
+    def save_progress(self, status):
+        """Guarda el último estado de progreso publicado por `/progress` (un diccionario serializable)."""
+        with self._lock:
+            self._state['progress'] = status
+            self._save()
+
+    def _file_entry(self, basename):
+        return self._state['files'].setdefault(basename, {'done': False, 'stages': []})
+
+    def is_file_done(self, basename):
+        return self._state['files'].get(basename, {}).get('done', False)
+
+    def mark_file_done(self, basename):
+        """Marca un archivo como terminado y borra las predicciones intermedias que ya no se necesitan."""
+        with self._lock:
+            self._file_entry(basename)['done'] = True
+            self._save()
+        shutil.rmtree(os.path.join(self.data_dir, basename), ignore_errors=True)
+
+    def is_stage_done(self, basename, stage):
+        return stage in self._state['files'].get(basename, {}).get('stages', [])
+
+    def mark_stage_done(self, basename, stage):
+        with self._lock:
+            stages = self._file_entry(basename)['stages']
+            if stage not in stages:
+                stages.append(stage)
+            self._save()
+
+    def _predictions_path(self, basename, band, model_key):
+        return os.path.join(self.data_dir, basename, f"{band}_{model_key}.pickle")
+
+    def save_band(self, basename, band, predictions):
+        """
+        Guarda las predicciones de una banda y la marca como terminada.
+
+        Args:
+            basename (str): Nombre base del archivo MiniSEED.
+            band (str): Tipo de filtro ("original", "0.5-2Hz", ...).
+            predictions (dict): Salida de `process_stream_with_models` (streams de anotaciones por modelo).
+        """
+        for model_key, stream in predictions.items():
+            path = self._predictions_path(basename, band, model_key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            stream.write(path + ".tmp", format="PICKLE")
+            os.replace(path + ".tmp", path)
+        self.mark_stage_done(basename, f"band:{band}")
+
+    def load_band(self, basename, band, model_keys=("pn_preds", "eqt_preds", "gpd_preds")):
+        """
+        Recupera las predicciones de una banda terminada.
+
+        Returns:
+            dict or None: Las predicciones por modelo, o None si la banda no terminó o faltan datos.
+        """
+        if not self.is_stage_done(basename, f"band:{band}"):
+            return None
+        predictions = {}
+        for model_key in model_keys:
+            path = self._predictions_path(basename, band, model_key)
+            if not os.path.exists(path):
+                return None
+            try:
+                predictions[model_key] = read(path, format="PICKLE")
+            except Exception as e:
+                print(f"Advertencia: no se pudieron leer las predicciones guardadas de {basename} ({band}): {e}")
+                return None
+        return predictions
+
+    def finish(self):
+        """Elimina los datos intermedios al terminar el trabajo (el JSON se conserva)."""
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+def find_job_checkpoints(results_folder):
+    """
+    Busca los checkpoints de todos los trabajos bajo la carpeta de resultados.
+
+    Returns:
+        list: Instancias de `JobCheckpoint` de los trabajos encontrados.
+    """
+    checkpoints = []
+    if not os.path.isdir(results_folder):
+        return checkpoints
+    for name in sorted(os.listdir(results_folder)):
+        job_dir = os.path.join(results_folder, name)
+        if os.path.isfile(os.path.join(job_dir, CHECKPOINT_FILENAME)):
+            checkpoint = JobCheckpoint(job_dir)
+            if checkpoint.params:
+                checkpoints.append(checkpoint)
+    return checkpoints
@@ -0,0 +1,246 @@
+import os
+import math
+import hashlib
+import threading
+import numpy as np
+from obspy import Stream, Trace, UTCDateTime
+
+"""
+Caché persistente de anotaciones (probabilidades de los modelos) por bloques de tiempo.
+
+Es común procesar rangos de tiempo solapados de la misma estación: un archivo de 00 a 12 h y después
+uno de 00 a 24 h, o el mismo día con otra duración de ventana para los gráficos. Las salidas de
+`model.annotate()` para las horas en común son idénticas, así que se guardan por bloque (hora) y se
+reutilizan. Cada bloque se identifica por la estación, el inicio del bloque, el hash de los datos de
+entrada (incluyendo el margen de contexto), el modelo, el dataset y la banda de filtrado; si los datos
+difieren, por ejemplo en el último bloque de un archivo incompleto, el hash cambia y el bloque se recalcula.
+"""
+
+
+class ChunkInferenceCache:
+    """
+    Ejecuta `model.annotate()` por bloques alineados a tiempo absoluto y guarda cada bloque en disco.
+
+    Cada bloque `[c0, c1)` se anota con un margen de contexto igual a la ventana de entrada del modelo
+    a cada lado, y solo se conservan las muestras dentro de `[c0, c1)`. Los bloques se guardan en
+    `cache_dir/<dataset>/<modelo>/<banda>/<red.estación.loc>/<c0>_<hash>.npz`.
+
+    Nota: como las ventanas del modelo se alinean al inicio de cada bloque y no al inicio del archivo,
+    las probabilidades pueden diferir ligeramente de las de una sola llamada a `annotate()` sobre el
+    stream completo, pero son idénticas entre trabajos que comparten los mismos datos.
+    """
+
+    def __init__(self, cache_dir, dataset, chunk_seconds=3600, max_bytes=50 * 1024 ** 3):
+        """
+        Args:
+            cache_dir (str): Carpeta raíz de la caché (compartida entre datasets).
+            dataset (str): Dataset de preentrenamiento de los modelos; forma parte de la clave.
+            chunk_seconds (int, optional): Duración de cada bloque en segundos. Por defecto 1 hora.
+            max_bytes (int, optional): Tamaño máximo de la caché. Al superarlo se eliminan los
+                bloques más antiguos. Por defecto 50 GB.
+        """
+        self.cache_dir = cache_dir
+        self.dataset = dataset
+        self.chunk_seconds = chunk_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size_bytes = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _context_seconds(model):
+        """Margen de contexto en segundos: una ventana de entrada completa del modelo."""
+        in_samples = getattr(model, 'in_samples', None)
+        sampling_rate = getattr(model, 'sampling_rate', None) or 100
+        if in_samples:
+            return in_samples / sampling_rate
+        return 60.0
+
+    @staticmethod
+    def _segment_hash(segment, context_seconds):
+        """Hash de los datos de entrada de un bloque (ids, tiempos, frecuencia y muestras)."""
+        digest = hashlib.sha1()
+        digest.update(repr(context_seconds).encode('utf-8'))
+        for tr in sorted(segment, key=lambda t: t.id):
+            digest.update(tr.id.encode('utf-8'))
+            digest.update(str(tr.stats.starttime.ns).encode('utf-8'))
+            digest.update(repr(float(tr.stats.sampling_rate)).encode('utf-8'))
+            digest.update(np.ascontiguousarray(tr.data).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _trim_to_chunk(annotations, c0_ns, c1_ns):
+        """
+        Recorta cada traza de anotación a las muestras cuyo tiempo cae en `[c0, c1)`.
+
+        Returns:
+            dict: Arreglos listos para `np.savez`, con los datos y metadatos de cada canal.
+        """
+        arrays = {}
+        for tr in annotations:
+            sr = tr.stats.sampling_rate
+            start_ns = tr.stats.starttime.ns
+            i0 = max(0, math.ceil((c0_ns - start_ns) * sr / 1e9 - 1e-6))
+            i1 = min(tr.stats.npts, math.ceil((c1_ns - start_ns) * sr / 1e9 - 1e-6))
+            if i1 <= i0:
+                continue
+            channel = tr.stats.channel
+            arrays[f"{channel}__data"] = np.asarray(tr.data[i0:i1], dtype=np.float32)
+            arrays[f"{channel}__start_ns"] = np.array(start_ns + round(i0 * 1e9 / sr), dtype=np.int64)
+            arrays[f"{channel}__sampling_rate"] = np.array(sr, dtype=np.float64)
+            arrays[f"{channel}__nsl"] = np.array([tr.stats.network, tr.stats.station, tr.stats.location])
+        return arrays
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as npz:
+                return {k: npz[k] for k in npz.files}
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: bloque de caché ilegible {path}: {e}")
+            return None
+
+    def _save(self, path, arrays):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Nombre temporal propio de cada hilo: dos trabajos pueden calcular el mismo bloque a la
+        # vez; los dos escriben el mismo contenido y gana el último `os.replace`. No termina en
+        # `.npz` para que `_prune` no lo cuente ni lo borre mientras se escribe.
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            # Sin el bloque en caché solo se pierde la reutilización: las anotaciones ya están calculadas.
+            print(f"Advertencia: no se pudo guardar el bloque de caché {path}: {e}")
+            return
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = self._disk_usage()
+            self._size_bytes += size
+            if self._size_bytes > self.max_bytes:
+                self._prune()
+
+    def _chunk_files(self):
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.npz'):
+                    yield os.path.join(root, name)
+
+    def _disk_usage(self):
+        return sum(os.path.getsize(p) for p in self._chunk_files())
+
+    def _prune(self):
+        """Elimina los bloques usados hace más tiempo hasta quedar bajo `max_bytes`."""
+        files = sorted(self._chunk_files(), key=os.path.getmtime)
+        total = sum(os.path.getsize(p) for p in files)
+        for path in files:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+        self._size_bytes = total
+
+    def annotate(self, model, model_name, stream, band):
+        """
+        Equivalente a `model.annotate(stream)` que solo ejecuta inferencia en los bloques que no
+        están en la caché.
+
+        Args:
+            model: Modelo de SeisBench cargado.
+            model_name (str): Nombre del modelo ("PhaseNet", "EQTransformer", "GPD").
+            stream (obspy.core.stream.Stream): Stream (original o filtrado) a anotar.
+            band (str): Tipo de filtro del stream ("original", "0.5-2Hz", ...).
+
+        Returns:
+            obspy.core.stream.Stream: Stream de anotaciones con los mismos canales que `annotate()`.
+        """
+        context = self._context_seconds(model)
+        cs = self.chunk_seconds
+        hits = misses = 0
+        output = Stream()
+
+        instruments = sorted({(tr.stats.network, tr.stats.station, tr.stats.location) for tr in stream})
+        for network, station, location in instruments:
+            inst_stream = stream.select(network=network, station=station, location=location)
+            nsl = f"{network}.{station}.{location}"
+            t_start = min(tr.stats.starttime for tr in inst_stream)
+            t_end = max(tr.stats.endtime for tr in inst_stream)
+            chunk_dir = os.path.join(self.cache_dir, self.dataset, model_name, band, nsl)
+
+            # Fragmentos por canal de salida: lista de (inicio_ns, frecuencia, datos, nsl)
+            pieces = {}
+            c0 = math.floor(t_start.timestamp / cs) * cs
+            while c0 < t_end.timestamp:
+                c1 = c0 + cs
+                segment = inst_stream.slice(UTCDateTime(c0) - context, UTCDateTime(c1) + context)
+                if len(segment) > 0:
+                    path = os.path.join(chunk_dir, f"{int(c0)}_{self._segment_hash(segment, context)}.npz")
+                    arrays = self._load(path)
+                    if arrays is None:
+                        annotations = model.annotate(segment)
+                        arrays = self._trim_to_chunk(annotations, int(c0) * 10**9, int(c1) * 10**9)
+                        self._save(path, arrays)
+                        del annotations
+                        misses += 1
+                    else:
+                        try:
+                            os.utime(path)
+                        except OSError:
+                            pass  # Borrado por `_prune` de otro trabajo: los datos ya están leídos.
+                        hits += 1
+
+                    for key in arrays:
+                        if key.endswith("__data"):
+                            channel = key[:-len("__data")]
+                            pieces.setdefault(channel, []).append((
+                                int(arrays[f"{channel}__start_ns"]),
+                                float(arrays[f"{channel}__sampling_rate"]),
+                                arrays[key],
+                                arrays[f"{channel}__nsl"]
+                            ))
+                c0 = c1
+
+            for channel, channel_pieces in pieces.items():
+                output += self._assemble(channel, channel_pieces)
+
+        self.hits += hits
+        self.misses += misses
+        print(f"Caché de inferencia {model_name} ({band}): {hits} bloques reutilizados, {misses} calculados")
+        return output
+
+    @staticmethod
+    def _assemble(channel, pieces):
+        """Une los fragmentos de un canal en una sola traza continua (los huecos quedan en cero)."""
+        pieces.sort(key=lambda p: p[0])
+        start_ns, sr, _, nsl = pieces[0]
+        last_start, _, last_data, _ = pieces[-1]
+        total = round((last_start - start_ns) * sr / 1e9) + len(last_data)
+        data = np.zeros(total, dtype=np.float32)
+        for piece_start, _, piece_data, _ in pieces:
+            offset = round((piece_start - start_ns) * sr / 1e9)
+            data[offset:offset + len(piece_data)] = piece_data[:total - offset]
+        return Trace(data=data, header={
+            'network': str(nsl[0]),
+            'station': str(nsl[1]),
+            'location': str(nsl[2]),
+            'channel': channel,
+            'starttime': UTCDateTime(ns=start_ns),
+            'sampling_rate': sr
+        })
+
+    def stats(self):
+        """Retorna los aciertos/fallos acumulados por esta instancia."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
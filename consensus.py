@@ -0,0 +1,196 @@
+import os
+import csv
+import numpy as np
+from pick_table import iso_from_ns
+
+"""
+Picks de consenso entre modelos y bandas.
+
+Cada archivo produce 15 listas de picks independientes (3 modelos × 5 bandas) y había que
+compararlas a ojo. Esta etapa las reúne y agrupa, por estación y fase, los picks que caen a menos
+de `tolerance` segundos del anterior: todos los picks se ordenan una vez (`np.lexsort`, O(n log n)),
+un nuevo grupo empieza donde cambia la estación o la fase o donde el salto de tiempo supera la
+tolerancia, y las estadísticas de cada grupo se calculan con `np.*.reduceat` sin bucles de Python.
+Los votos cuentan fuentes distintas (banda y modelo): cada fuente es un bit de una máscara que se
+combina con `np.bitwise_or.reduceat`, así que dos picks del mismo modelo y banda en el mismo grupo
+cuentan un solo voto.
+
+El consenso se calcula a partir de las tablas de picks ya escritas, por lo que vale igual para
+archivos recién procesados, recuperados de la caché o re-pickeados.
+"""
+
+# Tolerancia por defecto para agrupar picks (segundos entre picks consecutivos del grupo).
+CONSENSUS_TOLERANCE_SECONDS = 0.5
+# Sufijo del CSV de consenso de cada archivo (`{basename}_consensus.csv`).
+CONSENSUS_SUFFIX = "_consensus.csv"
+
+CONSENSUS_HEADER = [
+    "filename", "station", "phase", "time", "votes", "n_picks",
+    "spread_seconds", "span_seconds", "max_peak_value", "sources"
+]
+
+
+def read_pick_tables(results_folder, basename):
+    """
+    Lee las tablas de picks de un archivo (todas las bandas y modelos) en columnas.
+
+    Args:
+        results_folder (str): Carpeta `resultados_detecciones_filtrados` del archivo.
+        basename (str): Nombre base del archivo MiniSEED.
+
+    Returns:
+        dict: 'station' (id de traza), 'phase', 'source' (índice en 'sources'), 'time' (ns, int64),
+            'peak_value' (float64) y 'sources' (lista de "banda:modelo").
+    """
+    stations, phases, times, values, source_ids = [], [], [], [], []
+    sources = []
+    prefix = f"{basename}_"
+    for name in sorted(os.listdir(results_folder)):
+        if not (name.startswith(prefix) and name.endswith("_picks.csv")):
+            continue
+        parts = name[len(prefix):-len("_picks.csv")].rsplit("_", 1)
+        if len(parts) != 2:
+            continue
+        with open(os.path.join(results_folder, name), 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                continue
+            columns = {column: i for i, column in enumerate(header)}
+            rows = [row for row in reader if row]
+        if not rows:
+            continue
+        source_id = len(sources)
+        sources.append(f"{parts[0]}:{parts[1]}")
+        stations.extend(row[columns['channel']] for row in rows)
+        phases.extend(row[columns['phase']] for row in rows)
+        times.extend(row[columns['peak_time']] for row in rows)
+        values.extend(row[columns['peak_value']] for row in rows)
+        source_ids.extend([source_id] * len(rows))
+
+    # ISO 8601 sin zona horaria: numpy lo convierte a nanosegundos en una sola llamada.
+    time_ns = np.array(times, dtype='datetime64[ns]').astype(np.int64)
+    peak_values = np.array([v if v not in ("", "None", "N/A") else "nan" for v in values], dtype=np.float64)
+    return {
+        'station': np.array(stations, dtype=object),
+        'phase': np.array(phases, dtype=object),
+        'source': np.array(source_ids, dtype=np.int64),
+        'time': time_ns,
+        'peak_value': peak_values,
+        'sources': sources
+    }
+
+
+def consensus_picks(station, phase, time_ns, source, peak_value, tolerance=CONSENSUS_TOLERANCE_SECONDS):
+    """
+    Agrupa picks de varias fuentes y calcula un pick de consenso por grupo.
+
+    Args:
+        station (numpy.ndarray): Estación (o id de traza) de cada pick.
+        phase (numpy.ndarray): Fase de cada pick ("P", "S").
+        time_ns (numpy.ndarray): `peak_time` de cada pick en nanosegundos (int64).
+        source (numpy.ndarray): Índice de la fuente (banda y modelo) de cada pick, menor que 63.
+        peak_value (numpy.ndarray): Confianza de cada pick.
+        tolerance (float, optional): Separación máxima en segundos entre picks consecutivos de un grupo.
+
+    Returns:
+        dict: Columnas de los picks de consenso ordenados por estación, fase y tiempo: 'station',
+            'phase', 'time' (media, ns), 'votes' (fuentes distintas), 'n_picks', 'spread_seconds'
+            (desviación estándar), 'span_seconds' (último menos primero), 'max_peak_value' y
+            'source_mask' (bits de las fuentes del grupo).
+    """
+    count = len(time_ns)
+    if count == 0:
+        empty = np.array([], dtype=np.int64)
+        return {'station': np.array([], dtype=object), 'phase': np.array([], dtype=object), 'time': empty,
+                'votes': empty, 'n_picks': empty, 'spread_seconds': np.array([]), 'span_seconds': np.array([]),
+                'max_peak_value': np.array([]), 'source_mask': empty}
+
+    # Códigos enteros de estación y fase para ordenar sin comparar cadenas en cada paso.
+    station_names, station_codes = np.unique(station, return_inverse=True)
+    phase_names, phase_codes = np.unique(phase, return_inverse=True)
+    order = np.lexsort((time_ns, phase_codes, station_codes))
+    station_codes = station_codes[order]
+    phase_codes = phase_codes[order]
+    times = time_ns[order]
+    sources = source[order]
+    values = peak_value[order]
+
+    # Inicio de cada grupo: primer pick, cambio de estación o fase, o salto mayor que la tolerancia.
+    new_group = np.empty(count, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = ((station_codes[1:] != station_codes[:-1]) | (phase_codes[1:] != phase_codes[:-1]) |
+                     (np.diff(times) > int(round(tolerance * 1e9))))
+    starts = np.flatnonzero(new_group)
+    group = np.cumsum(new_group) - 1
+
+    n_picks = np.diff(np.append(starts, count))
+    # Tiempos relativos al primer pick del grupo (en segundos) para que las sumas no desborden.
+    relative = (times - times[starts][group]) / 1e9
+    mean = np.add.reduceat(relative, starts) / n_picks
+    mean_sq = np.add.reduceat(relative * relative, starts) / n_picks
+    spread = np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+    span = np.maximum.reduceat(relative, starts)
+    max_value = np.fmax.reduceat(values, starts)
+
+    masks = np.bitwise_or.reduceat(np.left_shift(np.int64(1), sources), starts)
+    votes = np.zeros(len(starts), dtype=np.int64)
+    remaining = masks.copy()
+    while remaining.any():
+        votes += remaining & 1
+        remaining >>= 1
+
+    return {
+        'station': station_names[station_codes[starts]],
+        'phase': phase_names[phase_codes[starts]],
+        'time': times[starts] + np.round(mean * 1e9).astype(np.int64),
+        'votes': votes,
+        'n_picks': n_picks,
+        'spread_seconds': spread,
+        'span_seconds': span,
+        'max_peak_value': max_value,
+        'source_mask': masks
+    }
+
+
+def write_consensus(results_folder, basename, tolerance=CONSENSUS_TOLERANCE_SECONDS):
+    """
+    Calcula y guarda los picks de consenso de un archivo en `{basename}_consensus.csv`.
+
+    Args:
+        results_folder (str): Carpeta `resultados_detecciones_filtrados` del archivo.
+        basename (str): Nombre base del archivo MiniSEED.
+        tolerance (float, optional): Tolerancia de agrupamiento en segundos.
+
+    Returns:
+        int: Número de picks de consenso escritos, o None si el archivo no tiene tablas de picks.
+    """
+    if not os.path.isdir(results_folder):
+        return None
+    picks = read_pick_tables(results_folder, basename)
+    result = consensus_picks(picks['station'], picks['phase'], picks['time'], picks['source'],
+                             picks['peak_value'], tolerance)
+
+    # Nombres de las fuentes de cada máscara distinta (hay pocas aunque haya muchos grupos).
+    unique_masks, mask_index = np.unique(result['source_mask'], return_inverse=True)
+    mask_names = ["|".join(name for bit, name in enumerate(picks['sources']) if int(mask) >> bit & 1)
+                  for mask in unique_masks]
+    times = iso_from_ns(result['time']) if len(result['time']) else []
+    rows = zip(
+        [basename] * len(result['time']), result['station'], result['phase'], times,
+        result['votes'].tolist(), result['n_picks'].tolist(),
+        np.round(result['spread_seconds'], 3).tolist(), np.round(result['span_seconds'], 3).tolist(),
+        ["" if np.isnan(v) else round(float(v), 6) for v in result['max_peak_value']],
+        [mask_names[i] for i in mask_index]
+    )
+
+    path = os.path.join(results_folder, f"{basename}{CONSENSUS_SUFFIX}")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CONSENSUS_HEADER)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+    print(f"Picks de consenso de {basename}: {len(result['time'])} ({len(picks['time'])} picks de "
+          f"{len(picks['sources'])} tablas)")
+    return len(result['time'])
@@ -0,0 +1,115 @@
+import numpy as np
+from obspy import UTCDateTime
+from seisbench.util import Pick, Detection
+
+"""
+Extracción vectorizada de picks y detecciones a partir de las curvas de probabilidad de los modelos.
+
+Reproduce exactamente `WaveformModel.picks_from_annotations` / `detections_from_annotations` de
+SeisBench (disparo clásico on/off de ObsPy con umbral de apagado igual a la mitad del umbral de
+encendido), pero recorriendo la traza completa una sola vez, sin colas de índices en Python ni el
+arreglo completo de tiempos (`trace.times()`) por cada canal. Con esto, recalcular los picks de un día entero con umbrales
+nuevos toma segundos y no requiere ejecutar los modelos.
+"""
+
+
+def trigger_regions(data, threshold):
+    """
+    Calcula los disparos de una curva de probabilidad y su máximo dentro de cada disparo.
+
+    Equivale a `obspy.signal.trigger.trigger_onset(data, threshold, threshold / 2)`: cada tramo
+    continuo con valores >= `threshold / 2` que contiene algún valor >= `threshold` produce un disparo
+    que empieza en la primera muestra >= `threshold` y termina en la última muestra del tramo.
+
+    Args:
+        data (numpy.ndarray): Curva de probabilidad (1D).
+        threshold (float): Umbral de encendido.
+
+    Returns:
+        tuple: Cuatro arreglos de igual longitud: muestra de inicio, muestra de fin (incluida),
+            muestra del máximo (la primera, si se repite) y valor máximo de cada disparo.
+    """
+    data = np.asarray(data)
+    empty = np.zeros(0, dtype=np.int64)
+
+    # Una sola pasada sobre la traza completa; el resto trabaja solo con las muestras que
+    # superan el umbral de apagado (pocas en un día tranquilo).
+    above_off = np.flatnonzero(data >= threshold / 2)
+    values = data[above_off]
+    on_pos = np.flatnonzero(values >= threshold)
+    if len(on_pos) == 0:
+        return empty, empty, empty, np.zeros(0, dtype=data.dtype)
+
+    # Tramos continuos por encima del umbral de apagado y tramo de cada muestra sobre el de encendido.
+    run_break = np.empty(len(above_off), dtype=bool)
+    run_break[0] = True
+    run_break[1:] = np.diff(above_off) > 1
+    run_id = np.cumsum(run_break) - 1
+    run_last_pos = np.append(np.flatnonzero(run_break)[1:], len(above_off)) - 1
+    run_of_on = run_id[on_pos]
+
+    # Cada tramo con alguna muestra sobre el umbral de encendido es un disparo; empieza en la primera.
+    first_on = np.flatnonzero(np.diff(run_of_on, prepend=-1))
+    starts = above_off[on_pos[first_on]]
+    ends = above_off[run_last_pos[run_of_on[first_on]]]
+
+    # El máximo de un disparo siempre supera el umbral de encendido, así que basta con reducir
+    # sobre esas muestras, que ya están agrupadas por disparo.
+    on_values = values[on_pos]
+    peak_values = np.maximum.reduceat(on_values, first_on)
+    trigger_of_on = np.repeat(np.arange(len(first_on)), np.diff(np.append(first_on, len(on_pos))))
+    hits = np.flatnonzero(on_values == peak_values[trigger_of_on])
+    first_hit = hits[np.flatnonzero(np.diff(trigger_of_on[hits], prepend=-1))]
+    peaks = above_off[on_pos[first_hit]]
+
+    return starts, ends, peaks, peak_values
+
+
+def _sample_times(trace, samples):
+    """Tiempos de las muestras como `UTCDateTime`, redondeados igual que `starttime + trace.times()[i]`."""
+    offsets_ns = np.round(samples / trace.stats.sampling_rate * 1e9).astype(np.int64)
+    start_ns = trace.stats.starttime.ns
+    return [UTCDateTime(ns=start_ns + int(offset)) for offset in offsets_ns]
+
+
+def picks_from_annotations(annotations, threshold, phase):
+    """
+    Versión vectorizada de `WaveformModel.picks_from_annotations`.
+
+    Args:
+        annotations (obspy.core.stream.Stream): Trazas de probabilidad de una sola fase.
+        threshold (float): Umbral de encendido.
+        phase (str): Fase con la que se etiquetan los picks.
+
+    Returns:
+        list: Objetos `seisbench.util.Pick` ordenados.
+    """
+    picks = []
+    for trace in annotations:
+        trace_id = f"{trace.stats.network}.{trace.stats.station}.{trace.stats.location}"
+        starts, ends, peaks, peak_values = trigger_regions(trace.data, threshold)
+        if len(starts) == 0:
+            continue
+        for t0, t1, t_peak, peak_value in zip(_sample_times(trace, starts), _sample_times(trace, ends),
+                                              _sample_times(trace, peaks), peak_values):
+            picks.append(Pick(trace_id=trace_id, start_time=t0, end_time=t1, peak_time=t_peak,
+                              peak_value=peak_value, phase=phase))
+    return sorted(picks)
+
+
+def detections_from_annotations(annotations, threshold):
+    """
+    Versión vectorizada de `WaveformModel.detections_from_annotations`.
+
+    Returns:
+        list: Objetos `seisbench.util.Detection` ordenados.
+    """
+    detections = []
+    for trace in annotations:
+        trace_id = f"{trace.stats.network}.{trace.stats.station}.{trace.stats.location}"
+        starts, ends, _, peak_values = trigger_regions(trace.data, threshold)
+        if len(starts) == 0:
+            continue
+        for t0, t1, peak_value in zip(_sample_times(trace, starts), _sample_times(trace, ends), peak_values):
+            detections.append(Detection(trace_id=trace_id, start_time=t0, end_time=t1, peak_value=peak_value))
+    return sorted(detections)
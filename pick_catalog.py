@@ -0,0 +1,231 @@
+import os
+import csv
+import glob
+import sqlite3
+import threading
+from contextlib import contextmanager
+from obspy import UTCDateTime
+
+"""
+Catálogo de picks de todos los trabajos en una base de datos SQLite indexada.
+
+Los picks de cada trabajo quedan repartidos en miles de CSV (`{basename}_{filtro}_{modelo}_picks.csv`,
+uno por archivo, banda y modelo). Para responder consultas como "todos los picks P de la estación X
+la semana pasada con peak_value > 0.8" habría que recorrer y leer todos esos archivos. Al terminar
+cada trabajo sus CSV se cargan en bloque en este catálogo, con índices por tiempo, estación, canal,
+modelo, banda y fase, y la API de consulta pagina con un cursor sobre (peak_time, id) para que cada
+página cueste lo mismo aunque el catálogo tenga millones de picks.
+
+Los tiempos se guardan como enteros en nanosegundos (`UTCDateTime.ns`) para que las comparaciones
+sean exactas.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS picks (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    model TEXT NOT NULL,
+    filter_type TEXT NOT NULL,
+    network TEXT NOT NULL,
+    station TEXT NOT NULL,
+    location TEXT NOT NULL,
+    trace_id TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    start_time INTEGER,
+    end_time INTEGER,
+    peak_time INTEGER NOT NULL,
+    peak_value REAL
+);
+CREATE INDEX IF NOT EXISTS idx_picks_time ON picks (peak_time, id);
+CREATE INDEX IF NOT EXISTS idx_picks_station_time ON picks (station, peak_time, id);
+CREATE INDEX IF NOT EXISTS idx_picks_trace_time ON picks (trace_id, peak_time, id);
+CREATE INDEX IF NOT EXISTS idx_picks_model_phase_time ON picks (model, phase, peak_time, id);
+CREATE INDEX IF NOT EXISTS idx_picks_band_time ON picks (filter_type, peak_time, id);
+CREATE INDEX IF NOT EXISTS idx_picks_job ON picks (job_id);
+"""
+
+# Filtros de igualdad admitidos por `query` y la columna correspondiente.
+EQUALITY_FILTERS = {
+    'job_id': 'job_id',
+    'network': 'network',
+    'station': 'station',
+    'location': 'location',
+    'trace_id': 'trace_id',
+    'model': 'model',
+    'filter_type': 'filter_type',
+    'phase': 'phase'
+}
+
+
+def _time_ns(value):
+    """Convierte una cadena ISO 8601 (o 'N/A') de los CSV a nanosegundos; None si no hay tiempo."""
+    if not value or value == "N/A":
+        return None
+    return UTCDateTime(value).ns
+
+
+def _iso(ns):
+    return UTCDateTime(ns=ns).isoformat() if ns is not None else None
+
+
+class PickCatalog:
+    """
+    Catálogo SQLite de picks. Cada operación abre su propia conexión, así que una instancia se puede
+    compartir entre los hilos del servidor; las escrituras se serializan con un candado.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path (str): Ruta del archivo SQLite (se crea si no existe).
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Abre una conexión, confirma la transacción al salir (o la revierte si hay error) y la cierra."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _read_picks_csv(csv_path, job_id):
+        """Genera las filas del catálogo a partir de un CSV de picks."""
+        with open(csv_path, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                peak_time = _time_ns(row.get('peak_time'))
+                if peak_time is None:
+                    continue
+                trace_id = row.get('channel', '')
+                network, station, location = (trace_id.split('.') + ['', '', ''])[:3]
+                try:
+                    peak_value = float(row.get('peak_value'))
+                except (TypeError, ValueError):
+                    peak_value = None
+                yield (
+                    job_id, row.get('filename', ''), row.get('modelo', ''), row.get('filter_type', ''),
+                    network, station, location, trace_id, row.get('phase', ''),
+                    _time_ns(row.get('start_time')), _time_ns(row.get('end_time')), peak_time, peak_value
+                )
+
+    def load_job(self, job_id, results_folder):
+        """
+        Carga (o recarga) en bloque todos los CSV de picks de un trabajo.
+
+        Los picks anteriores del mismo trabajo se reemplazan en la misma transacción, así que se
+        puede llamar de nuevo tras un re-pick sin duplicar filas.
+
+        Args:
+            job_id (str): Identificador del trabajo.
+            results_folder (str): Carpeta de resultados del trabajo.
+
+        Returns:
+            int: Número de picks cargados.
+        """
+        csv_paths = sorted(glob.glob(os.path.join(
+            results_folder, "*", "resultados_detecciones_filtrados", "*_picks.csv"
+        )))
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM picks WHERE job_id = ?", (job_id,))
+            count = 0
+            for csv_path in csv_paths:
+                rows = list(self._read_picks_csv(csv_path, job_id))
+                conn.executemany(
+                    "INSERT INTO picks (job_id, filename, model, filter_type, network, station, location, "
+                    "trace_id, phase, start_time, end_time, peak_time, peak_value) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                count += len(rows)
+        print(f"Catálogo de picks: {count} picks cargados del trabajo {job_id}")
+        return count
+
+    def delete_job(self, job_id):
+        """Elimina del catálogo los picks de un trabajo."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM picks WHERE job_id = ?", (job_id,))
+
+    def query(self, starttime=None, endtime=None, min_peak_value=None, limit=100, cursor=None, **filters):
+        """
+        Consulta picks ordenados por tiempo.
+
+        Args:
+            starttime (obspy.core.utcdatetime.UTCDateTime, optional): Inicio del intervalo (peak_time >=).
+            endtime (obspy.core.utcdatetime.UTCDateTime, optional): Fin del intervalo (peak_time <).
+            min_peak_value (float, optional): Valor mínimo de `peak_value`.
+            limit (int, optional): Tamaño de la página. Por defecto 100.
+            cursor (str, optional): Valor `next_cursor` de la página anterior.
+            **filters: Filtros de igualdad (ver `EQUALITY_FILTERS`), por ejemplo `station="STA"`.
+
+        Returns:
+            dict: 'picks' (lista de diccionarios) y 'next_cursor' (None si no hay más resultados).
+
+        Raises:
+            ValueError: Si aparece un filtro desconocido o el cursor no es válido.
+        """
+        clauses = []
+        params = []
+        for key, value in filters.items():
+            if key not in EQUALITY_FILTERS:
+                raise ValueError(f"Filtro desconocido: {key}")
+            if value is not None:
+                clauses.append(f"{EQUALITY_FILTERS[key]} = ?")
+                params.append(value)
+        if starttime is not None:
+            clauses.append("peak_time >= ?")
+            params.append(starttime.ns)
+        if endtime is not None:
+            clauses.append("peak_time < ?")
+            params.append(endtime.ns)
+        if min_peak_value is not None:
+            clauses.append("peak_value >= ?")
+            params.append(float(min_peak_value))
+        if cursor:
+            try:
+                cursor_time, cursor_id = (int(part) for part in cursor.split(":"))
+            except ValueError:
+                raise ValueError("Cursor no válido")
+            clauses.append("(peak_time > ? OR (peak_time = ? AND id > ?))")
+            params.extend([cursor_time, cursor_time, cursor_id])
+
+        sql = ("SELECT id, job_id, filename, model, filter_type, trace_id, phase, "
+               "start_time, end_time, peak_time, peak_value FROM picks")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY peak_time, id LIMIT ?"
+        params.append(int(limit) + 1)
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        picks = [{
+            'job_id': row[1],
+            'filename': row[2],
+            'model': row[3],
+            'filter_type': row[4],
+            'trace_id': row[5],
+            'phase': row[6],
+            'start_time': _iso(row[7]),
+            'end_time': _iso(row[8]),
+            'peak_time': _iso(row[9]),
+            'peak_value': row[10]
+        } for row in rows]
+        next_cursor = f"{rows[-1][9]}:{rows[-1][0]}" if has_more and rows else None
+        return {'picks': picks, 'next_cursor': next_cursor}
+
+    def stats(self):
+        """Número total de picks y de trabajos en el catálogo."""
+        with self._connect() as conn:
+            picks, jobs = conn.execute("SELECT COUNT(*), COUNT(DISTINCT job_id) FROM picks").fetchone()
+        return {'picks': picks, 'jobs': jobs}
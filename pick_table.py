@@ -0,0 +1,330 @@
+import os
+import itertools
+import numpy as np
+from obspy import UTCDateTime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+"""
+Escritura columnar de las tablas de picks y detecciones.
+
+Los CSV de picks se escribían fila a fila: un `getattr` por atributo, un `UTCDateTime.isoformat()`
+por tiempo y una llamada a `csv.writer.writerow` por pick. En días ruidosos, con decenas de miles de
+picks por banda y 15 tablas por archivo, eso tomaba un tiempo apreciable. Aquí los picks se reúnen
+primero en columnas (arreglos de numpy), los tiempos se formatean de forma vectorizada a partir de
+sus nanosegundos y el CSV se escribe de una sola vez.
+
+El contenido del CSV es idéntico byte a byte al que producía `csv.writer` (mismas columnas, mismo
+formato ISO 8601 de `UTCDateTime.isoformat()`, mismos valores y fin de línea `\\r\\n`). Si `pyarrow`
+está instalado, las mismas tablas se pueden guardar también en Parquet y/o Arrow IPC, con los
+tiempos como `timestamp[ns, UTC]` y `peak_value` como número.
+"""
+
+# Formatos de salida admitidos y extensión de cada uno.
+TABLE_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "arrow": ".arrow"
+}
+
+PICK_HEADER = [
+    "filename", "modelo", "filter_type", "channel", "phase",
+    "start_time", "end_time", "peak_time",
+    "peak_value", "trace_length"
+]
+
+DETECTION_HEADER = [
+    "filename", "filter_type", "trace_id", "start_time", "end_time",
+    "peak_value", "peak_time", "duration"
+]
+
+# Caracteres que obligan a `csv.writer` (QUOTE_MINIMAL) a poner un campo entre comillas.
+_CSV_SPECIAL = (',', '"', '\r', '\n')
+
+_arrow_warning_shown = False
+
+
+def iso_from_ns(ns):
+    """
+    Formatea tiempos en nanosegundos como `UTCDateTime(ns=...).isoformat()`, de forma vectorizada.
+
+    Igual que ObsPy, redondea a microsegundos (mitad al par) y omite la fracción cuando es cero.
+
+    Args:
+        ns (numpy.ndarray): Tiempos en nanosegundos desde 1970 (int64).
+
+    Returns:
+        numpy.ndarray: Cadenas ISO 8601.
+    """
+    ns = np.asarray(ns, dtype=np.int64)
+    q, r = np.divmod(ns, 1000)
+    us = q + ((r > 500) | ((r == 500) & (q % 2 == 1)))
+    text = np.datetime_as_string(us.astype('datetime64[us]'), unit='us')
+    whole_seconds = us % 1_000_000 == 0
+    if whole_seconds.any():
+        text = np.where(whole_seconds, text.astype('<U19'), text)
+    return text
+
+
+def _attribute(items, name, default):
+    return [getattr(item, name, default) for item in items]
+
+
+def _csv_field(value):
+    """Representación de un valor tal como la escribe `csv.writer`."""
+    return "" if value is None else str(value)
+
+
+def _quote(values):
+    """Pone entre comillas, como `csv.writer`, los campos que lo necesitan (normalmente ninguno)."""
+    joined = "\x00".join(values)
+    if not any(c in joined for c in _CSV_SPECIAL):
+        return values
+    special = {v for v in set(values) if any(c in v for c in _CSV_SPECIAL)}
+    return ['"' + v.replace('"', '""') + '"' if v in special else v for v in values]
+
+
+def _text_column(values):
+    return _quote([_csv_field(v) for v in values])
+
+
+def _time_column(times, missing=None):
+    """
+    Columna de tiempos.
+
+    Args:
+        times (list): Objetos `UTCDateTime` (o None).
+        missing (str, optional): Texto para los tiempos ausentes. Si es None, se usa `str(valor)`
+            (lo que hacía `save_eqt_detections_to_csv`).
+
+    Returns:
+        tuple: (textos ISO, nanosegundos como int64, máscara de tiempos válidos).
+    """
+    try:
+        # Caso habitual: todos los tiempos son `UTCDateTime` (las cadenas ISO nunca necesitan comillas).
+        ns = np.array([t.ns for t in times], dtype=np.int64)
+        return iso_from_ns(ns).tolist(), ns, np.ones(len(times), dtype=bool)
+    except AttributeError:
+        pass
+    valid = np.fromiter((isinstance(t, UTCDateTime) for t in times), dtype=bool, count=len(times))
+    ns = np.fromiter((t.ns if ok else 0 for t, ok in zip(times, valid)), dtype=np.int64, count=len(times))
+    text = iso_from_ns(ns).tolist()
+    for i in np.flatnonzero(~valid):
+        t = times[i]
+        if missing is not None and not t:
+            text[i] = missing
+        elif hasattr(t, 'isoformat'):
+            text[i] = t.isoformat()
+        else:
+            text[i] = str(t)
+    return _quote(text), ns, valid
+
+
+def _value_column(values):
+    """
+    Columna de `peak_value`. Los valores float32 de los modelos se formatean juntos con numpy,
+    que produce el mismo texto que `str()`.
+
+    Returns:
+        tuple: (textos, valores como float64 con NaN donde no hay número).
+    """
+    if values and all(type(v) is np.float32 for v in values):
+        array = np.array(values, dtype=np.float32)
+        return array.astype(str).tolist(), array.astype(np.float64)
+    numbers = np.array([float(v) if isinstance(v, (int, float, np.number)) else np.nan for v in values],
+                       dtype=np.float64)
+    return _text_column(values), numbers
+
+
+def _write_csv(path, header, columns, count, append):
+    """
+    Escribe (o añade) las filas de una tabla en un CSV de una sola vez.
+
+    `columns` es una lista de columnas de texto ya formateadas; una cadena suelta representa una
+    columna con el mismo valor en todas las filas.
+    """
+    write_header = not (append and os.path.exists(path))
+    expanded = [itertools.repeat(_quote([c])[0], count) if isinstance(c, str) else c for c in columns]
+    lines = []
+    if write_header:
+        lines.append(",".join(_quote(header)))
+    lines.extend(map(",".join, zip(*expanded)))
+    content = "".join(line + "\r\n" for line in lines)
+
+    if append:
+        with open(path, 'a', newline='') as f:
+            f.write(content)
+    else:
+        # Se escribe en un archivo temporal y se reemplaza: si el CSV anterior es un enlace duro
+        # a una entrada de la caché de resultados, esta no cambia.
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', newline='') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def _arrow_available():
+    global _arrow_warning_shown
+    if pa is None and not _arrow_warning_shown:
+        print("Advertencia: pyarrow no está instalado; las tablas solo se guardan en CSV")
+        _arrow_warning_shown = True
+    return pa is not None
+
+
+def _write_arrow(path_base, formats, arrays, append):
+    """Guarda la tabla en Parquet y/o Arrow IPC; en modo `append` se concatena con la existente."""
+    table = pa.table(arrays)
+    for fmt in formats:
+        if fmt not in ("parquet", "arrow"):
+            continue
+        path = path_base + TABLE_FORMATS[fmt]
+        if append and os.path.exists(path):
+            if fmt == "parquet":
+                previous = pq.read_table(path)
+            else:
+                with pa.memory_map(path) as source:
+                    previous = pa.ipc.open_file(source).read_all()
+            table_to_write = pa.concat_tables([previous, table.cast(previous.schema)])
+        else:
+            table_to_write = table
+        tmp_path = path + ".tmp"
+        if fmt == "parquet":
+            pq.write_table(table_to_write, tmp_path)
+        else:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table_to_write.schema) as writer:
+                writer.write_table(table_to_write)
+        os.replace(tmp_path, path)
+
+
+def _arrow_strings(values, count):
+    if isinstance(values, str):
+        values = [values] * count
+    return pa.array([None if v in ("N/A", "None", "") else v for v in values], type=pa.string())
+
+
+def _arrow_times(ns, valid):
+    return pa.array(ns, type=pa.timestamp('ns', tz='UTC'), mask=~valid)
+
+
+def _check_formats(formats):
+    formats = list(formats or ["csv"])
+    unknown = [f for f in formats if f not in TABLE_FORMATS]
+    if unknown:
+        raise ValueError(f"Formato de tabla desconocido: {', '.join(unknown)} "
+                         f"(admitidos: {', '.join(TABLE_FORMATS)})")
+    return formats
+
+
+def write_picks(picks, model_name, basename, path_base, filter_type, append=False, formats=("csv",)):
+    """
+    Escribe la tabla de picks de un modelo y una banda.
+
+    Args:
+        picks (list): Objetos `seisbench.util.Pick` (o con los mismos atributos).
+        model_name (str): Nombre del modelo.
+        basename (str): Nombre base del archivo MiniSEED.
+        path_base (str): Ruta del archivo de salida sin extensión.
+        filter_type (str): Tipo de filtro.
+        append (bool, optional): Añade las filas a la tabla existente. Por defecto False.
+        formats (list, optional): Formatos de `TABLE_FORMATS` a escribir. Por defecto solo CSV.
+
+    Returns:
+        list: Rutas de los archivos escritos.
+
+    Raises:
+        ValueError: Si se pide un formato desconocido.
+    """
+    formats = _check_formats(formats)
+    count = len(picks)
+    trace_ids = _attribute(picks, 'trace_id', 'N/A')
+    phases = _attribute(picks, 'phase', 'N/A')
+    start_text, start_ns, start_valid = _time_column(_attribute(picks, 'start_time', None), "N/A")
+    end_text, end_ns, end_valid = _time_column(_attribute(picks, 'end_time', None), "N/A")
+    peak_text, peak_ns, peak_valid = _time_column(_attribute(picks, 'peak_time', None), "N/A")
+    value_text, values = _value_column(_attribute(picks, 'peak_value', 'N/A'))
+    trace_lengths = _text_column(_attribute(picks, 'trace_length', 'N/A'))
+
+    written = []
+    if "csv" in formats:
+        _write_csv(path_base + ".csv", PICK_HEADER, [
+            basename, model_name, filter_type, _text_column(trace_ids), _text_column(phases),
+            start_text, end_text, peak_text, value_text, trace_lengths
+        ], count, append)
+        written.append(path_base + ".csv")
+
+    arrow_formats = [f for f in formats if f != "csv"]
+    if arrow_formats and _arrow_available():
+        _write_arrow(path_base, arrow_formats, {
+            "filename": _arrow_strings(basename, count),
+            "modelo": _arrow_strings(model_name, count),
+            "filter_type": _arrow_strings(filter_type, count),
+            "channel": _arrow_strings([_csv_field(v) for v in trace_ids], count),
+            "phase": _arrow_strings([_csv_field(v) for v in phases], count),
+            "start_time": _arrow_times(start_ns, start_valid),
+            "end_time": _arrow_times(end_ns, end_valid),
+            "peak_time": _arrow_times(peak_ns, peak_valid),
+            "peak_value": pa.array(values, type=pa.float64(), from_pandas=True),
+            "trace_length": _arrow_strings(trace_lengths, count)
+        }, append)
+        written.extend(path_base + TABLE_FORMATS[f] for f in arrow_formats)
+    return written
+
+
+def write_detections(detections, basename, path_base, filter_type, append=False, formats=("csv",)):
+    """
+    Escribe la tabla de detecciones de EQTransformer de una banda. La duración se calcula como
+    `end_time - start_time` de ObsPy (segundos redondeados a microsegundos).
+
+    Los argumentos y el valor de retorno son los de `write_picks`.
+    """
+    formats = _check_formats(formats)
+    count = len(detections)
+    trace_ids = _attribute(detections, 'trace_id', 'N/A')
+    start_times = _attribute(detections, 'start_time', None)
+    end_times = _attribute(detections, 'end_time', None)
+    start_text, start_ns, start_valid = _time_column(start_times)
+    end_text, end_ns, end_valid = _time_column(end_times)
+    peak_text, peak_ns, peak_valid = _time_column(_attribute(detections, 'peak_time', None))
+    value_text, values = _value_column(_attribute(detections, 'peak_value', 'N/A'))
+
+    # Mismo cálculo que `UTCDateTime.__sub__`, aplicado a los nanosegundos ya reunidos.
+    both = start_valid & end_valid
+    durations = np.where(both, (end_ns - start_ns) / 1e9, np.nan)
+    duration_text = [str(round(d, 6)) if ok else "N/A" for d, ok in zip(durations.tolist(), both.tolist())]
+    if not both.all():
+        for i in np.flatnonzero(~both):
+            start_time, end_time = start_times[i], end_times[i]
+            if start_time and end_time:
+                try:
+                    duration_text[i] = str(UTCDateTime(end_time) - UTCDateTime(start_time))
+                    durations[i] = float(duration_text[i])
+                except Exception as e:
+                    print(f"Error calculando duración: {e}")
+
+    written = []
+    if "csv" in formats:
+        _write_csv(path_base + ".csv", DETECTION_HEADER, [
+            basename, filter_type, _text_column(trace_ids), start_text, end_text,
+            value_text, peak_text, duration_text
+        ], count, append)
+        written.append(path_base + ".csv")
+
+    arrow_formats = [f for f in formats if f != "csv"]
+    if arrow_formats and _arrow_available():
+        _write_arrow(path_base, arrow_formats, {
+            "filename": _arrow_strings(basename, count),
+            "filter_type": _arrow_strings(filter_type, count),
+            "trace_id": _arrow_strings([_csv_field(v) for v in trace_ids], count),
+            "start_time": _arrow_times(start_ns, start_valid),
+            "end_time": _arrow_times(end_ns, end_valid),
+            "peak_value": pa.array(values, type=pa.float64(), from_pandas=True),
+            "peak_time": _arrow_times(peak_ns, peak_valid),
+            "duration": pa.array(durations, type=pa.float64(), from_pandas=True)
+        }, append)
+        written.extend(path_base + TABLE_FORMATS[f] for f in arrow_formats)
+    return written
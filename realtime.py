@@ -0,0 +1,357 @@
+import time
+import queue
+import threading
+import numpy as np
+from obspy import Stream, Trace
+from seismic_processor import load_mseed_file, apply_filter, classify_from_annotations, model_context_seconds, FILTERS
+
+"""
+Modo de detección continua (casi en tiempo real).
+
+Los datos llegan en paquetes cortos desde una fuente intercambiable (`PacketSource`), se acumulan
+en un buffer circular por canal (`RingBuffer`) y un hilo de inferencia analiza periódicamente una
+ventana deslizante con los tres modelos. Los picks nuevos se publican en cuanto aparecen a los
+suscriptores (por ejemplo, el endpoint de eventos del servidor Flask).
+
+La única fuente incluida es `FileReplaySource`, que reproduce un archivo MiniSEED a velocidad real
+o acelerada y sirve como sustituto local de un flujo SeedLink; una fuente SeedLink solo necesita
+implementar `packets()` con la misma interfaz.
+"""
+
+
+class PacketSource:
+    """
+    Interfaz de una fuente de paquetes de forma de onda.
+
+    Las subclases implementan `packets()`, un generador de objetos `obspy.Trace` cortos (uno por
+    canal y paquete) en orden de llegada, y pueden sobrescribir `stop()` para liberar recursos.
+    """
+
+    def __init__(self):
+        self._stop_event = threading.Event()
+
+    def packets(self):
+        raise NotImplementedError
+
+    def stop(self):
+        self._stop_event.set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+
+class FileReplaySource(PacketSource):
+    """
+    Reproduce un archivo MiniSEED como si llegara en tiempo real.
+
+    El archivo se divide en paquetes de `packet_seconds` por canal y cada paquete se entrega cuando,
+    en tiempo de reloj, ha transcurrido el tiempo de datos que contiene dividido entre `speed`.
+    """
+
+    def __init__(self, filepath, speed=1.0, packet_seconds=1.0):
+        """
+        Args:
+            filepath (str): Ruta al archivo MiniSEED a reproducir.
+            speed (float, optional): Factor de aceleración (1.0 = tiempo real, 60.0 = un minuto
+                de datos por segundo). Por defecto 1.0.
+            packet_seconds (float, optional): Duración de cada paquete en segundos. Por defecto 1.0.
+        """
+        super().__init__()
+        self.filepath = filepath
+        self.speed = speed
+        self.packet_seconds = packet_seconds
+
+    def packets(self):
+        # Una sesión detenida antes de empezar ya no tiene archivo que leer.
+        if self.stopped:
+            return
+        stream = load_mseed_file(self.filepath)
+        if stream is None:
+            return
+        data_start = min(tr.stats.starttime for tr in stream)
+        data_end = max(tr.stats.endtime for tr in stream)
+        wall_start = time.time()
+
+        t0 = data_start
+        while t0 < data_end and not self.stopped:
+            t1 = t0 + self.packet_seconds
+            # Espera hasta que el paquete "exista" en el reloj de la reproducción.
+            release_at = wall_start + (t1 - data_start) / self.speed
+            delay = release_at - time.time()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+            for tr in stream:
+                sr = tr.stats.sampling_rate
+                i0 = max(0, int(round((t0 - tr.stats.starttime) * sr)))
+                i1 = min(tr.stats.npts, int(round((t1 - tr.stats.starttime) * sr)))
+                if i1 <= i0:
+                    continue
+                # `npts` (y con él `endtime`) debe ser el del paquete, no el del archivo completo.
+                header = tr.stats.copy()
+                header.npts = i1 - i0
+                header.starttime = tr.stats.starttime + i0 / sr
+                yield Trace(data=tr.data[i0:i1].copy(), header=header)
+            t0 = t1
+
+
+class RingBuffer:
+    """
+    Buffer circular de muestras para un canal, con capacidad fija en segundos.
+
+    Mantiene siempre los últimos `capacity` datos recibidos sin reasignar memoria; los huecos
+    entre paquetes se rellenan con el último valor conocido.
+    """
+
+    def __init__(self, stats, seconds):
+        self.stats = stats.copy()
+        self.sampling_rate = stats.sampling_rate
+        self.capacity = int(seconds * self.sampling_rate)
+        self.data = np.zeros(self.capacity, dtype=np.float64)
+        self.total = 0  # Muestras escritas desde el inicio (posición absoluta)
+        self.start_time = stats.starttime  # Tiempo de la muestra absoluta 0
+
+    @property
+    def end_time(self):
+        """Tiempo de la siguiente muestra esperada."""
+        return self.start_time + self.total / self.sampling_rate
+
+    def append(self, trace):
+        position = int(round((trace.stats.starttime - self.start_time) * self.sampling_rate))
+        if position < self.total:
+            # Paquete solapado con datos ya recibidos: descarta la parte repetida.
+            skip = self.total - position
+            data = trace.data[skip:]
+        else:
+            data = trace.data
+            if position > self.total:
+                gap = np.full(position - self.total, self.data[(self.total - 1) % self.capacity] if self.total else 0.0)
+                self._write(gap)
+        self._write(np.asarray(data, dtype=np.float64))
+
+    def _write(self, values):
+        if len(values) > self.capacity:
+            self.total += len(values) - self.capacity
+            values = values[-self.capacity:]
+        idx = (self.total + np.arange(len(values))) % self.capacity
+        self.data[idx] = values
+        self.total += len(values)
+
+    def get(self, t0, t1):
+        """Retorna una `Trace` con las muestras disponibles en `[t0, t1)`, o None si no hay."""
+        # Nunca antes de la primera muestra recibida ni de la más antigua que conserva el buffer.
+        first = max(0, self.total - self.capacity, int(np.ceil((t0 - self.start_time) * self.sampling_rate)))
+        last = min(self.total, int(np.ceil((t1 - self.start_time) * self.sampling_rate)))
+        if last <= first:
+            return None
+        idx = np.arange(first, last) % self.capacity
+        header = self.stats.copy()
+        header.npts = last - first
+        header.starttime = self.start_time + first / self.sampling_rate
+        return Trace(data=self.data[idx], header=header)
+
+
+class RealtimeDetector:
+    """
+    Detección continua con ventana deslizante sobre los datos de un `PacketSource`.
+
+    Un hilo de ingesta escribe los paquetes en los buffers circulares; un hilo de inferencia, cada
+    `step_seconds` de datos nuevos, anota la ventana `[confirmado - contexto, fin de datos]` con los
+    tres modelos y publica los picks cuyo `peak_time` cae entre el último tiempo confirmado y el fin
+    de los datos menos `guard_seconds`. Los picks cerca del borde se publican en el paso siguiente,
+    cuando el modelo ya tiene contexto a ambos lados; la latencia queda acotada por
+    `step_seconds + guard_seconds` más el tiempo de inferencia.
+    """
+
+    def __init__(self, source, pn_model, eqt_model, gpd_model, filter_type="original",
+                 buffer_seconds=600, step_seconds=10.0, guard_seconds=5.0, max_picks=10000):
+        """
+        Args:
+            source (PacketSource): Fuente de paquetes.
+            pn_model, eqt_model, gpd_model: Modelos de SeisBench cargados.
+            filter_type (str, optional): "original" o un tipo de `FILTERS` a aplicar a cada ventana.
+            buffer_seconds (int, optional): Capacidad de los buffers circulares. Por defecto 600 s.
+            step_seconds (float, optional): Datos nuevos necesarios para lanzar un paso de inferencia.
+            guard_seconds (float, optional): Margen final sin confirmar en cada paso.
+            max_picks (int, optional): Picks que se conservan en memoria para consultas.
+        """
+        self.source = source
+        self.models = {"PhaseNet": pn_model, "EQTransformer": eqt_model, "GPD": gpd_model}
+        self.filter_params = next((f for f in FILTERS if f['type'] == filter_type), None)
+        self.filter_type = filter_type
+        self.buffer_seconds = buffer_seconds
+        self.step_seconds = step_seconds
+        self.guard_seconds = guard_seconds
+        self.context = model_context_seconds(pn_model, eqt_model, gpd_model)
+        self.max_picks = max_picks
+
+        self.buffers = {}
+        self._buffers_lock = threading.Lock()
+        self._new_data = threading.Condition(self._buffers_lock)
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._threads = []
+        self._ingest_done = False
+
+        self.picks = []
+        self.confirmed_until = None
+        self.stats = {
+            'packets': 0,
+            'steps': 0,
+            'picks': 0,
+            'last_step_seconds': 0.0,
+            'max_step_seconds': 0.0,
+            'last_latency_seconds': 0.0,
+            'max_latency_seconds': 0.0,
+            'backlog_seconds': 0.0,
+            'running': False,
+            'error': None
+        }
+        self._last_packet_wall = None
+        self.finished_at = None  # Hora (reloj) en que terminó la inferencia, o None si sigue activa
+
+    # --- Suscripciones ---
+
+    def subscribe(self):
+        """Retorna una cola en la que se publicará cada pick nuevo (como diccionario)."""
+        q = queue.Queue()
+        with self._subscribers_lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._subscribers_lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def _publish(self, pick):
+        self.picks.append(pick)
+        if len(self.picks) > self.max_picks:
+            del self.picks[:len(self.picks) - self.max_picks]
+        with self._subscribers_lock:
+            for q in self._subscribers:
+                q.put(pick)
+
+    # --- Ciclo de vida ---
+
+    def start(self):
+        self.stats['running'] = True
+        for target in (self._ingest_loop, self._inference_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.source.stop()
+        with self._new_data:
+            self._ingest_done = True
+            self._new_data.notify_all()
+
+    def _ingest_loop(self):
+        try:
+            for packet in self.source.packets():
+                with self._new_data:
+                    key = packet.id
+                    if key not in self.buffers:
+                        self.buffers[key] = RingBuffer(packet.stats, self.buffer_seconds)
+                    self.buffers[key].append(packet)
+                    self.stats['packets'] += 1
+                    self._last_packet_wall = time.time()
+                    self._new_data.notify_all()
+        except Exception as e:
+            self.stats['error'] = str(e)
+            print(f"Error en la ingesta en tiempo real: {e}")
+        finally:
+            with self._new_data:
+                self._ingest_done = True
+                self._new_data.notify_all()
+
+    def _data_end(self):
+        if not self.buffers:
+            return None
+        return min(buf.end_time for buf in self.buffers.values())
+
+    def _inference_loop(self):
+        try:
+            while True:
+                with self._new_data:
+                    # Espera hasta tener `step_seconds` de datos sin confirmar o el fin de la fuente.
+                    while True:
+                        data_end = self._data_end()
+                        if data_end is not None and self.confirmed_until is None:
+                            self.confirmed_until = min(buf.start_time for buf in self.buffers.values())
+                        pending = data_end - self.confirmed_until if data_end is not None else 0.0
+                        final = False
+                        if pending >= self.step_seconds:
+                            break
+                        if self._ingest_done:
+                            final = True
+                            break
+                        self._new_data.wait(timeout=1.0)
+                    if final and pending <= 0:
+                        break
+
+                    window_start = max(self.confirmed_until - self.context, data_end - self.buffer_seconds)
+                    window = Stream([tr for tr in (buf.get(window_start, data_end) for buf in self.buffers.values())
+                                     if tr is not None])
+                    packet_wall = self._last_packet_wall
+                    self.stats['backlog_seconds'] = float(pending)
+
+                self._run_step(window, data_end, packet_wall, final)
+                if final:
+                    break
+        except Exception as e:
+            self.stats['error'] = str(e)
+            print(f"Error en la inferencia en tiempo real: {e}")
+        finally:
+            self.stats['running'] = False
+            self.finished_at = time.time()
+
+    def _run_step(self, window, data_end, packet_wall, final):
+        """Analiza una ventana y publica los picks confirmados entre `confirmed_until` y el borde."""
+        step_start = time.time()
+        commit_until = data_end if final else data_end - self.guard_seconds
+
+        if self.filter_params is not None:
+            window = apply_filter(window, self.filter_params) or window
+
+        new_picks = []
+        for model_name, model in self.models.items():
+            annotations = model.annotate(window)
+            outputs = classify_from_annotations(model, model_name, annotations)
+            for p in outputs.picks:
+                if self.confirmed_until <= p.peak_time < commit_until:
+                    new_picks.append({
+                        'model': model_name,
+                        'filter_type': self.filter_type,
+                        'trace_id': p.trace_id,
+                        'phase': p.phase,
+                        'peak_time': p.peak_time.isoformat(),
+                        'peak_value': float(p.peak_value)
+                    })
+            del annotations, outputs
+
+        emitted_wall = time.time()
+        latency = emitted_wall - packet_wall if packet_wall else 0.0
+        for pick in sorted(new_picks, key=lambda p: p['peak_time']):
+            pick['latency_seconds'] = latency
+            self._publish(pick)
+
+        self.confirmed_until = commit_until
+        elapsed = emitted_wall - step_start
+        self.stats['steps'] += 1
+        self.stats['picks'] += len(new_picks)
+        self.stats['last_step_seconds'] = elapsed
+        self.stats['max_step_seconds'] = max(self.stats['max_step_seconds'], elapsed)
+        self.stats['last_latency_seconds'] = latency
+        self.stats['max_latency_seconds'] = max(self.stats['max_latency_seconds'], latency)
+        self.stats['confirmed_until'] = str(self.confirmed_until)
+
+    def status(self):
+        """Estado y métricas: paquetes, pasos, picks, latencia de extremo a extremo y backlog."""
+        with self._buffers_lock:
+            data_end = self._data_end()
+            if data_end is not None and self.confirmed_until is not None:
+                self.stats['backlog_seconds'] = float(data_end - self.confirmed_until)
+            return dict(self.stats, channels=sorted(self.buffers.keys()),
+                        data_end=str(data_end) if data_end is not None else None)
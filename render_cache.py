@@ -0,0 +1,156 @@
+import os
+import hashlib
+import threading
+
+"""
+Caché en disco de las imágenes dibujadas bajo demanda.
+
+En modo diferido el pipeline no genera los PNG de las ventanas: `/serve_image` dibuja cada ventana
+la primera vez que se pide, a partir de las formas de onda y anotaciones guardadas, y la deja en
+esta caché. Las miniaturas de la página de resultados usan otra instancia, con su propia extensión.
+La caché tiene un tamaño máximo; al superarlo se borran las imágenes a las que se
+accedió hace más tiempo (LRU). El último acceso de cada imagen es su fecha de modificación, que se
+actualiza en cada acierto, así que el orden sobrevive a reinicios del servidor sin un índice aparte.
+"""
+
+# Fracción del tamaño máximo a la que se reduce la caché al desalojar, para no desalojar en cada imagen.
+EVICT_TO_FRACTION = 0.9
+
+
+class RenderCache:
+    """
+    Caché LRU de imágenes en disco, limitada por tamaño y direccionada por una clave de texto (la
+    ruta relativa de la imagen).
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, suffix=".png"):
+        """
+        Args:
+            cache_dir (str): Carpeta de la caché.
+            max_bytes (int, optional): Tamaño máximo en bytes. Por defecto 2 GB.
+            suffix (str, optional): Extensión de los archivos de la caché. Por defecto ".png".
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = self._scan()
+        self._entries = len(entries)
+        self._total_bytes = sum(size for _, size, _ in entries)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}{self.suffix}")
+
+    def _scan(self):
+        """(último acceso, tamaño, ruta) de cada imagen de la caché."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def get(self, key):
+        """
+        Ruta de la imagen en caché, o None si no está. Un acierto la marca como usada recientemente.
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def get_or_render(self, key, render):
+        """
+        Ruta de la imagen de `key`, dibujándola con `render(ruta)` si no está en la caché. Dos
+        peticiones simultáneas de la misma imagen la dibujan una sola vez.
+
+        Args:
+            key (str): Clave de la imagen.
+            render (callable): Función que escribe la imagen en la ruta recibida.
+
+        Returns:
+            str: Ruta de la imagen en la caché.
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                path = self.get(key)
+                if path is not None:
+                    return path
+                path = self._path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                try:
+                    render(tmp_path)
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                with self._lock:
+                    self.misses += 1
+                    self._entries += 1
+                    self._total_bytes += os.path.getsize(path)
+                    if self._total_bytes > self.max_bytes:
+                        self._evict(keep=path)
+                return path
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+
+    def _evict(self, keep=None):
+        """Borra las imágenes usadas hace más tiempo hasta bajar de `EVICT_TO_FRACTION` del máximo."""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._entries = len(entries) - removed
+        self._total_bytes = total
+        print(f"Caché de imágenes: {removed} imágenes desalojadas ({total / 1024 ** 2:.1f} MB en uso)")
+
+    def stats(self):
+        """
+        Retorna las estadísticas de la caché.
+
+        Returns:
+            dict: 'entries', 'size_bytes', 'max_bytes', 'hits', 'misses' y 'hit_rate'.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': self._entries,
+                'size_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
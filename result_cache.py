@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+"""
+Caché de resultados direccionada por contenido.
+
+Cuando un operador vuelve a subir el mismo archivo MiniSEED (por ejemplo, después de refrescar el
+navegador o al compartirlo con un colega) con la misma configuración, los CSV y PNG generados serían
+idénticos a los de un trabajo anterior. Esta caché guarda una copia (enlace duro cuando es posible)
+de la carpeta de resultados de cada archivo, indexada por el hash del contenido del MSEED y por
+los parámetros que afectan al resultado, y la enlaza en la carpeta del nuevo trabajo en lugar de
+volver a ejecutar todo el pipeline.
+"""
+
+
+def hash_file(filepath, chunk_size=1024 * 1024):
+    """
+    Calcula el hash SHA-256 del contenido de un archivo leyéndolo por bloques.
+
+    Args:
+        filepath (str): Ruta al archivo.
+        chunk_size (int, optional): Tamaño del bloque de lectura en bytes. Por defecto 1 MB.
+
+    Returns:
+        str: El hash SHA-256 en hexadecimal.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """
+    Crea un enlace duro de `src` en `dst`. Si el sistema de archivos no lo permite
+    (por ejemplo, carpetas en dispositivos distintos), copia el archivo.
+    """
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ResultCache:
+    """
+    Caché en disco de los resultados por archivo, con desalojo LRU limitado por tamaño.
+
+    Cada entrada es una carpeta `cache_dir/<clave>/` con la misma estructura que la carpeta de
+    resultados de un archivo (`resultados_detecciones_filtrados/`, `resultados_imagenes_filtrados/`).
+    El índice (`index.json`) guarda el tamaño y el último acceso de cada entrada, además de los
+    contadores de aciertos y fallos, para que las estadísticas sobrevivan a reinicios del servidor.
+    """
+
+    def __init__(self, cache_dir, max_bytes=20 * 1024 ** 3):
+        """
+        Args:
+            cache_dir (str): Carpeta donde se guardan las entradas de la caché.
+            max_bytes (int, optional): Tamaño máximo de la caché en bytes. Al superarlo se
+                desalojan las entradas usadas hace más tiempo. Por defecto 20 GB.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Advertencia: índice de caché ilegible, se reinicia: {e}")
+        return {'entries': {}, 'hits': 0, 'misses': 0}
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def make_key(filepath, dataset, window_length_minutes, filters, thresholds, options=None):
+        """
+        Construye la clave de la caché para un archivo y una configuración de procesamiento.
+
+        El nombre base del archivo forma parte de la clave porque aparece tanto en los nombres
+        de los CSV/PNG como en la columna `filename` de los CSV.
+
+        Args:
+            filepath (str): Ruta al archivo MiniSEED subido.
+            dataset (str): Dataset de preentrenamiento de los modelos.
+            window_length_minutes (int): Duración de las ventanas de los gráficos.
+            filters (list): Lista de filtros aplicados (ver `FILTERS`).
+            thresholds (dict): Umbrales por modelo (ver `MODEL_THRESHOLDS`).
+            options (dict, optional): Otras opciones que cambian el contenido de la carpeta de
+                resultados (por ejemplo, si se guarda el almacén de anotaciones).
+
+        Returns:
+            str: Clave hexadecimal SHA-256.
+        """
+        params = {
+            'content': hash_file(filepath),
+            'basename': os.path.splitext(os.path.basename(filepath))[0],
+            'dataset': dataset,
+            'window_length_minutes': window_length_minutes,
+            'filters': filters,
+            'thresholds': thresholds,
+            'options': options or {}
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def restore(self, key, dest_dir):
+        """
+        Si la clave está en la caché, enlaza sus archivos dentro de `dest_dir`.
+
+        Returns:
+            bool: True si hubo acierto y los resultados se enlazaron, False en caso contrario.
+        """
+        with self._lock:
+            entry = self._index['entries'].get(key)
+            entry_dir = os.path.join(self.cache_dir, key)
+            if entry is None or not os.path.isdir(entry_dir):
+                self._index['entries'].pop(key, None)
+                self._index['misses'] += 1
+                self._save_index()
+                return False
+
+            for root, dirs, files in os.walk(entry_dir):
+                rel_root = os.path.relpath(root, entry_dir)
+                target_root = os.path.normpath(os.path.join(dest_dir, rel_root))
+                os.makedirs(target_root, exist_ok=True)
+                for name in files:
+                    link_or_copy(os.path.join(root, name), os.path.join(target_root, name))
+
+            entry['last_access'] = time.time()
+            self._index['hits'] += 1
+            self._save_index()
+            return True
+
+    def store(self, key, src_dir):
+        """
+        Guarda en la caché los resultados de `src_dir` bajo `key` y aplica el límite de tamaño.
+        """
+        with self._lock:
+            entry_dir = os.path.join(self.cache_dir, key)
+            tmp_dir = entry_dir + ".tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+            size = 0
+            for root, dirs, files in os.walk(src_dir):
+                rel_root = os.path.relpath(root, src_dir)
+                target_root = os.path.normpath(os.path.join(tmp_dir, rel_root))
+                os.makedirs(target_root, exist_ok=True)
+                for name in files:
+                    src_path = os.path.join(root, name)
+                    link_or_copy(src_path, os.path.join(target_root, name))
+                    size += os.path.getsize(src_path)
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+
+            now = time.time()
+            self._index['entries'][key] = {'size': size, 'created': now, 'last_access': now}
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        """Desaloja las entradas menos usadas recientemente hasta quedar bajo `max_bytes`."""
+        entries = self._index['entries']
+        total = sum(e['size'] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]['size']
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            del entries[key]
+            print(f"Caché de resultados: entrada {key[:12]} desalojada")
+
+    def stats(self):
+        """
+        Retorna las estadísticas de la caché.
+
+        Returns:
+            dict: 'entries', 'size_bytes', 'max_bytes', 'hits', 'misses' y 'hit_rate'.
+        """
+        with self._lock:
+            hits = self._index['hits']
+            misses = self._index['misses']
+            lookups = hits + misses
+            return {
+                'entries': len(self._index['entries']),
+                'size_bytes': sum(e['size'] for e in self._index['entries'].values()),
+                'max_bytes': self.max_bytes,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import threading
+from obspy import UTCDateTime
+from summary import SummaryAggregator, SUMMARY_MODELS
+
+"""
+Manifiesto de los resultados de un trabajo para la página de resultados.
+
+Cada visita a `/results/<job_id>` listaba las carpetas de todos los archivos y hacía un glob por
+cada banda; si no encontraba nada, recorría todo el trabajo con `os.walk`. Con cientos de archivos
+y miles de ventanas eso se repetía en cada carga de la página. Ahora el pipeline escribe, al
+terminar cada archivo, un manifiesto por conjunto de imágenes
+(`<carpeta del trabajo>/manifest_<conjunto>.json`) con los archivos, sus ventanas (índice, inicio y
+fin), las imágenes de cada banda y los picks por ventana, banda y modelo. La página de resultados
+lee solo ese archivo. Para trabajos anteriores al manifiesto se construye una vez recorriendo las
+carpetas y se guarda.
+"""
+
+# Prefijo del manifiesto de cada conjunto de imágenes en la carpeta del trabajo.
+MANIFEST_PREFIX = "manifest_"
+# Carpetas de imágenes de cada conjunto que no son una banda.
+COMPARISON_KIND = "comparison"
+# Índice de ventana en el nombre de las imágenes (`{basename}_{banda}_window{i}.png`).
+WINDOW_PATTERN = re.compile(r"_window(\d+)\.png$")
+# Ventanas sin detecciones de un archivo (omitidas o reducidas), en su carpeta de imágenes.
+RENDER_PLAN_FILENAME = "render_plan.json"
+
+
+def manifest_path(output_base_dir, image_set):
+    """Ruta del manifiesto de un conjunto de imágenes."""
+    return os.path.join(output_base_dir, f"{MANIFEST_PREFIX}{image_set}.json")
+
+
+def _window_index(filename):
+    match = WINDOW_PATTERN.search(filename)
+    return int(match.group(1)) if match else None
+
+
+def _read_render_plan(images_folder):
+    path = os.path.join(images_folder, RENDER_PLAN_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Advertencia: plan de dibujo ilegible en {path}: {e}")
+        return None
+
+
+class ResultsManifest:
+    """
+    Manifiesto de un conjunto de imágenes de un trabajo.
+
+    La estructura es `{'image_set', 'window_length_minutes', 'files': {basename: {'kinds': {tipo:
+    [imagen, ...]}, 'windows': {índice: {'start', 'end', 'picks': {banda: {modelo: n}}}}}}}`, donde
+    el tipo es "comparison", "original" o una banda filtrada, las imágenes están ordenadas por
+    ventana y 'picks' es None si no se conocen los conteos (resultados anteriores al manifiesto).
+    Los archivos procesados en modo diferido llevan además `'lazy': True`: sus imágenes se dibujan
+    al pedirlas. Los graficados con la política "detections" llevan `'quiet_windows'` (ventanas sin
+    picks ni detecciones) y `'strip_dpi'` (resolución a la que se dibujaron, o None si se omitieron).
+    """
+
+    def __init__(self, output_base_dir, image_set, window_length_minutes=None):
+        """
+        Abre el manifiesto de un conjunto de imágenes, partiendo del guardado si existe (modo
+        incremental, re-pick).
+
+        Args:
+            output_base_dir (str): Carpeta de resultados del trabajo.
+            image_set (str): Carpeta del conjunto de imágenes dentro de la carpeta de cada archivo.
+            window_length_minutes (int, optional): Duración de las ventanas del conjunto. Si es None,
+                se toma la del manifiesto guardado.
+        """
+        self.output_base_dir = output_base_dir
+        self.image_set = image_set
+        self.path = manifest_path(output_base_dir, image_set)
+        self._lock = threading.Lock()
+        self.data = self._read(self.path) or {'files': {}}
+        self.data['image_set'] = image_set
+        if window_length_minutes is not None:
+            if self.data.get('window_length_minutes') != window_length_minutes:
+                self.data['files'] = {}
+            self.data['window_length_minutes'] = window_length_minutes
+
+    @staticmethod
+    def _read(path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: manifiesto ilegible en {path}: {e}")
+            return None
+
+    @classmethod
+    def load(cls, output_base_dir, image_set):
+        """Manifiesto guardado de un conjunto de imágenes, o None si no existe."""
+        if not os.path.exists(manifest_path(output_base_dir, image_set)):
+            return None
+        manifest = cls(output_base_dir, image_set)
+        return manifest if manifest.data.get('window_length_minutes') else None
+
+    @classmethod
+    def build(cls, output_base_dir, image_set, window_length_minutes):
+        """
+        Construye (y guarda) el manifiesto de un trabajo anterior al manifiesto recorriendo las
+        carpetas de sus archivos una sola vez.
+        """
+        manifest = cls(output_base_dir, image_set, window_length_minutes)
+        summary = SummaryAggregator(output_base_dir)
+        for name in sorted(os.listdir(output_base_dir)):
+            if os.path.isdir(os.path.join(output_base_dir, name, image_set)):
+                summary.load_file(name)
+                manifest.add_file(name, summary, save=False)
+        manifest.save()
+        return manifest
+
+    def add_file(self, basename, summary=None, save=True):
+        """
+        Registra (o vuelve a registrar) las imágenes de un archivo ya graficado y sus picks por ventana.
+
+        Solo se listan las carpetas de este archivo, una vez, cuando termina su procesamiento.
+
+        Args:
+            basename (str): Nombre base del archivo MiniSEED.
+            summary (summary.SummaryAggregator, optional): Resumen del trabajo, del que salen el
+                origen de las ventanas y los picks por ventana.
+            save (bool, optional): Guardar el manifiesto a continuación. Por defecto True.
+        """
+        images_folder = os.path.join(self.output_base_dir, basename, self.image_set)
+        kinds = {}
+        indices = set()
+        if os.path.isdir(images_folder):
+            for kind in sorted(os.listdir(images_folder)):
+                kind_folder = os.path.join(images_folder, kind)
+                if not os.path.isdir(kind_folder):
+                    continue
+                images = [name for name in os.listdir(kind_folder) if name.endswith('.png')]
+                # Orden por ventana (window10 va después de window9), no alfabético.
+                images.sort(key=lambda name: (_window_index(name) is None, _window_index(name) or 0, name))
+                kinds[kind] = images
+                indices.update(i for i in map(_window_index, images) if i is not None)
+        plan = _read_render_plan(images_folder)
+        if plan is not None:
+            indices.update(plan['quiet_windows'])
+        self._register(basename, kinds, indices, summary, save, render_plan=plan)
+
+    def add_lazy_file(self, basename, kinds, window_count, summary=None, save=True):
+        """
+        Registra un archivo procesado en modo diferido: sus imágenes no existen todavía y se dibujan
+        cuando se piden (ver `render_window_image` en `seismic_processor`). Se registran los nombres
+        que tendrían, con el mismo patrón que las imágenes generadas al procesar.
+
+        Args:
+            basename (str): Nombre base del archivo MiniSEED.
+            kinds (list): Tipos de imagen ("original", bandas filtradas y "comparison").
+            window_count (int): Número de ventanas del archivo.
+            summary (summary.SummaryAggregator, optional): Resumen del trabajo (ver `add_file`).
+            save (bool, optional): Guardar el manifiesto a continuación. Por defecto True.
+        """
+        images = {kind: [f"{basename}_{kind}_window{i}.png" for i in range(window_count)] for kind in kinds}
+        self._register(basename, images, range(window_count), summary, save, lazy=True)
+
+    def _register(self, basename, kinds, indices, summary, save, lazy=False, render_plan=None):
+        window_length = self.data['window_length_minutes']
+        origin_ns = summary.window_origin_ns(basename) if summary is not None else None
+        counts = summary.window_counts(basename, window_length) if summary is not None else None
+        windows = {}
+        for index in sorted(indices):
+            window = {'start': None, 'end': None, 'picks': None}
+            if origin_ns is not None:
+                t0 = UTCDateTime(ns=origin_ns) + index * window_length * 60
+                window['start'] = t0.isoformat()
+                window['end'] = (t0 + window_length * 60).isoformat()
+            if counts is not None:
+                window['picks'] = counts.get(index, {})
+            windows[str(index)] = window
+
+        entry = {'kinds': kinds, 'windows': windows}
+        if lazy:
+            entry['lazy'] = True
+        if render_plan is not None:
+            entry['quiet_windows'] = render_plan['quiet_windows']
+            entry['strip_dpi'] = render_plan.get('strip_dpi')
+        with self._lock:
+            self.data['files'][basename] = entry
+        if save:
+            self.save()
+
+    def lazy_image(self, basename, kind, filename):
+        """
+        Índice de ventana de una imagen diferida registrada en el manifiesto, o None si el archivo no
+        es diferido o la imagen no figura en él (las rutas pedidas se validan contra el manifiesto).
+        """
+        entry = self.data['files'].get(basename)
+        if entry is None or not entry.get('lazy') or filename not in entry['kinds'].get(kind, ()):
+            return None
+        return _window_index(filename)
+
+    def update_picks(self, basename, summary):
+        """Actualiza los picks por ventana de un archivo ya registrado (tras un re-pick)."""
+        window_length = self.data['window_length_minutes']
+        counts = summary.window_counts(basename, window_length)
+        with self._lock:
+            entry = self.data['files'].get(basename)
+            if entry is None or counts is None:
+                return
+            for index, window in entry['windows'].items():
+                window['picks'] = counts.get(int(index), {})
+
+    def save(self):
+        """Guarda el manifiesto con un reemplazo atómico."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.path)
+
+    def images_by_type(self, path_prefix, bands=()):
+        """
+        Imágenes por archivo en la estructura que usa la plantilla de resultados.
+
+        Args:
+            path_prefix (str): Carpeta de estos resultados relativa a la carpeta de resultados: la
+                del trabajo o, en una comparación de datasets, `<trabajo>/<dataset>`.
+            bands (iterable, optional): Bandas filtradas que aparecen siempre, aunque no tengan imágenes.
+
+        Returns:
+            tuple: (`{basename: {'comparison': [...], 'original': [...], 'filtered': {banda: [...]},
+                'quiet_windows': [...], 'reduced': [...]}}`, `{basename: número de ventanas}`,
+                `{basename: {ruta: {modelo: n}}}`). Las rutas son relativas a la carpeta de
+                resultados; el tercer diccionario tiene los picks de la banda de cada imagen, solo
+                para las imágenes de bandas con conteos conocidos. 'quiet_windows' lista las ventanas
+                sin detecciones (`{'number', 'start'}`, numeradas desde 1) y 'reduced' las rutas de
+                sus imágenes reducidas.
+        """
+        all_images_data = {}
+        total_windows_per_file = {}
+        window_picks = {}
+        for basename, entry in self.data['files'].items():
+            grouping = {COMPARISON_KIND: [], 'original': [], 'filtered': {band: [] for band in bands},
+                        'quiet_windows': [], 'reduced': []}
+            quiet = set(entry.get('quiet_windows', ()))
+            for index in sorted(quiet):
+                window = entry['windows'].get(str(index), {})
+                grouping['quiet_windows'].append({'number': index + 1, 'start': window.get('start')})
+            picks = {}
+            for kind, images in entry['kinds'].items():
+                paths = [os.path.join(path_prefix, basename, self.image_set, kind, name) for name in images]
+                if entry.get('strip_dpi'):
+                    grouping['reduced'].extend(path for path, name in zip(paths, images)
+                                               if _window_index(name) in quiet)
+                if kind in (COMPARISON_KIND, 'original'):
+                    grouping[kind] = paths
+                else:
+                    grouping['filtered'][kind] = paths
+                if kind == COMPARISON_KIND:
+                    continue
+                for path, name in zip(paths, images):
+                    window = entry['windows'].get(str(_window_index(name)))
+                    if window is not None and window['picks'] is not None:
+                        band_picks = window['picks'].get(kind, {})
+                        picks[path] = {model: band_picks.get(model, 0) for model in SUMMARY_MODELS}
+            all_images_data[basename] = grouping
+            total_windows_per_file[basename] = max([len(images) for images in entry['kinds'].values()] + [0])
+            window_picks[basename] = picks
+        return all_images_data, total_windows_per_file, window_picks
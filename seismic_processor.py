@@ -1,14 +1,27 @@
 import os
+import argparse
 import glob
 import csv
+import json
 import numpy as np
-import matplotlib
-matplotlib.use('Agg') 
-import matplotlib.pyplot as plt
 import obspy
 from obspy import read, UTCDateTime
+from obspy.io.mseed.util import get_start_and_end_time
 import seisbench.models as sbm
 import gc 
+import time
+from types import SimpleNamespace
+from annotation_store import AnnotationStore, ANNOTATION_STORE_FOLDER, WAVEFORM_KIND
+import peak_extraction
+import pick_table
+from summary import SummaryAggregator, write_dataset_comparison, DATASET_COMPARISON_FILENAME
+from results_manifest import ResultsManifest, RENDER_PLAN_FILENAME
+from consensus import write_consensus
+from waveform_pyramid import ensure_pyramid
+from window_index import WindowIndex, band_window_indexes, window_bounds, trace_windows
+from window_renderer import (RenderPool, render_window, window_lines, individual_window_spec,
+                             comparison_window_spec, window_group_spec, create_time_formatter,
+                             PLOT_DPI, PLOT_WIDTH_PX)
 
 """
 Notas de las pruebas realizadas para tener en cuenta al momento de querer ejecutar este codigo 
@@ -33,7 +46,33 @@ fases con un mínimo de configuración, excelente para usuarios expertos en sism
 Todo el codigo fue hecho gracias a la ayuda de la documentacion de SeisBench y ObsPy
 """
 
-def load_mseed_file(filepath):
+# Filtros pasa-banda aplicados a cada archivo, además de la señal original.
+FILTERS = [
+    {"type": "0.5-2Hz", "freqmin": 0.5, "freqmax": 2},
+    {"type": "2-4Hz", "freqmin": 2, "freqmax": 4},
+    {"type": "5-10Hz", "freqmin": 5, "freqmax": 10},
+    {"type": "1-15Hz", "freqmin": 1, "freqmax": 15}
+]
+
+# Umbrales P/S pasados a `classify` por modelo. Un diccionario vacío significa que se usan
+# los umbrales por defecto del modelo (PhaseNet).
+MODEL_THRESHOLDS = {
+    "PhaseNet": {},
+    "EQTransformer": {"P_threshold": 0.6, "S_threshold": 0.6},
+    "GPD": {"P_threshold": 0.75, "S_threshold": 0.75}
+}
+
+# Políticas de dibujo de los gráficos por ventana: "all" dibuja todas las ventanas; "detections" solo
+# las que tienen picks o detecciones de algún modelo en alguna banda (ver `detection_windows`).
+RENDER_POLICIES = ("all", "detections")
+# Resolución de las imágenes reducidas de las ventanas sin detecciones, si se piden.
+STRIP_DPI = 40
+
+# Formatos en los que se guardan las tablas de picks y detecciones (ver `pick_table.TABLE_FORMATS`).
+# El CSV siempre se usa en el resto de la aplicación; "parquet" y "arrow" requieren pyarrow.
+PICK_TABLE_FORMATS = ["csv"]
+
+def load_mseed_file(filepath, starttime=None):
     """
     Carga un archivo MiniSEED desde la ruta especificada y lo convierte en un objeto Stream de ObsPy.
     Realiza una unión de las trazas dentro del stream, interpolando los datos en caso de solapamientos
@@ -44,6 +83,9 @@ def load_mseed_file(filepath):
 
     Args:
         filepath (str): La ruta completa al archivo MiniSEED (.mseed, .ms, etc.) a cargar.
+        starttime (obspy.core.utcdatetime.UTCDateTime, optional): Si se indica, solo se leen los
+            datos desde ese instante (en MiniSEED los registros anteriores no se decodifican).
+            Por defecto es None (archivo completo).
 
     Returns:
         obspy.core.stream.Stream or None:
@@ -75,7 +117,7 @@ def load_mseed_file(filepath):
     try:
         # Intenta leer el archivo MiniSEED. ObsPy es capaz de detectar automáticamente el formato
         # del archivo.
-        stream = read(filepath)
+        stream = read(filepath, starttime=starttime)
     except Exception as e:
         # Captura cualquier excepción que ocurra durante la lectura del archivo,
         # como archivos corruptos o inexistentes.
@@ -90,6 +132,26 @@ def load_mseed_file(filepath):
     
     return stream
 
+def station_days(stream):
+    """
+    Días de registro de un stream sumados por estación (estaciones-día), la unidad con que se mide
+    el rendimiento del procesamiento.
+
+    Args:
+        stream (obspy.core.stream.Stream): Stream cargado (puede tener varias estaciones).
+
+    Returns:
+        float: Suma, por estación, de la duración en días de su canal con más datos.
+    """
+    channel_seconds = {}
+    for tr in stream:
+        key = (tr.stats.network, tr.stats.station, tr.stats.location, tr.stats.channel)
+        channel_seconds[key] = channel_seconds.get(key, 0.0) + tr.stats.npts * tr.stats.delta
+    station_seconds = {}
+    for (network, station, _, _), seconds in channel_seconds.items():
+        station_seconds[(network, station)] = max(station_seconds.get((network, station), 0.0), seconds)
+    return sum(station_seconds.values()) / 86400
+
 def apply_filter(stream, filter_params):
     """
     Aplica un filtro pasa-banda (bandpass) a una copia del objeto `Stream` de ObsPy.
@@ -197,7 +259,8 @@ def apply_filter(stream, filter_params):
         gc.collect()
         return None
 
-def save_detailed_picks_to_csv(picks, model_name, basename, results_folder, filter_type="original"):
+def save_detailed_picks_to_csv(picks, model_name, basename, results_folder, filter_type="original", append=False,
+                               formats=None):
     """
     Guarda la información detallada de los 'picks' (detecciones de fases P y S) generados por
     un modelo de SeisBench en un archivo CSV. Cada fila del CSV representa un 'pick' individual,
@@ -227,6 +290,11 @@ def save_detailed_picks_to_csv(picks, model_name, basename, results_folder, filt
             de los picks (ej., "original", "0.5-2Hz", "1-15Hz"). Este campo se añade al CSV
             para facilitar el análisis comparativo de los resultados de detección bajo diferentes
             regímenes de filtrado. Por defecto es "original".
+        append (bool, optional):
+            Si es True, añade las filas al final de un CSV existente (sin repetir el encabezado)
+            en lugar de sobrescribirlo. Se usa en el modo incremental. Por defecto es False.
+        formats (list, optional):
+            Formatos de salida (ver `pick_table.TABLE_FORMATS`). Por defecto, `PICK_TABLE_FORMATS`.
 
     Returns:
         None: La función no retorna ningún valor, pero guarda un archivo CSV y imprime un mensaje
@@ -241,9 +309,9 @@ def save_detailed_picks_to_csv(picks, model_name, basename, results_folder, filt
         - **Formato del nombre del archivo:** El nombre del archivo CSV sigue el patrón
           `{basename}_{filter_type}_{model_name}_picks.csv`, lo que permite una identificación
           clara del contenido del archivo y facilita la organización de los resultados.
-        - **Uso de `csv.writer`:** Se utiliza el módulo estándar `csv` de Python para escribir
-          el archivo. `newline=''` es importante para evitar que se inserten filas en blanco
-          adicionales entre las filas en Windows.
+        - **Escritura columnar:** Los picks se reúnen en columnas y el archivo se escribe de una
+          sola vez con `pick_table.write_picks`, que produce exactamente el mismo CSV que
+          `csv.writer` fila a fila pero sin su costo por pick.
         - **Encabezados claros:** Los encabezados del CSV están diseñados para ser informativos
           y completos, incluyendo detalles sobre el archivo original, el modelo, el tipo de filtro,
           y las propiedades de cada pick.
@@ -253,10 +321,8 @@ def save_detailed_picks_to_csv(picks, model_name, basename, results_folder, filt
           ("N/A"), evitando errores y haciendo la función más robusta a variaciones menores
           en la estructura de los objetos `pick`.
         - **Formato de tiempo ISO 8601:** Los tiempos (`start_time`, `end_time`, `peak_time`)
-          se convierten a cadenas en formato ISO 8601 utilizando `.isoformat()`. Este es un
-          formato estándar e interoperable para la representación de fechas y horas, lo que
-          facilita la lectura y el procesamiento por otras herramientas o lenguajes.
-          `obspy.UTCDateTime` objetos ya tienen este método.
+          se escriben en formato ISO 8601, igual que `UTCDateTime.isoformat()`, pero formateados
+          de forma vectorizada a partir de sus nanosegundos.
         - **Integración con SeisBench:** Esta función está diseñada para trabajar directamente
           con los objetos `Pick` que son el resultado del método `.classify()` de los modelos
           de SeisBench como `PhaseNet`, `EQTransformer`, y `GPD`.
@@ -266,55 +332,16 @@ def save_detailed_picks_to_csv(picks, model_name, basename, results_folder, filt
     # de archivo únicos e informativos.
     csv_filename = os.path.join(results_folder, f"{basename}_{filter_type}_{model_name}_picks.csv")
 
-    # Abre el archivo CSV en modo escritura ('w') con soporte para nuevas líneas universal.
-    with open(csv_filename, 'w', newline='') as csvfile:
-        # Crea un objeto `csv.writer` para escribir filas de datos.
-        csv_writer = csv.writer(csvfile)
-        
-        # Escribe la fila de encabezados para el archivo CSV. Estos encabezados
-        # proporcionan una descripción clara de cada columna de datos.
-        csv_writer.writerow([
-            "filename", "modelo", "filter_type", "channel", "phase",
-            "start_time", "end_time", "peak_time",
-            "peak_value", "trace_length"
-        ])
-
-        # Itera sobre cada objeto 'pick' en la lista proporcionada.
-        for pick in picks:
-            # Obtiene la fase detectada (P, S, etc.) de manera segura, usando 'N/A' si no está presente.
-            phase = getattr(pick, 'phase', 'N/A')
-
-            # Obtiene los atributos de tiempo de manera segura. Si el atributo no existe o es None,
-            # se asigna None para el procesamiento posterior.
-            start_time = getattr(pick, 'start_time', None)
-            end_time = getattr(pick, 'end_time', None)
-            peak_time = getattr(pick, 'peak_time', None)
-
-            # Convierte los objetos de tiempo (UTCDateTime de ObsPy) a formato de cadena ISO 8601.
-            # Si el tiempo es None, se asigna "N/A". Esto asegura un formato de tiempo consistente.
-            start_time_str = start_time.isoformat() if start_time else "N/A"
-            end_time_str = end_time.isoformat() if end_time else "N/A"
-            peak_time_str = peak_time.isoformat() if peak_time else "N/A"
-
-            # Escribe una fila de datos en el archivo CSV con la información extraída de cada pick.
-            csv_writer.writerow([
-                basename,                                   # Nombre base del archivo original
-                model_name,                                 # Nombre del modelo de IA
-                filter_type,                                # Tipo de filtro aplicado
-                getattr(pick, 'trace_id', 'N/A'),           # Identificador de la traza
-                phase,                                      # Fase detectada ('P', 'S')
-                start_time_str,                             # Tiempo de inicio del pick
-                end_time_str,                               # Tiempo de fin del pick
-                peak_time_str,                              # Tiempo del valor máximo dentro del pick
-                getattr(pick, 'peak_value', 'N/A'),         # Valor máximo de probabilidad o amplitud en el pick
-                getattr(pick, 'trace_length', 'N/A')        # Longitud de la traza asociada al pick
-            ])
+    # Escribe la tabla (CSV y, si se pidieron, Parquet/Arrow) con el mismo nombre base.
+    pick_table.write_picks(picks, model_name, basename, csv_filename[:-len(".csv")], filter_type,
+                           append=append, formats=formats or PICK_TABLE_FORMATS)
 
     # Imprime un mensaje de confirmación una vez que el archivo ha sido guardado.
     print(f"Guardado archivo de picks para {model_name} con filtro {filter_type}: {csv_filename}")
 
 
-def save_eqt_detections_to_csv(detections, basename, results_folder, filter_type="original"):
+def save_eqt_detections_to_csv(detections, basename, results_folder, filter_type="original", append=False,
+                               formats=None):
     """
     Guarda las detecciones de terremotos generadas por el modelo EQTransformer en un archivo CSV.
     Esta función está diseñada específicamente para manejar la estructura de los objetos de detección
@@ -337,6 +364,11 @@ def save_eqt_detections_to_csv(detections, basename, results_folder, filter_type
             Una cadena que describe el tipo de filtro aplicado a la señal antes de la detección
             (ej., "original", "0.5-2Hz", "1-15Hz"). Este campo se añade al CSV
             para facilitar el análisis comparativo. Por defecto es "original".
+        append (bool, optional):
+            Si es True, añade las filas a un CSV existente sin repetir el encabezado.
+            Por defecto es False.
+        formats (list, optional):
+            Formatos de salida (ver `pick_table.TABLE_FORMATS`). Por defecto, `PICK_TABLE_FORMATS`.
 
     Returns:
         None: La función no retorna ningún valor, pero guarda un archivo CSV y imprime un mensaje
@@ -360,10 +392,9 @@ def save_eqt_detections_to_csv(detections, basename, results_folder, filter_type
             - Los objetos de tiempo (que deberían ser `obspy.UTCDateTime` o compatibles)
               se convierten a cadenas en formato ISO 8601 usando `.isoformat()` si el
               método está disponible. Si no, se recurre a `str()`.
-            - La duración se calcula restando `UTCDateTime` objetos. Para asegurar la
-              compatibilidad, se verifica si `start_time` y `end_time` son instancias de
-              `UTCDateTime` y se convierten si es necesario antes de calcular la duración.
-              Los errores durante el cálculo de la duración se capturan e informan.
+            - La duración es `end_time - start_time` con la misma aritmética de `UTCDateTime`
+              (segundos redondeados a microsegundos), calculada para todas las detecciones a la
+              vez. Los errores durante el cálculo de la duración se capturan e informan.
         - **`EQTransformer` Detecciones vs. Picks:** Es importante notar que EQTransformer
           puede generar tanto 'picks' (detecciones de fases P y S individuales) como
           'detections' (segmentos de tiempo donde se detecta la presencia de un evento sísmico,
@@ -373,59 +404,96 @@ def save_eqt_detections_to_csv(detections, basename, results_folder, filter_type
     # Construye la ruta completa del archivo CSV para las detecciones de EQTransformer.
     csv_filename = os.path.join(results_folder, f"{basename}_{filter_type}_EQTransformer_detections.csv")
 
-    # Abre el archivo CSV en modo escritura, asegurando el manejo correcto de las nuevas líneas.
-    with open(csv_filename, 'w', newline='') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        # Escribe los encabezados de las columnas del CSV.
-        csv_writer.writerow([
-            "filename", "filter_type", "trace_id", "start_time", "end_time",
-            "peak_value", "peak_time", "duration"
-        ])
-
-        # Itera sobre cada objeto de detección proporcionado.
-        for detection in detections:
-            # Accede de forma segura a los atributos de tiempo de la detección.
-            start_time = getattr(detection, 'start_time', None)
-            end_time = getattr(detection, 'end_time', None)
-            peak_time = getattr(detection, 'peak_time', None)
-
-            # Convierte los objetos de tiempo a cadenas en formato ISO 8601.
-            # Si el objeto de tiempo no tiene el método isoformat (por ejemplo, si es None o un tipo diferente),
-            # se convierte a una cadena genérica.
-            start_time_str = start_time.isoformat() if hasattr(start_time, 'isoformat') else str(start_time)
-            end_time_str = end_time.isoformat() if hasattr(end_time, 'isoformat') else str(end_time)
-            peak_time_str = peak_time.isoformat() if hasattr(peak_time, 'isoformat') else str(peak_time)
-
-            # Inicializa la duración como "N/A".
-            duration = "N/A"
-            # Si tanto el tiempo de inicio como el de fin están presentes, calcula la duración.
-            if start_time and end_time:
-                try:
-                    # Asegura que los objetos de tiempo sean de tipo UTCDateTime para realizar la resta.
-                    if not isinstance(start_time, UTCDateTime):
-                        start_time = UTCDateTime(start_time)
-                    if not isinstance(end_time, UTCDateTime):
-                        end_time = UTCDateTime(end_time)
-                    duration = (end_time - start_time) # La resta de UTCDateTime devuelve segundos
-                except Exception as e:
-                    print(f"Error calculando duración: {e}")
-
-            # Escribe la fila de datos en el archivo CSV.
-            csv_writer.writerow([
-                basename,                                   # Nombre base del archivo original
-                filter_type,                                # Tipo de filtro aplicado
-                getattr(detection, 'trace_id', 'N/A'),      # Identificador de la traza
-                start_time_str,                             # Tiempo de inicio de la detección
-                end_time_str,                               # Tiempo de fin de la detección
-                getattr(detection, 'peak_value', 'N/A'),    # Valor máximo asociado a la detección
-                peak_time_str,                              # Tiempo del valor máximo
-                duration                                    # Duración de la detección
-            ])
+    # Escribe la tabla completa de una sola vez (ver `pick_table.write_detections`).
+    pick_table.write_detections(detections, basename, csv_filename[:-len(".csv")], filter_type,
+                                append=append, formats=formats or PICK_TABLE_FORMATS)
 
     # Imprime un mensaje de confirmación.
     print(f"Guardado archivo de detecciones de terremotos con filtro {filter_type}: {csv_filename}")
 
-def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename, results_folder, filter_type="original"):
+def resolve_thresholds(model, model_name):
+    """
+    Calcula los umbrales efectivos de un modelo, tal como los aplica `model.classify()`.
+
+    Args:
+        model: Modelo de SeisBench cargado.
+        model_name (str): Nombre del modelo ("PhaseNet", "EQTransformer", "GPD").
+
+    Returns:
+        dict: Umbrales por fase (`"P_threshold"`, `"S_threshold"`) y, para EQTransformer,
+            `"detection_threshold"`.
+
+    Notas:
+        - Los umbrales se toman de `MODEL_THRESHOLDS`; si un modelo no define alguno, se usa el
+          valor por defecto de los pesos (`default_args`) o de la clase (`_annotate_args`).
+    """
+    argdict = dict(getattr(model, 'default_args', None) or {})
+    argdict.update(MODEL_THRESHOLDS[model_name])
+    annotate_args = getattr(model, '_annotate_args', {})
+    default_threshold = annotate_args.get("*_threshold", (None, 0.3))[1]
+
+    labels = getattr(model, 'labels', None) or "PS"
+    thresholds = {}
+    for phase in sorted(set(labels) - {"N", "Detection"}):
+        thresholds[f"{phase}_threshold"] = float(argdict.get(f"{phase}_threshold", default_threshold))
+    if model_name == "EQTransformer":
+        thresholds["detection_threshold"] = float(argdict.get(
+            "detection_threshold", annotate_args.get("detection_threshold", (None, 0.3))[1]
+        ))
+    return thresholds
+
+def picks_from_thresholds(annotations, model_name, thresholds):
+    """
+    Extrae picks (y detecciones, para EQTransformer) de anotaciones ya calculadas con umbrales
+    explícitos, sin necesidad del modelo. Usa el extractor vectorizado de `peak_extraction`.
+
+    Args:
+        annotations (obspy.core.stream.Stream): Anotaciones del modelo (o leídas del almacén).
+        model_name (str): Nombre del modelo; prefijo de los canales (ej., "EQTransformer_P").
+        thresholds (dict): Umbrales como los retorna `resolve_thresholds`. Las fases sin umbral
+            usan 0.3, el valor por defecto de SeisBench.
+
+    Returns:
+        types.SimpleNamespace: Objeto con los atributos `picks` y `detections`.
+    """
+    phases = sorted({tr.stats.channel.split("_")[-1] for tr in annotations} - {"N", "Detection"})
+    picks = []
+    for phase in phases:
+        picks += peak_extraction.picks_from_annotations(
+            annotations.select(channel=f"{model_name}_{phase}"),
+            thresholds.get(f"{phase}_threshold", 0.3), phase
+        )
+
+    detections = []
+    if model_name == "EQTransformer":
+        detections = peak_extraction.detections_from_annotations(
+            annotations.select(channel=f"{model_name}_Detection"),
+            thresholds.get("detection_threshold", 0.3)
+        )
+
+    return SimpleNamespace(picks=sorted(picks), detections=detections)
+
+def classify_from_annotations(model, model_name, annotations):
+    """
+    Obtiene los picks (y las detecciones, en el caso de EQTransformer) a partir de anotaciones
+    ya calculadas, reproduciendo lo que hace `model.classify()` internamente pero sin volver
+    a ejecutar la inferencia.
+
+    Args:
+        model: Modelo de SeisBench que generó las anotaciones.
+        model_name (str): Nombre del modelo ("PhaseNet", "EQTransformer", "GPD"). Coincide con
+            el prefijo de los canales de las anotaciones (ej., "EQTransformer_P").
+        annotations (obspy.core.stream.Stream): Stream devuelto por `model.annotate()`.
+
+    Returns:
+        types.SimpleNamespace: Objeto con los atributos `picks` y `detections`, compatible con
+            la salida de `classify()` usada en `process_stream_with_models`.
+    """
+    return picks_from_thresholds(annotations, model_name, resolve_thresholds(model, model_name))
+
+def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename, results_folder, filter_type="original",
+                               chunk_cache=None, min_pick_time=None, append=False, checkpoint=None, summary=None,
+                               annotate=True):
     """
     Procesa un objeto `Stream` de ObsPy utilizando tres modelos de IA pre-entrenados de SeisBench:
     PhaseNet, EQTransformer y GPD (Generalized Phase Detection). Esta función realiza la
@@ -460,6 +528,30 @@ def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename,
             Una cadena que describe el tipo de filtro aplicado al `stream` antes de pasarlo a esta función
             (ej., "original", "0.5-2Hz"). Se utiliza para identificar los archivos de resultados.
             Por defecto es "original".
+        chunk_cache (chunk_cache.ChunkInferenceCache, optional):
+            Caché de anotaciones por bloques de tiempo. Si se proporciona, cada modelo se anota
+            una sola vez (solo en los bloques que no están en caché) y los picks se obtienen de
+            esas anotaciones con `classify_from_annotations`. Como las ventanas del modelo se
+            alinean a cada bloque, los picks cerca de los bordes de los bloques pueden diferir de
+            los de `classify()` sobre el stream completo. Por defecto es None.
+        min_pick_time (obspy.core.utcdatetime.UTCDateTime, optional):
+            Si se indica, solo se guardan los picks con `peak_time` y las detecciones con
+            `start_time` posteriores o iguales a este tiempo. Lo usa el modo incremental para
+            descartar lo que ya se guardó en ejecuciones anteriores. Por defecto es None.
+        append (bool, optional):
+            Si es True, los CSV se amplían en lugar de sobrescribirse. Por defecto es False.
+        checkpoint (checkpoint.JobCheckpoint, optional):
+            Checkpoint del trabajo. Si la banda ya terminó en una ejecución anterior, se retornan
+            las predicciones guardadas sin ejecutar los modelos (los CSV ya están escritos); al
+            terminar, las predicciones se guardan y la banda se marca como completa (sin predicciones
+            continuas solo se marca y, al reanudar, se retorna None). Por defecto es None.
+        summary (summary.SummaryAggregator, optional):
+            Resumen del trabajo; recibe los picks y detecciones de la banda en el momento en que
+            se guardan. Por defecto es None.
+        annotate (bool, optional):
+            Si es False (y no hay `chunk_cache`), no se calculan las predicciones continuas: solo
+            se guardan los picks y la función retorna None. Lo usan los datasets que no se grafican
+            en la comparación de datasets. Por defecto es True.
 
     Returns:
         dict: Un diccionario que contiene los objetos `Stream` anotados con las predicciones de probabilidad
@@ -467,6 +559,7 @@ def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename,
               - "pn_preds": `Stream` con predicciones de PhaseNet.
               - "eqt_preds": `Stream` con predicciones de EQTransformer.
               - "gpd_preds": `Stream` con predicciones de GPD.
+              None si `annotate` es False y no hay `chunk_cache`.
 
     Raises:
         (No levanta excepciones directamente, las captura e imprime mensajes de error.)
@@ -503,13 +596,36 @@ def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename,
           procesamiento de datos sísmicos para evitar el consumo excesivo de RAM, especialmente
           cuando se procesan muchos archivos o streams grandes.
     """
+    # Banda ya terminada antes de un reinicio: se reutilizan sus predicciones. Sin predicciones
+    # continuas (modo solo picks) basta con que esté marcada: sus CSV ya están escritos.
+    if checkpoint is not None:
+        if chunk_cache is None and not annotate:
+            if checkpoint.is_stage_done(basename, f"band:{filter_type}"):
+                print(f"Banda {filter_type} de {basename} recuperada del checkpoint")
+                return None
+        else:
+            saved_predictions = checkpoint.load_band(basename, filter_type)
+            if saved_predictions is not None:
+                print(f"Banda {filter_type} de {basename} recuperada del checkpoint")
+                return saved_predictions
+
     print(f"Procesando stream con filtro: {filter_type}")
 
-    # Ejecuta el método de clasificación de cada modelo sobre el stream de entrada.
-    # Los umbrales (P_threshold, S_threshold) controlan la sensibilidad de la detección de fases.
-    outputs_pn = pn_model.classify(stream)
-    outputs_eqt = eqt_model.classify(stream, P_threshold=0.6, S_threshold=0.6)
-    outputs_gpd = gpd_model.classify(stream, P_threshold=0.75, S_threshold=0.75)
+    if chunk_cache is not None:
+        # Con caché de bloques, las anotaciones se calculan (o recuperan) primero y los picks
+        # se derivan de ellas, evitando una segunda pasada de inferencia en `classify`.
+        pn_preds = chunk_cache.annotate(pn_model, "PhaseNet", stream, filter_type)
+        eqt_preds = chunk_cache.annotate(eqt_model, "EQTransformer", stream, filter_type)
+        gpd_preds = chunk_cache.annotate(gpd_model, "GPD", stream, filter_type)
+        outputs_pn = classify_from_annotations(pn_model, "PhaseNet", pn_preds)
+        outputs_eqt = classify_from_annotations(eqt_model, "EQTransformer", eqt_preds)
+        outputs_gpd = classify_from_annotations(gpd_model, "GPD", gpd_preds)
+    else:
+        # Ejecuta el método de clasificación de cada modelo sobre el stream de entrada.
+        # Los umbrales (P_threshold, S_threshold) controlan la sensibilidad de la detección de fases.
+        outputs_pn = pn_model.classify(stream, **MODEL_THRESHOLDS["PhaseNet"])
+        outputs_eqt = eqt_model.classify(stream, **MODEL_THRESHOLDS["EQTransformer"])
+        outputs_gpd = gpd_model.classify(stream, **MODEL_THRESHOLDS["GPD"])
 
     # Intenta obtener las detecciones de eventos de EQTransformer. EQTransformer es único
     # en que puede generar objetos de 'detección' de eventos además de 'picks' de fase.
@@ -519,6 +635,12 @@ def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename,
     except Exception as e:
         print(f"Error al obtener detecciones de EQTransformer: {e}")
 
+    # En modo incremental se descartan los picks y detecciones ya guardados anteriormente.
+    if min_pick_time is not None:
+        for outputs in (outputs_pn, outputs_eqt, outputs_gpd):
+            outputs.picks = [p for p in outputs.picks if p.peak_time >= min_pick_time]
+        eqt_detections = [d for d in eqt_detections if d.start_time >= min_pick_time]
+
     # Imprime un resumen del número de picks y detecciones encontradas por cada modelo
     # para el tipo de filtro actual.
     print(f"{filter_type} - EQTransformer Picks: {len(outputs_eqt.picks)}")
@@ -527,19 +649,37 @@ def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename,
     print(f"{filter_type} - GPD Picks: {len(outputs_gpd.picks)}")
 
     # Guarda los picks generados por cada modelo en archivos CSV separados.
-    save_detailed_picks_to_csv(outputs_pn.picks, "PhaseNet", basename, results_folder, filter_type)
-    save_detailed_picks_to_csv(outputs_eqt.picks, "EQTransformer", basename, results_folder, filter_type)
-    save_detailed_picks_to_csv(outputs_gpd.picks, "GPD", basename, results_folder, filter_type)
+    save_detailed_picks_to_csv(outputs_pn.picks, "PhaseNet", basename, results_folder, filter_type, append=append)
+    save_detailed_picks_to_csv(outputs_eqt.picks, "EQTransformer", basename, results_folder, filter_type, append=append)
+    save_detailed_picks_to_csv(outputs_gpd.picks, "GPD", basename, results_folder, filter_type, append=append)
 
     # Si EQTransformer generó detecciones de eventos, guárdalas en un CSV separado.
     if eqt_detections:
-        save_eqt_detections_to_csv(eqt_detections, basename, results_folder, filter_type)
+        save_eqt_detections_to_csv(eqt_detections, basename, results_folder, filter_type, append=append)
+
+    # Acumula conteos y estadísticas de confianza sin volver a leer los CSV al final.
+    if summary is not None:
+        summary.add_band(basename, filter_type, {
+            "PhaseNet": outputs_pn.picks,
+            "EQTransformer": outputs_eqt.picks,
+            "GPD": outputs_gpd.picks
+        }, eqt_detections, append=append)
+
+    # Sin gráficos no hacen falta las predicciones continuas (una segunda pasada de inferencia).
+    if chunk_cache is None and not annotate:
+        del outputs_pn, outputs_eqt, outputs_gpd, eqt_detections
+        gc.collect()
+        # Registra la banda como terminada (CSV escritos), sin predicciones que guardar.
+        if checkpoint is not None:
+            checkpoint.mark_stage_done(basename, f"band:{filter_type}")
+        return None
 
     # Anota el stream con las predicciones de probabilidad continuas de cada modelo.
     # Estas predicciones son útiles para la visualización de la salida del modelo.
-    pn_preds = pn_model.annotate(stream)
-    eqt_preds = eqt_model.annotate(stream)
-    gpd_preds = gpd_model.annotate(stream)
+    if chunk_cache is None:
+        pn_preds = pn_model.annotate(stream)
+        eqt_preds = eqt_model.annotate(stream)
+        gpd_preds = gpd_model.annotate(stream)
 
     # Libera las referencias a los objetos grandes que ya no se necesitan,
     # para ayudar a la gestión de memoria.
@@ -550,24 +690,89 @@ def process_stream_with_models(stream, pn_model, eqt_model, gpd_model, basename,
     # Fuerza al recolector de basura de Python a liberar la memoria de inmediato.
     gc.collect()
 
-    # Retorna un diccionario con los streams anotados con las predicciones.
-    return {
+    predictions = {
         "pn_preds": pn_preds,
         "eqt_preds": eqt_preds,
         "gpd_preds": gpd_preds
     }
 
+    # Registra la banda como terminada (CSV escritos y predicciones guardadas).
+    if checkpoint is not None:
+        checkpoint.save_band(basename, filter_type, predictions)
+
+    # Retorna un diccionario con los streams anotados con las predicciones.
+    return predictions
+
+def stream_window_indexes(original_stream, filtered_streams, predictions_dict, bounds):
+    """
+    Calcula una vez los índices de ventanas de la señal original, de cada filtrada y de sus
+    predicciones (ver `window_index.WindowIndex`), para leer cada ventana sin `stream.slice`.
+
+    Args:
+        original_stream (obspy.core.stream.Stream): Stream original sin filtrar.
+        filtered_streams (dict): Streams filtrados por tipo de filtro.
+        predictions_dict (dict): Predicciones por tipo de filtro (ver `plot_filtered_streams_window`).
+        bounds (dict): Límites de las ventanas (ver `window_index.window_bounds`).
+
+    Returns:
+        list: Tuplas (tipo de filtro, índice de la señal, índices de las predicciones), empezando
+            por "original".
+    """
+    streams = [("original", original_stream)] + list(filtered_streams.items())
+    return [(filter_type, *band_window_indexes(stream, predictions_dict[filter_type], bounds))
+            for filter_type, stream in streams]
+
+
+def comparison_window_spec_for(band_indexes, window_number, t0, t1, basename, window_index, results_img_folder,
+                               dpi=PLOT_DPI):
+    """
+    Lee la señal original y las filtradas en una ventana y prepara la descripción de su gráfico
+    comparativo (ver `window_renderer.comparison_window_spec`), con las líneas ya reducidas.
+
+    Args:
+        band_indexes (list): Índices de cada banda (ver `stream_window_indexes`).
+        window_number (int): Número de la ventana en los índices.
+        t0 (obspy.core.utcdatetime.UTCDateTime): Inicio de la ventana.
+        t1 (obspy.core.utcdatetime.UTCDateTime): Fin de la ventana.
+        basename (str): Nombre base del archivo MiniSEED original.
+        window_index (int): Índice de la ventana (para el nombre de la imagen).
+        results_img_folder (str): Carpeta donde se guarda la imagen.
+        dpi (int, optional): Resolución de la imagen (menor para las imágenes reducidas).
+
+    Returns:
+        dict: Descripción de la imagen, o None si la señal original no tiene datos en la ventana.
+    """
+    # Diccionario de colores para representar diferentes fases en los gráficos.
+    color_dict = {"P": "C0", "S": "C1", "Detection": "C2"}
+
+    width_px = PLOT_WIDTH_PX * dpi // PLOT_DPI
+
+    # Las señales filtradas sin datos en la ventana no se incluyen.
+    sections = []
+    for filter_type, signal_index, prediction_indexes in band_indexes:
+        traces = signal_index.window(window_number)
+        if not traces:
+            if filter_type == "original":
+                return None
+            continue
+        predictions = {key: index.window(window_number) for key, index in prediction_indexes.items()}
+        title = "Original" if filter_type == "original" else f"Filtro: {filter_type}"
+        sections.append((title, *window_lines(traces, predictions, t0, t1, color_dict, width_px=width_px)))
+
+    img_filename = os.path.join(results_img_folder, f"{basename}_comparison_window{window_index}.png")
+    return comparison_window_spec(img_filename, t0, t1 - t0, sections, dpi=dpi)
+
+
 def plot_filtered_streams_window(original_stream, filtered_streams, predictions_dict, t0, t1,
                                 basename, window_index, results_img_folder):
     """
-    Genera y guarda gráficos comparativos de la señal sísmica original y las señales filtradas,
+    Genera y guarda el gráfico comparativo de la señal sísmica original y las señales filtradas,
     superponiendo las predicciones de probabilidad de los modelos de IA (PhaseNet, EQTransformer, GPD)
-    para una ventana de tiempo específica. Esta función está fuertemente optimizada para el uso
-    de memoria RAM, lo cual es crucial al procesar grandes volúmenes de datos.
+    para una ventana de tiempo específica.
 
-    Cada gráfico muestra una traza sísmica junto con las curvas de probabilidad P, S y/o Detección
-    generadas por los modelos, permitiendo una visualización directa del rendimiento de los modelos
-    en diferentes rangos de frecuencia.
+    Cada señal ocupa 4 filas que comparten el eje X: la traza sísmica normalizada y las curvas de
+    probabilidad P, S y/o Detección de cada modelo, permitiendo una visualización directa del
+    rendimiento de los modelos en diferentes rangos de frecuencia.
 
     Args:
         original_stream (obspy.core.stream.Stream):
@@ -596,281 +801,29 @@ def plot_filtered_streams_window(original_stream, filtered_streams, predictions_
             La ruta al directorio donde se guardarán las imágenes generadas.
 
     Returns:
-        None: La función no retorna ningún valor, pero guarda una imagen en formato PNG
-              y realiza una limpieza agresiva de memoria.
-
-    Raises:
-        (No levanta excepciones directamente, las maneja internamente.)
+        None: La función no retorna ningún valor, pero guarda una imagen en formato PNG.
 
     Notas:
-        - **Recorte de Streams (`stream.slice(t0, t1)`):** Esta es la primera operación para
-          cada stream (original y filtrado). Se extrae solo la porción de datos dentro de
-          la ventana de tiempo `[t0, t1]`. Esto reduce significativamente la cantidad de
-          datos a procesar y graficar, ahorrando memoria y tiempo.
-        - **Estructura de Subplots:** La función crea una figura con múltiples subplots (`plt.subplots`).
-          Para cada "señal" (original y cada versión filtrada), se reservan 4 filas: una para la
-          traza sísmica y tres para las predicciones de probabilidad de los modelos PhaseNet,
-          EQTransformer y GPD, respectivamente.
-            - `sharex=True`: Asegura que todos los subplots compartan el mismo eje X (tiempo),
-              lo que facilita la comparación visual de los eventos y predicciones a lo largo del tiempo.
-            - `gridspec_kw={'hspace': 0.05}`: Reduce el espacio vertical entre los subplots,
-              creando una visualización más compacta y continua.
-        - **Gestión Agresiva de Memoria:**
-            - `del variable`: Elimina explícitamente las referencias a objetos grandes
-              (como `Stream`s, `Figure`, `Axes`) tan pronto como ya no son necesarios.
-            - `gc.collect()`: Fuerza la ejecución del recolector de basura de Python
-              para liberar la memoria ocupada por los objetos sin referencia.
-            - `plt.close(fig)`, `plt.clf()`, `plt.cla()`: Estos comandos de Matplotlib
-              cierran la figura actual, limpian la figura actual de todos los ejes, y
-              limpian los ejes actuales, respectivamente. Son esenciales para liberar
-              recursos gráficos asociados con la figura una vez que ha sido guardada,
-              evitando fugas de memoria, especialmente en bucles donde se generan
-              muchas figuras.
-        - **`color_dict`:** Un diccionario simple para asignar colores consistentes a
-          las diferentes fases (P, S, Detección) en los gráficos, mejorando la legibilidad.
-        - **Guardado de la figura (`plt.savefig`):** La figura se guarda en formato PNG
-          con una alta resolución (`dpi=150`) para asegurar la claridad visual. El nombre
-          del archivo incluye el nombre base y el índice de la ventana.
-    """
-    # Recorta el stream original a la ventana de tiempo definida por t0 y t1.
-    # Esto reduce la cantidad de datos a procesar y graficar, optimizando la memoria.
-    subst_original = original_stream.slice(t0, t1)
-    # Si el recorte no contiene datos, no hay nada que graficar, se limpia la referencia
-    # y se retorna para ahorrar recursos.
-    if len(subst_original) == 0:
-        del subst_original
-        gc.collect()
-        return
-
-    # Crea un diccionario para almacenar los streams filtrados y recortados.
-    # Cada stream filtrado se recorta a la ventana de tiempo para optimizar.
-    sliced_filtered_streams = {}
-    for filter_type, filtered_stream in filtered_streams.items():
-        sliced_stream = filtered_stream.slice(t0, t1)
-        if len(sliced_stream) > 0:
-            sliced_filtered_streams[filter_type] = sliced_stream
-
-    # Determina el número de subplots necesarios.
-    # +1 es para el stream original. Cada stream (original o filtrado) tendrá 4 filas
-    # (señal + 3 modelos de predicción).
-    n_filters = len(sliced_filtered_streams) + 1
-    n_rows = n_filters * 4
-
-    # Crea la figura y el conjunto de subplots.
-    # sharex=True: Todos los subplots comparten el mismo eje X (tiempo), facilitando la comparación.
-    # hspace=0.05: Reduce el espacio vertical entre los subplots para una vista más compacta.
-    fig, axs = plt.subplots(n_rows, 1, figsize=(15, n_filters * 6),
-                           sharex=True,
-                           gridspec_kw={'hspace': 0.05})
-
-    # Diccionario de colores para representar diferentes fases en los gráficos.
-    color_dict = {"P": "C0", "S": "C1", "Detection": "C2"}
-
-    # Procesa y grafica la señal original.
-    # `current_row` lleva el control de la fila inicial para cada conjunto de subplots.
-    current_row = 0
-    process_stream_window(subst_original, "original", predictions_dict["original"],
-                         t0, t1, current_row, axs, color_dict)
-    current_row += 4 # Avanza 4 filas para el siguiente conjunto de subplots
-
-    # Procesa y grafica cada señal filtrada.
-    for filter_type, sliced_stream in sliced_filtered_streams.items():
-        process_stream_window(sliced_stream, filter_type, predictions_dict[filter_type],
-                             t0, t1, current_row, axs, color_dict)
-        current_row += 4
-
-        # Limpia explícitamente la referencia al stream recortado y fuerza la recolección
-        # de basura para liberar memoria después de procesar cada stream filtrado.
-        del sliced_stream
-        gc.collect()
-
-    # Crea un formateador de tiempo para el eje X, asegurando una visualización legible del tiempo.
-    formatter = create_time_formatter(t0)
-    for ax in axs:
-        ax.xaxis.set_major_formatter(plt.FuncFormatter(formatter))
-
-    # Establece la etiqueta del eje X solo en el último subplot para evitar redundancia.
-    axs[-1].set_xlabel("Tiempo (HH:MM:SS)")
-
-    # Ajusta automáticamente los parámetros del subplot para un ajuste apretado,
-    # evitando el solapamiento de etiquetas.
-    plt.tight_layout()
-
-    # Construye la ruta completa del archivo de imagen y guarda la figura.
-    img_filename = os.path.join(results_img_folder, f"{basename}_comparison_window{window_index}.png")
-    plt.savefig(img_filename, dpi=150) # Guarda con una resolución de 150 DPI
-
-    # LIMPIEZA AGRESIVA DE MEMORIA DE MATPLOTLIB Y PYTHON
-    # Cierra la figura para liberar los recursos gráficos asociados.
-    plt.close(fig)
-    # Limpia la figura actual de todos los ejes.
-    plt.clf()
-    # Limpia los ejes actuales.
-    plt.cla()
-
-    # Elimina todas las referencias a objetos grandes y fuerza la recolección de basura.
-    del fig, axs, subst_original, sliced_filtered_streams, formatter
-    gc.collect()
-
-def process_stream_window(stream, filter_type, predictions, t0, t1, row_offset, axs, color_dict):
+        - **Recorte de Streams (`WindowIndex`):** De cada stream (original y filtrado) se toman
+          vistas de las muestras de la ventana, con las mismas reglas que `stream.slice(t0, t1)`, y
+          sus trazas se reducen a su envolvente mínimo/máximo (`comparison_window_spec_for`), de
+          modo que el dibujo solo recibe los puntos visibles.
+        - **Dibujo sin `pyplot`:** La figura se construye con `Figure`/`FigureCanvasAgg`
+          (`window_renderer.draw_comparison`) y se guarda con `dpi=150`. Para muchas ventanas,
+          `generate_comparison_plots` reparte las mismas descripciones entre procesos.
     """
-    Procesa, normaliza y grafica una ventana de tiempo específica de un objeto `Stream` de ObsPy
-    (ya sea original o filtrado) junto con las predicciones de probabilidad de los modelos de IA
-    (PhaseNet, EQTransformer, GPD) en un conjunto de ejes proporcionado por `matplotlib`.
-    La función está optimizada para el uso de memoria RAM, realizando operaciones de limpieza
-    inmediata después de procesar cada subcomponente.
-
-    Esta función es una pieza auxiliar clave para `plot_filtered_streams_window`, encargada
-    de dibujar las trazas sísmicas y las curvas de probabilidad en sus respectivos subplots.
-
-    Args:
-        stream (obspy.core.stream.Stream):
-            El objeto `Stream` de ObsPy a graficar para la ventana de tiempo actual.
-            Este stream ya debería estar recortado a la ventana `[t0, t1]`.
-        filter_type (str):
-            Una cadena que describe el tipo de filtro aplicado al stream (ej., "original", "0.5-2Hz").
-            Se utiliza para generar el título del subplot.
-        predictions (dict):
-            Un diccionario que contiene las predicciones de probabilidad de los modelos
-            para el `stream` actual. La estructura esperada es:
-            `predictions['pn_preds']`, `predictions['eqt_preds']`, `predictions['gpd_preds']`.
-            Cada uno de estos valores es un `Stream` anotado con trazas de probabilidad.
-        t0 (obspy.core.utcdatetime.UTCDateTime):
-            El tiempo de inicio UTC de la ventana a graficar.
-        t1 (obspy.core.utcdatetime.UTCDateTime):
-            El tiempo de fin UTC de la ventana a graficar.
-        row_offset (int):
-            El índice de la fila inicial en el arreglo de ejes (`axs`) donde se comenzará
-            a graficar este stream y sus predicciones.
-        axs (numpy.ndarray):
-            Un arreglo de objetos `Axes` de Matplotlib donde se realizarán los gráficos.
-            Se espera que sea un arreglo 1D que representa las filas de subplots.
-        color_dict (dict):
-            Un diccionario de asignación de colores para las diferentes fases (ej., {"P": "C0", "S": "C1"}).
-
-    Returns:
-        None: La función dibuja en los ejes proporcionados pero no retorna ningún valor.
-
-    Raises:
-        (No levanta excepciones directamente, las maneja internamente.)
-
-    Notas:
-        - **Normalización de Amplitud:** Cada traza sísmica se normaliza por su valor absoluto máximo.
-          Esto asegura que las trazas de diferentes canales o con diferentes rangos de amplitud
-          puedan ser graficadas de manera efectiva en el mismo subplot sin que una domine a las demás.
-        - **Offsets Verticales:** Las trazas dentro de un mismo subplot se grafican con un desplazamiento
-          vertical (`offset`) para evitar que se superpongan, haciendo que cada canal sea claramente visible.
-        - **Graficación por Trazas Individuales:** Para optimización de memoria, la función itera sobre
-          cada `Trace` dentro de un `Stream` y la grafica individualmente, liberando referencias
-          (`del norm_data`) lo antes posible.
-        - **`current_ax`:** Se calcula el `current_ax` para cada modelo de predicción, asegurando
-          que las probabilidades de PhaseNet, EQTransformer y GPD se grafiquen en sus propias
-          filas de subplot (`row_offset + 1`, `row_offset + 2`, `row_offset + 3`).
-        - **Coherencia Temporal (Offset de tiempo):** Se calcula un `offset` de tiempo (`subpreds[0].stats.starttime - stream[0].stats.starttime`)
-          para asegurar que las predicciones se grafiquen correctamente alineadas en el tiempo
-          con las trazas sísmicas a las que corresponden. Esto es importante si el tiempo de inicio
-          de las predicciones no coincide exactamente con el de las trazas sísmicas.
-        - **Limpieza de Memoria (`del`, `gc.collect()`):** Se realizan llamadas explícitas
-          a `del` y `gc.collect()` después de procesar cada traza y cada conjunto de predicciones
-          para liberar agresivamente la memoria RAM, lo cual es vital en entornos de procesamiento
-          continuo o con muchos gráficos.
-        - **Límites Y y X:** Se establecen límites adecuados para los ejes Y (amplitud/probabilidad)
-          y X (tiempo) para asegurar una visualización clara. El límite Y para las probabilidades
-          se establece de 0 a 1.1 para incluir la escala completa.
-    """
-    # Establece el título del primer subplot para la sección actual (original o filtrado).
-    title = "Original" if filter_type == "original" else f"Filtro: {filter_type}"
-    axs[row_offset].set_title(title, fontsize=12, fontweight='bold')
-
-    # Define colores predeterminados para las trazas sísmicas (ej., Z, N, E).
-    colors = ['k', 'r', 'b'] # Negro, Rojo, Azul
-    offset_factor = 1.2 # Factor para desplazar verticalmente las trazas y evitar solapamiento
-
-    # Procesa cada traza sísmica individualmente para optimizar el uso de memoria.
-    for i, tr in enumerate(stream):
-        color = colors[i % len(colors)] # Asigna un color rotatorio
-        
-        # Normaliza los datos de la traza para que estén en un rango consistente (-1 a 1).
-        # Esto es crucial para graficar múltiples trazas con diferentes amplitudes en el mismo eje.
-        max_abs = np.max(np.abs(tr.data))
-        if max_abs > 0:  # Evita la división por cero si la traza es plana
-            norm_data = tr.data / max_abs
-        else:
-            norm_data = tr.data
-        
-        # Calcula el desplazamiento vertical para esta traza.
-        offset = (len(stream) - 1 - i) * offset_factor
-        
-        # Grafica la traza normalizada con su desplazamiento.
-        axs[row_offset].plot(tr.times(), norm_data + offset, color=color, label=tr.stats.channel)
-
-        # Libera la referencia a `norm_data` inmediatamente para gestionar la memoria.
-        del norm_data
-
-    # Configura los límites del eje Y para la traza sísmica y el eje X para la ventana de tiempo.
-    axs[row_offset].set_ylim(-1, len(stream) * offset_factor) # Ajusta el límite Y según el número de trazas y offset
-    axs[row_offset].set_xlim(0, t1 - t0) # El eje X va desde 0 hasta la duración de la ventana
-    axs[row_offset].set_ylabel("Amplitud\nNormalizada") # Etiqueta del eje Y
-    axs[row_offset].legend(loc="upper right") # Muestra la leyenda del canal
-
-    # Define los modelos y sus correspondientes streams de predicciones para iterar.
-    models_data = [
-        ("EQTransformer", predictions["eqt_preds"]),
-        ("PhaseNet", predictions["pn_preds"]),
-        ("GPD", predictions["gpd_preds"])
-    ]
-
-    # Itera sobre cada modelo de predicción.
-    for i, (model_name, preds_full) in enumerate(models_data):
-        # Selecciona el subplot correcto para las predicciones del modelo actual.
-        # Las predicciones se grafican en las filas siguientes a la traza sísmica.
-        current_ax = axs[row_offset + i + 1]
-
-        # Recorta el stream de predicciones completo a la ventana de tiempo actual.
-        subpreds = preds_full.slice(t0, t1)
-        
-        # Si no hay predicciones en la ventana, configura el eje y continúa.
-        if len(subpreds) == 0:
-            current_ax.set_ylabel(model_name)
-            current_ax.set_ylim(0, 1.1) # Rango de probabilidad de 0 a 1.1
-            del subpreds # Libera referencia
-            continue
-
-        # Calcula el offset de tiempo para alinear las predicciones con la traza sísmica.
-        # Esto es necesario si los tiempos de inicio del stream y las predicciones difieren ligeramente.
-        offset = subpreds[0].stats.starttime - stream[0].stats.starttime
-
-        # Grafica cada traza de predicción individualmente.
-        for pred_trace in subpreds:
-            try:
-                # Intenta extraer el nombre del modelo y la clase de fase del nombre del canal.
-                pred_model, pred_class = pred_trace.stats.channel.split("_")
-            except Exception:
-                # Si el formato no es el esperado, usa el canal completo y una clase vacía.
-                pred_model = pred_trace.stats.channel
-                pred_class = ""
-
-            # Omite las trazas de ruido si el nombre de la clase es "N".
-            if pred_class == "N":
-                continue
-
-            # Obtiene el color de la clase de fase del diccionario de colores.
-            c = color_dict.get(pred_class, "C0") # "C0" es el color por defecto de matplotlib
-
-            # Grafica la traza de predicción. Se suma el offset de tiempo para la alineación.
-            current_ax.plot(offset + pred_trace.times(), pred_trace.data,
-                          label=pred_class, color=c)
-
-        # Configura las etiquetas y límites del eje para el subplot de predicciones.
-        current_ax.set_ylabel(model_name)
-        current_ax.legend(loc="upper right")
-        current_ax.set_ylim(0, 1.1) # Las probabilidades van de 0 a 1
+    band_indexes = stream_window_indexes(original_stream, filtered_streams, predictions_dict,
+                                         {0: (t0.ns, t1.ns)})
+    spec = comparison_window_spec_for(band_indexes, 0, t0, t1, basename, window_index, results_img_folder)
+    if spec is None:
+        return
+    pool = RenderPool(workers=1)
+    pool.add(spec)
+    pool.finish()
 
-        # Limpia inmediatamente la referencia a las predicciones recortadas y fuerza la recolección de basura.
-        del subpreds
-        gc.collect()
 
-def generate_individual_plots(original_stream, filtered_streams, predictions_dict, basename, results_img_folder, window_length_minutes):
+def generate_individual_plots(original_stream, filtered_streams, predictions_dict, basename, results_img_folder, window_length_minutes,
+                              window_origin=None, first_window=0, windows=None, strip_dpi=None, comparison_folder=None):
     """
     Genera y guarda gráficos individuales para cada tipo de stream (original y cada uno de los filtrados)
     a lo largo de todas las ventanas de tiempo definidas. Cada gráfico muestra la traza sísmica
@@ -903,6 +856,22 @@ def generate_individual_plots(original_stream, filtered_streams, predictions_dic
             se crearán subcarpetas para cada tipo de filtro.
         window_length_minutes (int):
             La duración de cada ventana de tiempo en minutos para la cual se generará un gráfico individual.
+        window_origin (obspy.core.utcdatetime.UTCDateTime, optional):
+            Tiempo a partir del cual se alinean las ventanas. Por defecto es el inicio de
+            `original_stream` (ver `generate_comparison_plots`).
+        first_window (int, optional):
+            Índice de la primera ventana a generar. Por defecto 0.
+        windows (set, optional):
+            Índices (posición desde `window_origin`) de las ventanas que se dibujan a resolución
+            completa. Las demás se omiten, sin que cambie el número de las siguientes. Por defecto
+            es None (todas las ventanas).
+        strip_dpi (int, optional):
+            Si se indica, las ventanas que no están en `windows` se dibujan a esta resolución en
+            lugar de omitirse. Por defecto es None.
+        comparison_folder (str, optional):
+            Si se indica, también se guarda ahí el gráfico comparativo de cada ventana, compuesto
+            apilando los paneles de las bandas recién dibujados (ver `window_group_spec`) en lugar
+            de volver a graficar todas las señales (`generate_comparison_plots`). Por defecto es None.
 
     Returns:
         None: La función no retorna ningún valor, pero guarda múltiples imágenes PNG
@@ -918,39 +887,41 @@ def generate_individual_plots(original_stream, filtered_streams, predictions_dic
           dentro de `results_img_folder` para cada `filter_type` (ej., `results_img_folder/original/`,
           `results_img_folder/0.5-2Hz/`), donde se guardan los gráficos correspondientes.
         - **Bucles Anidados para Procesamiento:** La función utiliza bucles anidados:
-            1. Un bucle externo itera a través del stream original y cada stream filtrado.
-            2. Un bucle interno itera sobre las ventanas de tiempo dentro de cada stream.
-        - **Creación Dinámica de Subplots (`gridspec_kw`):** Para cada ventana y tipo de filtro,
-          se crea una nueva figura con 4 subplots: uno grande para la señal sísmica y tres más
-          pequeños para las predicciones de PhaseNet, EQTransformer y GPD, respectivamente.
-          `height_ratios=[2, 1, 1, 1]` asigna el doble de altura a la fila de la señal sísmica.
-        - **Lógica de Graficación Duplicada/Integrada:** La lógica para graficar las trazas sísmicas
-          normalizadas con offset y las trazas de probabilidad de los modelos es similar a la
-          función `process_stream_window` pero está directamente integrada aquí. Esto se hace
-          para maximizar la limpieza de memoria al procesar una ventana a la vez.
+            1. Un bucle externo itera sobre las ventanas de tiempo.
+            2. Un bucle interno lee esa ventana del stream original y de cada stream filtrado;
+               los paneles de todas las bandas de la ventana se envían juntos a dibujar, de modo
+               que el gráfico comparativo se compone con ellos sin dibujarlos otra vez.
+        - **Figura Reutilizada (`IndividualWindowRenderer`):** La figura con 4 subplots (uno grande para
+          la señal sísmica y tres para las predicciones de EQTransformer, PhaseNet y GPD, con
+          `height_ratios=[2, 1, 1, 1]`) se crea una sola vez por tipo de filtro en cada proceso de
+          renderizado. En cada ventana solo se actualizan los datos de las líneas, la leyenda, los límites
+          y el formateador de tiempo antes de guardar, por lo que el PNG es el mismo que con una figura
+          nueva por ventana.
+        - **Índice de Ventanas (`WindowIndex`):** Antes del bucle se calculan, una vez por stream
+          (señal y predicciones de cada banda), los intervalos de muestras de todas las ventanas con
+          las mismas reglas que `stream.slice(t0, t1)`. Cada ventana se lee como vistas numpy de
+          esos intervalos, sin crear Streams ni copiar Stats en cada una.
+        - **Renderizado en Paralelo (`RenderPool`):** Aquí solo se recortan las ventanas y se reducen
+          sus trazas (`window_lines`); las descripciones resultantes se dibujan en lotes en procesos
+          aparte con `Figure`/`FigureCanvasAgg`, sin `pyplot`, y cada PNG se codifica en un hilo
+          mientras se dibuja el siguiente. Al terminar se imprime el tiempo de dibujo por ventana.
         - **Manejo de Trazas de Ruido (`pred_class == "N"`):** Las trazas de predicción que corresponden
           a "ruido" (`_N`) son explícitamente omitidas de la graficación para centrarse en las
           predicciones de fase P y S.
         - **`color_dict`:** Se utiliza un diccionario de colores para asegurar una representación
           visual consistente de las fases P y S. Se corrigió un posible error tipográfico de "S1" a "C1"
           para usar los colores cíclicos predeterminados de Matplotlib.
-        - **Gestión Agresiva de Memoria (`del`, `gc.collect()`, `plt.close()`, `plt.clf()`, `plt.cla()`):**
-          Estas operaciones se realizan en múltiples puntos clave:
-            - Después de recortar `subst` si está vacío.
-            - Después de procesar cada `subpreds` de un modelo individualmente.
-            - Después de procesar cada `tr` de la señal sísmica.
-            - Después de guardar cada figura (`plt.close(fig)`, `plt.clf()`, `plt.cla()`).
-            - Al final de cada iteración del bucle externo (por cada tipo de filtro) para una limpieza
-              adicional.
-          Esta estrategia es vital para prevenir el agotamiento de la memoria al generar un gran
-          número de gráficos.
+        - **Envolvente Mínimo/Máximo:** Las trazas y las probabilidades se reducen con `trace_envelope`
+          a la muestra mínima y máxima de cada columna de píxeles antes de graficarse.
+        - **Gestión de Memoria:** Los recortes de cada ventana se liberan tras guardarla, y la figura
+          se libera al terminar; `RenderPool` limita las ventanas en vuelo.
         - **`create_time_formatter`:** Utiliza una función auxiliar para formatear los ticks
           del eje X a un formato de tiempo legible (HH:MM:SS).
     """
     # Convierte la duración de la ventana de minutos a segundos.
     wlength = window_length_minutes * 60
     # Obtiene los tiempos de inicio y fin del stream
-    starttime = original_stream[0].stats.starttime
+    starttime = window_origin if window_origin is not None else original_stream[0].stats.starttime
     endtime = original_stream[0].stats.endtime
     # Calcula la duración total del stream en segundos.
     total_seconds = int(endtime - starttime)
@@ -959,196 +930,188 @@ def generate_individual_plots(original_stream, filtered_streams, predictions_dic
     # predeterminados de Matplotlib del ciclo de colores.
     color_dict = {"P": "C0", "S": "C1", "Detection": "C2"}
 
-    # Itera sobre el stream original y luego sobre cada stream filtrado.
-    # `[("original", original_stream)]` añade el stream original al inicio de la iteración.
-    for filter_type, stream in [("original", original_stream)] + list(filtered_streams.items()):
-        # Obtiene las predicciones correspondientes a este tipo de filtro.
-        predictions = predictions_dict[filter_type]
-
-        # Crea una carpeta específica para guardar las imágenes de este tipo de filtro.
-        filter_img_folder = os.path.join(results_img_folder, filter_type)
-        os.makedirs(filter_img_folder, exist_ok=True)
-
-        window_index = 0 # Reinicia el índice de la ventana para cada tipo de filtro.
-
-        # Itera sobre el stream en ventanas de `wlength` segundos.
-        for s in range(0, total_seconds, wlength):
-            t0 = starttime + s        # Tiempo de inicio de la ventana actual
-            t1 = t0 + wlength         # Tiempo de fin de la ventana actual
-            
-            # Recorta el stream a la ventana de tiempo actual.
-            subst = stream.slice(t0, t1)
-            # Si el recorte está vacío, libera la referencia y pasa a la siguiente ventana.
-            if len(subst) == 0:
-                del subst
+    # Las ventanas se dibujan en lotes en procesos aparte mientras aquí se recortan las siguientes.
+    pool = RenderPool()
+
+    # El stream original y luego cada stream filtrado, con una carpeta de imágenes por tipo de filtro.
+    streams = [("original", original_stream)] + list(filtered_streams.items())
+    for filter_type, _ in streams:
+        os.makedirs(os.path.join(results_img_folder, filter_type), exist_ok=True)
+    # Número de la siguiente imagen de cada tipo de filtro (las ventanas vacías no cuentan).
+    window_indices = {filter_type: first_window for filter_type, _ in streams}
+    # Intervalos de muestras de todas las ventanas en cada stream, calculados una sola vez.
+    window_range = range(first_window, -(-total_seconds // wlength))
+    band_indexes = stream_window_indexes(original_stream, filtered_streams, predictions_dict,
+                                         window_bounds(starttime, wlength, window_range))
+
+    # Itera sobre el stream en ventanas de `wlength` segundos.
+    for s in range(first_window * wlength, total_seconds, wlength):
+        t0 = starttime + s        # Tiempo de inicio de la ventana actual
+        t1 = t0 + wlength         # Tiempo de fin de la ventana actual
+        number = s // wlength
+
+        # Ventana sin detecciones: se omite (conservando su número) o se dibuja reducida.
+        dpi = PLOT_DPI
+        skipped = windows is not None and number not in windows
+        if skipped and strip_dpi is not None:
+            dpi, skipped = strip_dpi, False
+
+        panels = []
+        has_original = False
+        for filter_type, signal_index, prediction_indexes in band_indexes:
+            # Trazas del stream en la ventana actual (vistas de sus muestras); si no hay, pasa al
+            # siguiente stream.
+            traces = signal_index.window(number)
+            if not traces:
+                continue
+            window_index = window_indices[filter_type]
+            window_indices[filter_type] += 1
+            if skipped:
                 continue
+            has_original = has_original or filter_type == "original"
+
+            # Líneas reducidas de la señal y de las probabilidades de cada modelo: es lo único
+            # que recibe el proceso que dibuja.
+            predictions = {key: index.window(number) for key, index in prediction_indexes.items()}
+            trace_lines, model_lines = window_lines(traces, predictions, t0, t1, color_dict,
+                                                    width_px=PLOT_WIDTH_PX * dpi // PLOT_DPI)
+            img_filename = os.path.join(results_img_folder, filter_type,
+                                        f"{basename}_{filter_type}_window{window_index}.png")
+            panels.append(individual_window_spec(img_filename, t0, filter_type, wlength, trace_lines, model_lines,
+                                                 dpi=dpi))
+            del traces, predictions, trace_lines, model_lines
+
+        # El comparativo lleva el número de la ventana, como en `generate_comparison_plots`, y solo
+        # se compone si la señal original tiene datos en ella.
+        comparison_path = None
+        if comparison_folder is not None and has_original:
+            comparison_path = os.path.join(comparison_folder, f"{basename}_comparison_window{number}.png")
+        if panels:
+            pool.add(window_group_spec(panels, comparison_path))
+        del panels
+
+    # Espera a que todas las imágenes estén escritas e informa del tiempo de render por ventana.
+    pool.finish()
+    report_render_stats(basename, pool)
+    gc.collect()
 
-            # Crea una nueva figura con 4 subplots.
-            # sharex=True: todos los subplots comparten el mismo eje X.
-            # height_ratios: asigna una mayor altura a la traza sísmica (ratio 2) y menor a las predicciones (ratio 1).
-            fig, axs = plt.subplots(4, 1, figsize=(15, 7),
-                                   sharex=True,
-                                   gridspec_kw={'hspace': 0.05, 'height_ratios': [2, 1, 1, 1]})
-
-            # Establece el título principal de la figura.
-            fig.suptitle(f"{filter_type}", fontsize=14, fontweight='bold')
-
-            # Define la lista de modelos de predicción a procesar.
-            models_to_process = [
-                ("EQTransformer", predictions["eqt_preds"]),
-                ("PhaseNet", predictions["pn_preds"]),
-                ("GPD", predictions["gpd_preds"])
-            ]
-
-            # Itera sobre cada modelo y grafica sus predicciones.
-            for i, (model_name, preds_full) in enumerate(models_to_process):
-                # Recorta las predicciones completas a la ventana de tiempo actual.
-                subpreds = preds_full.slice(t0, t1)
-                
-                # Si no hay predicciones en la ventana, configura el eje y limpia.
-                if len(subpreds) == 0:
-                    axs[i+1].set_ylabel(model_name)
-                    axs[i+1].set_ylim(0, 1.1)
-                    del subpreds
-                    continue
 
-                # Calcula el offset de tiempo para alinear las predicciones correctamente.
-                offset = subpreds[0].stats.starttime - subst[0].stats.starttime
+def report_render_stats(basename, pool):
+    """Imprime las ventanas dibujadas y el tiempo de dibujo por ventana de cada banda de un `RenderPool`."""
+    for title, (windows, seconds) in pool.stats.items():
+        print(f"Gráficos {basename} {title}: {windows} ventanas, {seconds / windows * 1000:.0f} ms/ventana de dibujo")
+    if pool.stats:
+        print(f"Gráficos {basename}: {sum(w for w, _ in pool.stats.values())} imágenes en "
+              f"{pool.wall_seconds:.2f} s con {pool.workers} proceso(s)")
 
-                # Grafica cada traza de predicción individualmente.
-                for pred_trace in subpreds:
-                    try:
-                        # Extrae el modelo y la clase (P, S, N) del nombre del canal.
-                        pred_model, pred_class = pred_trace.stats.channel.split("_")
-                    except Exception:
-                        pred_model = pred_trace.stats.channel
-                        pred_class = ""
 
-                    # Omite las trazas de ruido.
-                    if pred_class == "N":
-                        continue
+def generate_comparison_plots(original_stream, filtered_streams, predictions_dict, basename, comparison_folder,
+                              window_length_minutes, window_origin=None, first_window=0, windows=None, strip_dpi=None):
+    """
+    Genera los gráficos comparativos (señal original y todas las filtradas con sus predicciones)
+    para cada ventana de tiempo, graficando una figura de 4 filas por señal en cada ventana (ver
+    `plot_filtered_streams_window`). Al procesar un archivo los comparativos se componen con los
+    paneles de `generate_individual_plots` (`comparison_folder`); esta pasada aparte solo se usa para
+    completar trabajos interrumpidos entre ambas etapas.
 
-                    # Obtiene el color correspondiente a la clase de fase.
-                    c = color_dict.get(pred_class, "C0")
-                    
-                    # Grafica la predicción.
-                    axs[i+1].plot(offset + pred_trace.times(), pred_trace.data,
-                                 label=pred_class, color=c)
-
-                # Configura las etiquetas y límites para el subplot de predicciones.
-                axs[i+1].set_ylabel(model_name)
-                axs[i+1].legend(loc="upper right")
-                axs[i+1].set_ylim(0, 1.1)
-
-                # Limpia inmediatamente las referencias a las predicciones recortadas y fuerza la recolección de basura.
-                del subpreds
-                gc.collect()
-
-            # --- Graficación de las trazas sísmicas ---
-            # Define colores y un factor de desplazamiento para las trazas sísmicas.
-            colors = ['k', 'r', 'b'] # Negro, Rojo, Azul
-            offset_factor = 1.2
-
-            # Itera sobre cada traza sísmica en el stream recortado.
-            for i, tr in enumerate(subst):
-                color = colors[i % len(colors)] # Asigna un color rotatorio
-                
-                # Normaliza los datos de la traza para graficar.
-                max_abs = np.max(np.abs(tr.data))
-                if max_abs > 0:
-                    norm_data = tr.data / max_abs
-                else:
-                    norm_data = tr.data
-                
-                # Calcula el desplazamiento vertical.
-                offset = (len(subst) - 1 - i) * offset_factor
-                
-                # Grafica la traza normalizada.
-                axs[0].plot(tr.times(), norm_data + offset, color=color, label=tr.stats.channel)
-                del norm_data  # Libera la referencia inmediatamente
-
-            # Configura los límites y etiquetas para el subplot de la señal sísmica.
-            axs[0].set_ylim(-1, len(subst) * offset_factor)
-            axs[0].set_xlim(0, wlength) # El eje X va desde 0 hasta la duración de la ventana
-            axs[0].set_ylabel("Amplitud\nNormalizada")
-            axs[0].legend(loc="upper right")
-
-            # --- Formato del eje de tiempo ---
-            # Crea un formateador para el eje X.
-            formatter = create_time_formatter(t0)
-            for ax in axs:
-                ax.xaxis.set_major_formatter(plt.FuncFormatter(formatter))
-
-            # Establece la etiqueta del eje X solo en el último subplot.
-            axs[3].set_xlabel("Tiempo (HH:MM:SS)")
-
-            # --- Guardar figura y Limpieza ---
-            # Construye la ruta para guardar la imagen.
-            img_filename = os.path.join(filter_img_folder, f"{basename}_{filter_type}_window{window_index}.png")
-            plt.savefig(img_filename, dpi=150) # Guarda con alta resolución
-
-            # Realiza una limpieza agresiva de memoria de Matplotlib y Python.
-            plt.close(fig) # Cierra la figura
-            plt.clf()      # Limpia la figura actual
-            plt.cla()      # Limpia los ejes actuales
-
-            # Libera referencias explícitamente y fuerza la recolección de basura.
-            del fig, axs, subst, formatter
-            gc.collect()
-
-            window_index += 1 # Incrementa el índice de la ventana
-
-        # Limpieza adicional después de procesar todas las ventanas para un tipo de filtro.
-        gc.collect()
+    Args:
+        original_stream (obspy.core.stream.Stream): Stream original sin filtrar.
+        filtered_streams (dict): Streams filtrados por tipo de filtro.
+        predictions_dict (dict): Predicciones por tipo de filtro (ver `plot_filtered_streams_window`).
+        basename (str): Nombre base del archivo MiniSEED original.
+        comparison_folder (str): Carpeta donde se guardan las imágenes comparativas.
+        window_length_minutes (int): Duración de cada ventana en minutos.
+        window_origin (obspy.core.utcdatetime.UTCDateTime, optional):
+            Tiempo a partir del cual se alinean las ventanas. Por defecto es el inicio de
+            `original_stream`. Se usa en el modo incremental, donde el stream recibido es solo
+            la parte final del archivo pero las ventanas siguen alineadas al inicio del día.
+        first_window (int, optional):
+            Índice de la primera ventana a generar. Por defecto 0.
+        windows (set, optional): Ventanas a dibujar a resolución completa (ver `generate_individual_plots`).
+        strip_dpi (int, optional): Resolución de las demás ventanas; si es None, se omiten.
+    """
+    wlength = window_length_minutes * 60
+    starttime = window_origin if window_origin is not None else original_stream[0].stats.starttime
+    endtime = original_stream[0].stats.endtime
+    total_seconds = int(endtime - starttime)
+
+    window_range = range(first_window, -(-total_seconds // wlength))
+    band_indexes = stream_window_indexes(original_stream, filtered_streams, predictions_dict,
+                                         window_bounds(starttime, wlength, window_range))
+
+    pool = RenderPool()
+    window_index = first_window
+    for s in range(first_window * wlength, total_seconds, wlength):
+        t0 = starttime + s
+        t1 = t0 + wlength
 
+        dpi = PLOT_DPI
+        if windows is not None and s // wlength not in windows:
+            if strip_dpi is None:
+                window_index += 1
+                continue
+            dpi = strip_dpi
+
+        # Prepara el gráfico comparativo de la ventana actual y lo envía a dibujar.
+        spec = comparison_window_spec_for(
+            band_indexes, s // wlength, t0, t1, basename, window_index, comparison_folder, dpi=dpi
+        )
+        if spec is not None:
+            pool.add(spec)
+        del spec
 
-def create_time_formatter(t0_ref):
+        window_index += 1
+
+    pool.finish()
+    report_render_stats(basename, pool)
+    gc.collect()
+
+def detection_windows(summary, basename, window_length_minutes):
     """
-    Crea y retorna una función de formateo personalizada para el eje X (tiempo) de los gráficos
-    de Matplotlib. Esta función es esencial para presentar los tiempos sísmicos de manera
-    legible y relativa a un punto de inicio específico (`t0_ref`), mostrando solo la hora,
-    minutos y segundos.
+    Ventanas de un archivo con al menos un pick o una detección de algún modelo en alguna banda.
+    Los picks y detecciones ya superan los umbrales de cada modelo (`MODEL_THRESHOLDS`), así que en
+    una ventana sin ninguno los gráficos solo muestran ruido.
 
     Args:
-        t0_ref (obspy.core.utcdatetime.UTCDateTime):
-            El tiempo de referencia UTC (punto de inicio) para el eje X del gráfico.
-            El formateador calculará el tiempo absoluto sumando el valor `x` (que
-            representa segundos desde el inicio del eje) a este tiempo de referencia.
+        summary (summary.SummaryAggregator): Resumen con los picks por minuto del archivo.
+        basename (str): Nombre base del archivo MiniSEED.
+        window_length_minutes (int): Duración de las ventanas en minutos.
 
     Returns:
-        function: Una función (`time_formatter`) que toma dos argumentos (`x`, `pos`)
-                  y retorna una cadena de texto formateada como "HH:MM:SS".
+        set: Índices de las ventanas desde el inicio del archivo, o None si no se conocen los
+            conteos por ventana del archivo.
+    """
+    counts = summary.window_counts(basename, window_length_minutes) if summary is not None else None
+    if counts is None:
+        return None
+    return {index for index, bands in counts.items()
+            if any(count > 0 for models in bands.values() for count in models.values())}
 
-    Notas:
-        - **Cierre de Clousure:** La función `create_time_formatter` es una fábrica de funciones.
-          Retorna una función interna (`time_formatter`) que "cierra" sobre el valor de `t0_ref`.
-          Esto significa que `time_formatter` siempre tendrá acceso al `t0_ref` con el que fue creada,
-          incluso después de que `create_time_formatter` haya terminado su ejecución.
-        - **Argumentos de `time_formatter` (`x`, `pos`):**
-            - `x`: Es el valor numérico de la posición del tick en el eje (generalmente en segundos
-              relativos al inicio del eje, o 0).
-            - `pos`: Es la posición de la marca, que a menudo no se usa para el formateo.
-        - **Conversión a `UTCDateTime`:** El valor `x` se suma a `t0_ref` para obtener un objeto
-          `UTCDateTime` que representa el tiempo absoluto en ese punto del eje.
-        - **Formato `"%H:%M:%S"`:** El método `strftime` del objeto `UTCDateTime` se utiliza para
-          formatear el tiempo como una cadena que muestra solo las horas, minutos y segundos.
-          Este formato es conciso y relevante para la mayoría de las visualizaciones de ventanas
-          sísmicas.
-    """
-    def time_formatter(x, pos):
-        """
-        Función interna que formatea un valor numérico de tiempo (en segundos relativos)
-        a una cadena de tiempo HH:MM:SS, usando t0_ref como punto de inicio.
-        """
-        # Convierte el valor 'x' (segundos desde el inicio del gráfico) a un objeto UTCDateTime.
-        time = t0_ref + x
-        # Formatea el objeto UTCDateTime a una cadena HH:MM:SS.
-        return time.strftime("%H:%M:%S")
-    
-    # Retorna la función interna que será usada por Matplotlib.
-    return time_formatter
+def save_render_plan(results_img_folder, window_count, windows, strip_dpi):
+    """
+    Guarda en `RENDER_PLAN_FILENAME` las ventanas sin detecciones de un archivo (omitidas o
+    dibujadas a `strip_dpi`) para que el manifiesto y la página de resultados las muestren.
 
-def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_file, window_length_minutes):
+    Args:
+        results_img_folder (str): Carpeta de imágenes del archivo.
+        window_count (int): Número de ventanas del archivo.
+        windows (set): Ventanas dibujadas a resolución completa. Si es None (se dibujaron todas),
+            se borra el plan de una ejecución anterior.
+        strip_dpi (int): Resolución de las ventanas reducidas, o None si se omitieron.
+    """
+    path = os.path.join(results_img_folder, RENDER_PLAN_FILENAME)
+    if windows is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    quiet = [index for index in range(window_count) if index not in windows]
+    with open(path + ".tmp", 'w') as f:
+        json.dump({'window_count': window_count, 'strip_dpi': strip_dpi, 'quiet_windows': quiet}, f)
+    os.replace(path + ".tmp", path)
+
+def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_file, window_length_minutes,
+                 chunk_cache=None, checkpoint=None, annotation_store=None, summary=None, render_plots=True,
+                 render_policy="all", strip_dpi=None):
     """
     Orquesta el procesamiento completo de un archivo MiniSEED (`.mseed`).
     Esta función carga el archivo, aplica una serie de filtros de banda de paso
@@ -1177,10 +1140,33 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
         window_length_minutes (int):
             La duración de las ventanas de tiempo en minutos que se utilizarán para
             generar los gráficos (tanto individuales como comparativos).
+        chunk_cache (chunk_cache.ChunkInferenceCache, optional):
+            Caché de anotaciones por bloques, reutilizada entre trabajos con rangos de
+            tiempo solapados. Ver `process_stream_with_models`. Por defecto es None.
+        checkpoint (checkpoint.JobCheckpoint, optional):
+            Checkpoint del trabajo. Las bandas y los grupos de gráficos ya terminados en una
+            ejecución anterior se omiten. Por defecto es None.
+        annotation_store (annotation_store.AnnotationStore, optional):
+            Almacén donde se guardan las anotaciones de cada banda (y sus formas de onda, si el
+            almacén se creó con `waveforms=True`) para análisis posteriores sin volver a ejecutar
+            los modelos. Su contenido anterior se reemplaza. Por defecto es None.
+        summary (summary.SummaryAggregator, optional):
+            Resumen del trabajo al que se añaden los conteos de cada banda. Por defecto es None.
+        render_plots (bool, optional):
+            Si es False no se generan los gráficos (modo diferido y modo solo picks): solo se
+            cargan y filtran los datos, se ejecutan los modelos y se escriben los CSV. Con
+            `annotation_store` los gráficos se pueden dibujar después desde el almacén (ver
+            `render_window_image` y `rerender_results`). Por defecto es True.
+        render_policy (str, optional):
+            Una de `RENDER_POLICIES`. Con "detections" solo se dibujan las ventanas con picks o
+            detecciones según `summary` (sin él se dibujan todas). Por defecto es "all".
+        strip_dpi (int, optional):
+            Con la política "detections", resolución a la que se dibujan las demás ventanas; si es
+            None se omiten. Por defecto es None.
 
     Returns:
-        None: La función no retorna ningún valor, pero genera múltiples archivos
-              CSV y PNG en las carpetas de resultados.
+        float: Estaciones-día procesadas (ver `station_days`), o None si el archivo no se pudo
+              cargar. Los resultados se guardan como archivos CSV y PNG en las carpetas de resultados.
 
     Raises:
         (Captura e imprime errores durante la carga del archivo o el procesamiento de streams.)
@@ -1206,7 +1192,7 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
               donde todos los streams filtrados se mantienen en memoria simultáneamente,
               aquí cada filtro se aplica y procesa uno por uno. Solo se mantiene en
               `filtered_streams` la referencia necesaria para la graficación comparativa.
-            - **Liberación Agresiva de Memoria (`del`, `gc.collect()`, `plt.close('all')`):**
+            - **Liberación Agresiva de Memoria (`del`, `gc.collect()`):**
               Después de cada fase de procesamiento (ej., después de aplicar un filtro
               y procesar con modelos, después de generar gráficos individuales, después
               de cada ventana de gráficos comparativos, y al final de la función),
@@ -1218,13 +1204,10 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
             - **`generate_individual_plots`:** Crea gráficos separados para cada tipo de filtro
               (original y los filtrados) en ventanas de tiempo. Estos gráficos se guardan
               en subcarpetas específicas del filtro.
-            - **`plot_filtered_streams_window`:** Crea gráficos comparativos que muestran
+            - **`generate_comparison_plots`:** Crea gráficos comparativos que muestran
               la señal original y *todas* las señales filtradas, junto con sus predicciones
               de modelo, para una ventana de tiempo específica. Estos se guardan en una
               carpeta de "comparison".
-        - **`plt.close('all')`:** Al final de la función, esta llamada cierra todas las
-          figuras de Matplotlib que puedan haber quedado abiertas, lo que es otra medida
-          importante de limpieza de recursos gráficos.
     """
     print(f"Procesando {filepath}")
     # Carga el archivo mseed. Si hay un error al cargar, la función termina.
@@ -1240,31 +1223,45 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
     os.makedirs(results_img_folder, exist_ok=True)
     os.makedirs(results_folder, exist_ok=True)
 
-    # Define los parámetros de los filtros de banda de paso a aplicar.
-    filters = [
-        {"type": "0.5-2Hz", "freqmin": 0.5, "freqmax": 2},
-        {"type": "2-4Hz", "freqmin": 2, "freqmax": 4},
-        {"type": "5-10Hz", "freqmin": 5, "freqmax": 10},
-        {"type": "1-15Hz", "freqmin": 1, "freqmax": 15}
-    ]
-
     # Extrae el nombre base del archivo (sin ruta ni extensión).
     basename = os.path.splitext(os.path.basename(filepath))[0]
+    # Datos del archivo, para medir el rendimiento en estaciones-día por hora.
+    days = station_days(original_stream)
+
+    # Los picks por ventana del manifiesto se cuentan desde el inicio de la primera ventana.
+    if summary is not None:
+        summary.set_window_origin(basename, original_stream[0].stats.starttime)
+
+    if annotation_store is not None:
+        annotation_store.clear()
+        # Umbrales efectivos de esta ejecución; el re-pick parte de ellos.
+        annotation_store.set_metadata("thresholds", {
+            "PhaseNet": resolve_thresholds(pn_model, "PhaseNet"),
+            "EQTransformer": resolve_thresholds(eqt_model, "EQTransformer"),
+            "GPD": resolve_thresholds(gpd_model, "GPD")
+        })
+
+    # Las predicciones continuas (una segunda pasada de inferencia) solo hacen falta para graficar
+    # o para guardarlas en el almacén; en modo solo picks sin almacén se omiten.
+    annotate = render_plots or annotation_store is not None
 
     # --- Procesamiento de la señal original ---
     print("Procesando señal original...")
     predictions_dict = {
         "original": process_stream_with_models(
             original_stream, pn_model, eqt_model, gpd_model,
-            basename, results_folder, "original" # Tipo de filtro "original"
+            basename, results_folder, "original", # Tipo de filtro "original"
+            chunk_cache=chunk_cache, checkpoint=checkpoint, summary=summary, annotate=annotate
         )
     }
+    if annotation_store is not None:
+        annotation_store.write_band("original", predictions_dict["original"], original_stream)
 
     # --- Procesamiento de cada señal filtrada ---
     # `filtered_streams` almacenará los streams filtrados para la graficación comparativa.
     filtered_streams = {}
 
-    for filter_params in filters:
+    for filter_params in FILTERS:
         print(f"Procesando señal con filtro {filter_params['type']}...")
 
         # Aplica el filtro al stream original (se crea una copia internamente en `apply_filter`).
@@ -1275,8 +1272,12 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
         # Procesa el stream filtrado con los modelos y guarda las predicciones.
         predictions_dict[filter_params['type']] = process_stream_with_models(
             filtered_stream, pn_model, eqt_model, gpd_model,
-            basename, results_folder, filter_params['type']
+            basename, results_folder, filter_params['type'],
+            chunk_cache=chunk_cache, checkpoint=checkpoint, summary=summary, annotate=annotate
         )
+        if annotation_store is not None:
+            annotation_store.write_band(filter_params['type'], predictions_dict[filter_params['type']],
+                                        filtered_stream)
 
         # Guarda el stream filtrado en el diccionario para su uso posterior en la graficación.
         filtered_streams[filter_params['type']] = filtered_stream
@@ -1289,37 +1290,45 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
     
     # Crea la carpeta para los gráficos comparativos.
     comparison_folder = os.path.join(results_img_folder, "comparison")
-    os.makedirs(comparison_folder, exist_ok=True)
-
-    # Genera gráficos individuales para cada tipo de filtro en todas las ventanas.
-    generate_individual_plots(original_stream, filtered_streams, predictions_dict,
-                             basename, results_img_folder, window_length_minutes)
+    if render_plots:
+        os.makedirs(comparison_folder, exist_ok=True)
+
+    # Con la política "detections" solo se dibujan a resolución completa las ventanas con picks o
+    # detecciones; el número de imágenes y el tiempo de dibujo dependen de la actividad sísmica.
+    render_windows = None
+    if render_plots and render_policy == "detections":
+        render_windows = detection_windows(summary, basename, window_length_minutes)
+        if render_windows is None:
+            print(f"Advertencia: sin conteos por ventana de {basename}; se dibujan todas las ventanas")
+    if render_plots:
+        window_count = len(range(0, int(original_stream[0].stats.endtime - original_stream[0].stats.starttime),
+                                 window_length_minutes * 60))
+        save_render_plan(results_img_folder, window_count, render_windows, strip_dpi)
+        if render_windows is not None:
+            print(f"Gráficos {basename}: {len(render_windows & set(range(window_count)))} de {window_count} "
+                  f"ventanas con detecciones")
+
+    # Genera gráficos individuales para cada tipo de filtro en todas las ventanas, y con sus paneles
+    # los comparativos (se omite si ya se generaron antes de un reinicio, o en modo diferido).
+    if render_plots and (checkpoint is None or not checkpoint.is_stage_done(basename, "plots:individual")):
+        generate_individual_plots(original_stream, filtered_streams, predictions_dict,
+                                 basename, results_img_folder, window_length_minutes,
+                                 windows=render_windows, strip_dpi=strip_dpi, comparison_folder=comparison_folder)
+        if checkpoint is not None:
+            checkpoint.mark_stage_done(basename, "plots:individual")
+            checkpoint.mark_stage_done(basename, "plots:comparison")
 
     # Limpieza intermedia de memoria antes de la generación de gráficos comparativos.
     gc.collect()
 
-    # Define la duración de la ventana y los tiempos de inicio/fin para los gráficos comparativos.
-    wlength = window_length_minutes * 60
-    starttime = original_stream[0].stats.starttime
-    endtime = original_stream[0].stats.endtime
-    total_seconds = int(endtime - starttime)
-
-    # Genera gráficos comparativos para cada ventana de tiempo.
-    window_index = 0
-    for s in range(0, total_seconds, wlength):
-        t0 = starttime + s
-        t1 = t0 + wlength
-
-        # Llama a la función para generar el gráfico comparativo de la ventana actual.
-        plot_filtered_streams_window(
-            original_stream, filtered_streams, predictions_dict,
-            t0, t1, basename, window_index, comparison_folder
-        )
-
-        # Limpieza de memoria después de cada gráfico comparativo de ventana.
-        gc.collect()
-
-        window_index += 1
+    # Los gráficos comparativos solo se grafican por separado si el trabajo se interrumpió entre los
+    # individuales y los comparativos en una versión que los generaba en dos pasadas.
+    if render_plots and checkpoint is not None and not checkpoint.is_stage_done(basename, "plots:comparison"):
+        generate_comparison_plots(original_stream, filtered_streams, predictions_dict,
+                                  basename, comparison_folder, window_length_minutes,
+                                  windows=render_windows, strip_dpi=strip_dpi)
+        if checkpoint is not None:
+            checkpoint.mark_stage_done(basename, "plots:comparison")
 
     # --- Limpieza final agresiva de memoria ---
     # Elimina explícitamente las referencias a objetos grandes para asegurar que se libere la memoria.
@@ -1330,7 +1339,8 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
 
     for pred_key in list(predictions_dict.keys()):
         pred_data = predictions_dict[pred_key]
-        for model_key in list(pred_data.keys()):
+        # Sin predicciones continuas (modo solo picks sin almacén) la entrada es None.
+        for model_key in list(pred_data.keys()) if pred_data is not None else []:
             del pred_data[model_key] # Elimina las predicciones de cada modelo
         del pred_data # Elimina el diccionario de predicciones por filtro
         del predictions_dict[pred_key] # Elimina la entrada del diccionario principal
@@ -1339,107 +1349,546 @@ def process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_f
     # Fuerza una última recolección de basura.
     gc.collect()
 
-    # Cierra todas las figuras de Matplotlib para liberar recursos gráficos.
-    plt.close('all')
-
     print(f"Procesamiento de {basename} completado y memoria liberada")
+    return days
+
+# Nombre del archivo de estado del modo incremental dentro de la carpeta de resultados de cada archivo.
+INCREMENTAL_STATE_FILENAME = "incremental_state.json"
+
+def load_incremental_state(state_path):
+    """
+    Lee el estado del modo incremental de un archivo. Retorna None si no existe o no se puede leer.
+    """
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Advertencia: estado incremental ilegible en {state_path}, se reprocesará el archivo: {e}")
+        return None
+
+def save_incremental_state(state_path, state):
+    """Guarda el estado del modo incremental de forma atómica (archivo temporal + reemplazo)."""
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+def model_context_seconds(*models):
+    """
+    Retorna el contexto (en segundos) que necesitan los modelos antes del primer dato nuevo:
+    la ventana de entrada más larga de los modelos, con un mínimo de 60 s para absorber
+    también el transitorio de los filtros pasa-banda al inicio del segmento.
+    """
+    context = 60.0
+    for model in models:
+        in_samples = getattr(model, 'in_samples', None)
+        sampling_rate = getattr(model, 'sampling_rate', None)
+        if in_samples and sampling_rate:
+            context = max(context, in_samples / sampling_rate)
+    return context
+
+def process_file_incremental(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_file, window_length_minutes,
+                             chunk_cache=None, summary=None, render_plots=True):
+    """
+    Procesa un archivo MiniSEED que crece con el tiempo (el archivo del día en curso) analizando
+    solo los datos añadidos desde la ejecución anterior.
+
+    La primera vez (o si cambia el inicio del archivo o la duración de ventana) se delega en
+    `process_file` y se guarda el estado. En las ejecuciones siguientes solo se lee del archivo la
+    parte nueva, precedida de un margen de contexto para los modelos y los filtros, se ejecutan los
+    modelos solo sobre ese segmento, se añaden los picks nuevos a los CSV existentes y se generan las
+    ventanas nuevas a continuación de las ya guardadas.
+
+    Args:
+        filepath (str): Ruta al archivo MiniSEED del día en curso.
+        pn_model, eqt_model, gpd_model: Modelos de SeisBench cargados.
+        base_output_dir_for_file (str): Carpeta de resultados de este archivo.
+        window_length_minutes (int): Duración de las ventanas de los gráficos en minutos.
+        chunk_cache (chunk_cache.ChunkInferenceCache, optional): Caché de anotaciones por bloques.
+        summary (summary.SummaryAggregator, optional): Resumen del trabajo; los picks nuevos se
+            suman a lo registrado en ejecuciones anteriores.
+        render_plots (bool, optional): Si es False no se generan las ventanas nuevas (modo solo
+            picks); las de ejecuciones anteriores se conservan. Por defecto es True.
+
+    Returns:
+        float: Estaciones-día del segmento analizado (con su contexto), 0 si no hay datos nuevos o
+            None si el archivo no se pudo cargar. Genera o amplía los CSV y PNG en las carpetas de
+            resultados.
+
+    Notas:
+        - **Estado (`incremental_state.json`):** guarda el inicio del archivo, el de su primer
+          registro (`record_start`), hasta dónde se procesó (`processed_until`), el contexto usado
+          por los modelos (`context_seconds`) y la duración de ventana. Se escribe al terminar cada
+          ejecución, de modo que una ejecución interrumpida se repite completa la siguiente vez.
+        - **Lectura parcial:** para saber si el archivo es el mismo solo se lee su primer registro
+          (`get_start_and_end_time`), y luego se leen únicamente los registros desde el inicio del
+          segmento, de modo que cada ejecución decodifica los datos nuevos y no el día completo.
+        - **Deduplicación:** solo se añaden picks con `peak_time >= processed_until` (y detecciones
+          con `start_time >= processed_until`); lo anterior ya está en los CSV.
+        - **Ventanas:** las ventanas siguen alineadas al inicio del archivo. La última ventana de la
+          ejecución anterior normalmente quedó incompleta, por lo que el segmento analizado empieza
+          en el inicio de esa ventana (menos el contexto) y la imagen se sobrescribe ya completa.
+          Así, con ventanas largas se vuelve a analizar como máximo una ventana de datos.
+    """
+    state_path = os.path.join(base_output_dir_for_file, INCREMENTAL_STATE_FILENAME)
+    state = load_incremental_state(state_path)
+
+    print(f"Procesando (incremental) {filepath}")
+    try:
+        # Inicio del primer registro: identifica el archivo sin leer el resto.
+        record_start = str(get_start_and_end_time(filepath)[0])
+    except Exception as e:
+        print(f"Error al leer {filepath}: {e}")
+        return None
+
+    context = model_context_seconds(pn_model, eqt_model, gpd_model)
+    new_state = {
+        'filepath': filepath,
+        'record_start': record_start,
+        'context_seconds': context,
+        'window_length_minutes': window_length_minutes
+    }
+
+    # Sin estado previo válido: procesamiento completo.
+    if state is None or state.get('record_start') != record_start or \
+       state.get('window_length_minutes') != window_length_minutes:
+        original_stream = load_mseed_file(filepath)
+        if original_stream is None:
+            return
+        new_state['file_start'] = str(original_stream[0].stats.starttime)
+        new_state['processed_until'] = str(original_stream[0].stats.endtime)
+        del original_stream
+        gc.collect()
+        days = process_file(filepath, pn_model, eqt_model, gpd_model, base_output_dir_for_file,
+                            window_length_minutes, chunk_cache=chunk_cache, summary=summary,
+                            render_plots=render_plots)
+        save_incremental_state(state_path, new_state)
+        return days
+
+    file_start = UTCDateTime(state['file_start'])
+    processed_until = UTCDateTime(state['processed_until'])
 
+    # Primera ventana a (re)generar: la que contiene `processed_until`, normalmente incompleta.
+    wlength = window_length_minutes * 60
+    first_window = int((processed_until - file_start) // wlength)
+    segment_start = max(file_start, min(processed_until, file_start + first_window * wlength) - context)
+
+    # Solo se leen los datos del segmento nuevo (más el contexto), no el día completo.
+    tail_stream = load_mseed_file(filepath, starttime=segment_start)
+    if tail_stream is None:
+        return
+    data_end = tail_stream[0].stats.endtime if tail_stream else processed_until
+    if data_end <= processed_until:
+        print(f"No hay datos nuevos en {filepath} desde {processed_until}")
+        return 0.0
+    new_state['file_start'] = state['file_start']
+    new_state['processed_until'] = str(data_end)
+    days = station_days(tail_stream)
+
+    results_img_folder = os.path.join(base_output_dir_for_file, "resultados_imagenes_filtrados")
+    results_folder = os.path.join(base_output_dir_for_file, "resultados_detecciones_filtrados")
+    comparison_folder = os.path.join(results_img_folder, "comparison")
+    os.makedirs(comparison_folder, exist_ok=True)
+    os.makedirs(results_folder, exist_ok=True)
+    basename = os.path.splitext(os.path.basename(filepath))[0]
+    if summary is not None:
+        summary.set_window_origin(basename, file_start)
+
+    print(f"Segmento incremental: {segment_start} - {data_end} (procesado hasta {processed_until})")
+
+    predictions_dict = {
+        "original": process_stream_with_models(
+            tail_stream, pn_model, eqt_model, gpd_model,
+            basename, results_folder, "original",
+            chunk_cache=chunk_cache, min_pick_time=processed_until, append=True, summary=summary,
+            annotate=render_plots
+        )
+    }
+
+    filtered_streams = {}
+    for filter_params in FILTERS:
+        filtered_stream = apply_filter(tail_stream, filter_params)
+        if not filtered_stream:
+            continue
+        predictions_dict[filter_params['type']] = process_stream_with_models(
+            filtered_stream, pn_model, eqt_model, gpd_model,
+            basename, results_folder, filter_params['type'],
+            chunk_cache=chunk_cache, min_pick_time=processed_until, append=True, summary=summary,
+            annotate=render_plots
+        )
+        filtered_streams[filter_params['type']] = filtered_stream
+        gc.collect()
 
-def create_summary_csv(mseed_files, results_base_dir):
+    if render_plots:
+        generate_individual_plots(tail_stream, filtered_streams, predictions_dict, basename, results_img_folder,
+                                  window_length_minutes, window_origin=file_start, first_window=first_window,
+                                  comparison_folder=comparison_folder)
+
+    del tail_stream, filtered_streams, predictions_dict
+    gc.collect()
+
+    save_incremental_state(state_path, new_state)
+    print(f"Procesamiento incremental de {basename} completado hasta {data_end}")
+    return days
+
+
+def create_summary_csv(mseed_files, results_base_dir, summary=None):
     """
     Crea un archivo CSV con un resumen de todos los resultados,
-    mostrando el número de picks por modelo y tipo de filtro.
-    Ahora busca los CSV dentro de las subcarpetas de cada archivo.
-    """
-    summary_file = os.path.join(results_base_dir, "summary_results.csv")
-
-    with open(summary_file, 'w', newline='') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        # Encabezados
-        csv_writer.writerow([
-            "filename", "filter_type",
-            "PhaseNet_P_picks", "PhaseNet_S_picks",
-            "EQT_P_picks", "EQT_S_picks",
-            "GPD_P_picks", "GPD_S_picks",
-            "EQT_detections"
-        ])
-
-        # Para cada archivo procesado
-        for filepath in mseed_files:
-            basename = os.path.splitext(os.path.basename(filepath))[0]
-            # La ruta de los resultados para este archivo específico
-            file_specific_results_folder = os.path.join(results_base_dir, basename, "resultados_detecciones_filtrados")
+    mostrando el número de picks por modelo y tipo de filtro, y otro con las
+    estadísticas de confianza (`peak_value`) por modelo y fase.
 
-            if not os.path.exists(file_specific_results_folder):
-                print(f"Advertencia: No se encontró la carpeta de resultados para {basename} en {file_specific_results_folder}")
-                continue
+    Args:
+        mseed_files (list): Rutas (o nombres) de los archivos MiniSEED del trabajo.
+        results_base_dir (str): Carpeta de resultados del trabajo.
+        summary (summary.SummaryAggregator, optional): Resumen acumulado durante el procesamiento.
+            Los archivos que no registró (o todos, si es None) se toman de su `file_summary.json`.
+
+    Returns:
+        str: Ruta del CSV de resumen.
+    """
+    if summary is None:
+        summary = SummaryAggregator(results_base_dir)
+    basenames = [os.path.splitext(os.path.basename(filepath))[0] for filepath in mseed_files]
+    for basename in basenames:
+        if not summary.has_file(basename):
+            summary.load_file(basename)
+    return summary.write(basenames)
+
+def stored_thresholds(output_base_dir):
+    """
+    Retorna los umbrales con los que se generaron los picks de un trabajo (los del primer archivo
+    con almacén de anotaciones), o None si el trabajo no tiene almacén.
+    """
+    if not os.path.isdir(output_base_dir):
+        return None
+    for name in sorted(os.listdir(output_base_dir)):
+        store = AnnotationStore(os.path.join(output_base_dir, name, ANNOTATION_STORE_FOLDER))
+        if store.exists():
+            return store.get_metadata("thresholds")
+    return None
+
+def merge_thresholds(base, overrides):
+    """
+    Combina los umbrales guardados con los indicados por el usuario, validándolos.
+
+    Args:
+        base (dict): Umbrales por modelo (ej., `{"GPD": {"P_threshold": 0.75, ...}, ...}`).
+        overrides (dict): Umbrales nuevos con la misma estructura; pueden ser parciales.
 
-            # Buscar todos los CSV de resultados para este archivo dentro de su subcarpeta
-            result_files = glob.glob(os.path.join(file_specific_results_folder, f"{basename}_*_*_picks.csv"))
-
-            # Extraer tipos de filtro únicos
-            filter_types = set()
-            for result_file in result_files:
-                parts = os.path.basename(result_file).split('_')
-                if len(parts) >= 3:
-                    # El tipo de filtro es el segundo elemento, e.g., "original", "0.5-2Hz"
-                    filter_types.add(parts[1])
-            filter_types = sorted(list(filter_types)) # Ordenar para consistencia
-
-            # Para cada tipo de filtro
-            for filter_type in filter_types:
-                pn_p_picks = pn_s_picks = eqt_p_picks = eqt_s_picks = gpd_p_picks = gpd_s_picks = eqt_detections = 0
-
-                # Contar picks PhaseNet
-                pn_file = os.path.join(file_specific_results_folder, f"{basename}_{filter_type}_PhaseNet_picks.csv")
-                if os.path.exists(pn_file):
-                    with open(pn_file, 'r') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            if row['phase'] == 'P':
-                                pn_p_picks += 1
-                            elif row['phase'] == 'S':
-                                pn_s_picks += 1
-
-                # Contar picks EQTransformer
-                eqt_file = os.path.join(file_specific_results_folder, f"{basename}_{filter_type}_EQTransformer_picks.csv")
-                if os.path.exists(eqt_file):
-                    with open(eqt_file, 'r') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            if row['phase'] == 'P':
-                                eqt_p_picks += 1
-                            elif row['phase'] == 'S':
-                                eqt_s_picks += 1
-
-                # Contar picks GPD
-                gpd_file = os.path.join(file_specific_results_folder, f"{basename}_{filter_type}_GPD_picks.csv")
-                if os.path.exists(gpd_file):
-                    with open(gpd_file, 'r') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            if row['phase'] == 'P':
-                                gpd_p_picks += 1
-                            elif row['phase'] == 'S':
-                                gpd_s_picks += 1
-
-                # Contar detecciones EQTransformer
-                det_file = os.path.join(file_specific_results_folder, f"{basename}_{filter_type}_EQTransformer_detections.csv")
-                if os.path.exists(det_file):
-                    with open(det_file, 'r') as f:
-                        reader = csv.DictReader(f)
-                        eqt_detections = sum(1 for _ in reader) # Cuenta el número de filas (detecciones)
-
-                # Escribir fila de resumen
-                csv_writer.writerow([
-                    basename, filter_type,
-                    pn_p_picks, pn_s_picks,
-                    eqt_p_picks, eqt_s_picks,
-                    gpd_p_picks, gpd_s_picks,
-                    eqt_detections
-                ])
-
-    print(f"Resumen de resultados guardado en: {summary_file}")
+    Returns:
+        dict: Umbrales resultantes por modelo.
+
+    Raises:
+        ValueError: Si aparece un modelo o umbral desconocido, o un valor fuera de (0, 1].
+    """
+    merged = {model_name: dict(base.get(model_name, {})) for model_name in MODEL_THRESHOLDS}
+    for model_name, values in (overrides or {}).items():
+        if model_name not in MODEL_THRESHOLDS:
+            raise ValueError(f"Modelo desconocido: {model_name}")
+        for key, value in values.items():
+            allowed = ("P_threshold", "S_threshold") + (("detection_threshold",) if model_name == "EQTransformer" else ())
+            if key not in allowed:
+                raise ValueError(f"Umbral desconocido para {model_name}: {key}")
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"El umbral {model_name}.{key} debe ser numérico")
+            if not 0 < value <= 1:
+                raise ValueError(f"El umbral {model_name}.{key} debe estar entre 0 y 1")
+            merged[model_name][key] = value
+    return merged
+
+def repick_file(base_output_dir_for_file, basename, thresholds=None, summary=None):
+    """
+    Recalcula los picks y detecciones de un archivo ya procesado a partir de las anotaciones
+    guardadas en su almacén, sin cargar el MSEED ni ejecutar los modelos, y reescribe sus CSV.
+
+    Args:
+        base_output_dir_for_file (str): Carpeta de resultados del archivo.
+        basename (str): Nombre base del archivo MiniSEED.
+        thresholds (dict, optional): Umbrales nuevos por modelo (pueden ser parciales); los que
+            no se indican se mantienen como en la ejecución anterior.
+        summary (summary.SummaryAggregator, optional): Resumen del trabajo que se actualiza con
+            los picks nuevos.
+
+    Returns:
+        dict: 'thresholds' (umbrales aplicados) y 'picks' (número de picks por banda y modelo).
+
+    Raises:
+        ValueError: Si el archivo no tiene almacén de anotaciones o los umbrales no son válidos.
+    """
+    store = AnnotationStore(os.path.join(base_output_dir_for_file, ANNOTATION_STORE_FOLDER))
+    if not store.exists():
+        raise ValueError(f"{basename} no tiene anotaciones guardadas; hay que procesarlo de nuevo")
+    effective = merge_thresholds(store.get_metadata("thresholds", {}), thresholds)
+
+    results_folder = os.path.join(base_output_dir_for_file, "resultados_detecciones_filtrados")
+    os.makedirs(results_folder, exist_ok=True)
+    counts = {}
+    for band in store.bands():
+        counts[band] = {}
+        band_picks = {}
+        band_detections = []
+        for model_name in MODEL_THRESHOLDS:
+            outputs = picks_from_thresholds(store.read(band, model_name), model_name, effective[model_name])
+
+            # Se eliminan los CSV anteriores en lugar de sobrescribirlos: pueden ser enlaces duros
+            # a una entrada de la caché de resultados, que no debe cambiar.
+            picks_csv = os.path.join(results_folder, f"{basename}_{band}_{model_name}_picks.csv")
+            if os.path.exists(picks_csv):
+                os.remove(picks_csv)
+            save_detailed_picks_to_csv(outputs.picks, model_name, basename, results_folder, band)
+            counts[band][model_name] = len(outputs.picks)
+            band_picks[model_name] = outputs.picks
+
+            if model_name == "EQTransformer":
+                detections_csv = os.path.join(results_folder, f"{basename}_{band}_EQTransformer_detections.csv")
+                if os.path.exists(detections_csv):
+                    os.remove(detections_csv)
+                if outputs.detections:
+                    save_eqt_detections_to_csv(outputs.detections, basename, results_folder, band)
+                counts[band]["EQTransformer_detections"] = len(outputs.detections)
+                band_detections = outputs.detections
+
+        if summary is not None:
+            summary.add_band(basename, band, band_picks, band_detections)
+
+    write_consensus(results_folder, basename)
+    store.set_metadata("thresholds", effective)
+    return {'thresholds': effective, 'picks': counts}
+
+def repick_results(output_base_dir, thresholds=None):
+    """
+    Aplica `repick_file` a todos los archivos de un trabajo y regenera el CSV de resumen.
+
+    Args:
+        output_base_dir (str): Carpeta de resultados del trabajo.
+        thresholds (dict, optional): Umbrales nuevos por modelo (ver `merge_thresholds`).
+
+    Returns:
+        dict: 'files' (resultado de `repick_file` por archivo), 'thresholds' y 'elapsed_seconds'.
+
+    Raises:
+        ValueError: Si ningún archivo del trabajo tiene anotaciones guardadas o los umbrales no son válidos.
+    """
+    start = time.time()
+    files = {}
+    summary = SummaryAggregator(output_base_dir)
+    for name in sorted(os.listdir(output_base_dir)):
+        file_dir = os.path.join(output_base_dir, name)
+        if os.path.isdir(os.path.join(file_dir, ANNOTATION_STORE_FOLDER)):
+            # Se parte del resumen guardado para conservar el origen de las ventanas del archivo.
+            summary.load_file(name)
+            files[name] = repick_file(file_dir, name, thresholds, summary=summary)
+    if not files:
+        raise ValueError("El trabajo no tiene anotaciones guardadas; hay que procesarlo de nuevo")
+
+    # `create_summary_csv` espera rutas de archivos MSEED; la extensión se descarta al obtener el nombre base.
+    create_summary_csv([f"{name}.mseed" for name in files], output_base_dir, summary)
+
+    # Los picks por ventana de los manifiestos de todos los conjuntos de imágenes cambian con los umbrales.
+    for image_set in [DEFAULT_IMAGE_SET] + list(load_image_sets(output_base_dir)):
+        manifest = ResultsManifest.load(output_base_dir, image_set)
+        if manifest is not None:
+            for name in files:
+                manifest.update_picks(name, summary)
+            manifest.save()
+    return {
+        'files': files,
+        'thresholds': next(iter(files.values()))['thresholds'],
+        'elapsed_seconds': time.time() - start
+    }
+
+# Registro de los conjuntos de imágenes de un trabajo (carpeta -> duración de ventana), en la carpeta del trabajo.
+IMAGE_SETS_FILENAME = "image_sets.json"
+# Carpeta de imágenes generada por `process_file` dentro de la carpeta de cada archivo.
+DEFAULT_IMAGE_SET = "resultados_imagenes_filtrados"
+
+def load_image_sets(output_base_dir):
+    """
+    Lee el registro de conjuntos de imágenes re-renderizadas de un trabajo.
+
+    Returns:
+        dict: Nombre de la carpeta del conjunto -> {'window_length_minutes', 'created'}. No incluye
+            el conjunto original (`DEFAULT_IMAGE_SET`).
+    """
+    path = os.path.join(output_base_dir, IMAGE_SETS_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Advertencia: registro de conjuntos de imágenes ilegible en {path}: {e}")
+        return {}
+
+def rerender_file(base_output_dir_for_file, basename, window_length_minutes, image_set):
+    """
+    Regenera los gráficos de un archivo ya procesado con otra duración de ventana, leyendo las formas
+    de onda y las anotaciones del almacén (sin cargar el MSEED, sin filtrar y sin ejecutar los modelos).
+
+    Args:
+        base_output_dir_for_file (str): Carpeta de resultados del archivo.
+        basename (str): Nombre base del archivo MiniSEED.
+        window_length_minutes (int): Nueva duración de las ventanas en minutos.
+        image_set (str): Nombre de la carpeta del nuevo conjunto de imágenes, hermana de
+            `resultados_imagenes_filtrados` y con la misma estructura.
+
+    Raises:
+        ValueError: Si el almacén no contiene las formas de onda y anotaciones necesarias.
+    """
+    store = AnnotationStore(os.path.join(base_output_dir_for_file, ANNOTATION_STORE_FOLDER))
+    if not store.entries("original", WAVEFORM_KIND):
+        raise ValueError(f"{basename} no tiene formas de onda guardadas; hay que procesarlo de nuevo")
+
+    # Los streams son vistas mapeadas en memoria: cada ventana solo lee sus propias muestras.
+    original_stream = store.read("original", WAVEFORM_KIND)
+    predictions_dict = {"original": store.read_band("original")}
+    filtered_streams = {}
+    for filter_params in FILTERS:
+        band = filter_params['type']
+        if store.entries(band, WAVEFORM_KIND):
+            filtered_streams[band] = store.read(band, WAVEFORM_KIND)
+            predictions_dict[band] = store.read_band(band)
+
+    results_img_folder = os.path.join(base_output_dir_for_file, image_set)
+    comparison_folder = os.path.join(results_img_folder, "comparison")
+    os.makedirs(comparison_folder, exist_ok=True)
+
+    generate_individual_plots(original_stream, filtered_streams, predictions_dict,
+                              basename, results_img_folder, window_length_minutes,
+                              comparison_folder=comparison_folder)
+
+    del original_stream, filtered_streams, predictions_dict
+    gc.collect()
+
+def rerender_results(output_base_dir, window_length_minutes, progress_callback=None):
+    """
+    Crea un nuevo conjunto versionado de imágenes para todos los archivos de un trabajo con la
+    duración de ventana indicada (ver `rerender_file`). Las imágenes existentes no se modifican.
+
+    Args:
+        output_base_dir (str): Carpeta de resultados del trabajo.
+        window_length_minutes (int): Nueva duración de las ventanas en minutos.
+        progress_callback (callable, optional): Función `(actual, total, mensaje)` de progreso.
+
+    Returns:
+        dict: 'image_set' (carpeta del nuevo conjunto), 'window_length_minutes' y 'files'
+            (número de archivos re-renderizados).
+
+    Raises:
+        ValueError: Si ningún archivo del trabajo tiene formas de onda guardadas.
+    """
+    file_names = sorted(
+        name for name in os.listdir(output_base_dir)
+        if os.path.isdir(os.path.join(output_base_dir, name, ANNOTATION_STORE_FOLDER))
+    )
+    if not file_names:
+        raise ValueError("El trabajo no tiene formas de onda ni anotaciones guardadas; hay que procesarlo de nuevo")
+
+    image_sets = load_image_sets(output_base_dir)
+    image_set = f"resultados_imagenes_{window_length_minutes}min_v{len(image_sets) + 2}"
+    summary = SummaryAggregator(output_base_dir)
+    manifest = ResultsManifest(output_base_dir, image_set, window_length_minutes)
+
+    for i, name in enumerate(file_names):
+        if progress_callback:
+            progress_callback(i, len(file_names), f"Generando gráficos de {name} ({window_length_minutes} min)")
+        rerender_file(os.path.join(output_base_dir, name), name, window_length_minutes, image_set)
+        summary.load_file(name)
+        manifest.add_file(name, summary)
+
+    # El conjunto se registra al final, cuando ya está completo.
+    image_sets[image_set] = {'window_length_minutes': window_length_minutes, 'created': time.time()}
+    path = os.path.join(output_base_dir, IMAGE_SETS_FILENAME)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(image_sets, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+    if progress_callback:
+        progress_callback(len(file_names), len(file_names), "Gráficos generados")
+    return {'image_set': image_set, 'window_length_minutes': window_length_minutes, 'files': len(file_names)}
+
+def lazy_window_plan(base_output_dir_for_file, window_length_minutes):
+    """
+    Imágenes que tendría un archivo procesado en modo diferido, a partir de su almacén.
+
+    Args:
+        base_output_dir_for_file (str): Carpeta de resultados del archivo.
+        window_length_minutes (int): Duración de las ventanas en minutos.
+
+    Returns:
+        tuple: (tipos de imagen, número de ventanas). Los tipos son "original", las bandas con
+            formas de onda guardadas y "comparison".
+
+    Raises:
+        ValueError: Si el almacén no contiene la forma de onda original.
+    """
+    store = AnnotationStore(os.path.join(base_output_dir_for_file, ANNOTATION_STORE_FOLDER))
+    if not store.entries("original", WAVEFORM_KIND):
+        raise ValueError(f"{base_output_dir_for_file} no tiene formas de onda guardadas")
+    # Mismas ventanas que `generate_individual_plots`: desde el inicio de la primera traza original.
+    first_trace = store.read("original", WAVEFORM_KIND)[0]
+    total_seconds = int(first_trace.stats.endtime - first_trace.stats.starttime)
+    window_count = len(range(0, total_seconds, window_length_minutes * 60))
+    bands = [f['type'] for f in FILTERS if store.entries(f['type'], WAVEFORM_KIND)]
+    return ["original"] + bands + ["comparison"], window_count
+
+def render_window_image(base_output_dir_for_file, basename, kind, window_index, window_length_minutes, output_path):
+    """
+    Dibuja una sola imagen de ventana (individual de una banda o comparativa) leyendo del almacén
+    únicamente las muestras de esa ventana. Es lo que sirve `/serve_image` en modo diferido.
+
+    Args:
+        base_output_dir_for_file (str): Carpeta de resultados del archivo.
+        basename (str): Nombre base del archivo MiniSEED.
+        kind (str): "original", un tipo de filtro o "comparison".
+        window_index (int): Índice de la ventana desde el inicio de la señal original.
+        window_length_minutes (int): Duración de las ventanas en minutos.
+        output_path (str): Ruta donde se escribe el PNG.
+
+    Raises:
+        ValueError: Si el almacén no tiene los datos de esa banda o la ventana está vacía.
+
+    Notas:
+        - A diferencia de `generate_individual_plots`, el índice de la ventana es siempre su posición
+          desde el inicio: una ventana sin datos (un hueco) no desplaza a las siguientes.
+    """
+    store = AnnotationStore(os.path.join(base_output_dir_for_file, ANNOTATION_STORE_FOLDER))
+    band = "original" if kind == "comparison" else kind
+    if not store.entries(band, WAVEFORM_KIND):
+        raise ValueError(f"{basename} no tiene formas de onda guardadas para {band}")
+
+    wlength = window_length_minutes * 60
+    t0 = store.read("original", WAVEFORM_KIND)[0].stats.starttime + window_index * wlength
+    t1 = t0 + wlength
+    color_dict = {"P": "C0", "S": "C1", "Detection": "C2"}
+
+    # El comparativo se compone con los paneles de todas las bandas, como al procesar el archivo.
+    comparison = kind == "comparison"
+    bands = ["original"] + [f['type'] for f in FILTERS] if comparison else [kind]
+    panels = []
+    for panel_band in bands:
+        if not store.entries(panel_band, WAVEFORM_KIND):
+            continue
+        stream = store.read(panel_band, WAVEFORM_KIND, t0, t1)
+        if len(stream) == 0:
+            continue
+        # Las predicciones leídas se ajustan a la ventana con las reglas de `stream.slice`, como al
+        # procesar el archivo.
+        bounds = {0: (t0.ns, t1.ns)}
+        predictions = {key: WindowIndex(preds, bounds).window(0)
+                       for key, preds in store.read_band(panel_band, t0, t1).items()}
+        trace_lines, model_lines = window_lines(trace_windows(stream), predictions, t0, t1, color_dict)
+        panels.append(individual_window_spec(None if comparison else output_path, t0, panel_band, wlength,
+                                             trace_lines, model_lines))
+    if not panels or panels[0]['title'] != band:
+        raise ValueError(f"La ventana {window_index} de {basename} ({kind}) no tiene datos")
+    spec = window_group_spec(panels, output_path) if comparison else panels[0]
+    render_window(spec)
 
 class SeismicProcessor:
     """
@@ -1449,7 +1898,8 @@ class SeismicProcessor:
     y generar visualizaciones, con un enfoque en la eficiencia de memoria.
     """
 
-    def __init__(self, dataset="stead"):
+    def __init__(self, dataset="stead", result_cache=None, chunk_cache=None, store_annotations=False,
+                 store_waveforms=False, lazy_render=False, render_policy="all", strip_dpi=None):
         """
         Inicializa la clase SeismicProcessor.
 
@@ -1457,7 +1907,42 @@ class SeismicProcessor:
             dataset (str, optional):
                 El nombre del dataset pre-entrenado a utilizar para cargar los modelos
                 de SeisBench (ej., "stead", "instance", "ethz"). Por defecto es "stead".
+            result_cache (result_cache.ResultCache, optional):
+                Caché de resultados por contenido. Si se proporciona, los archivos cuyo
+                contenido y configuración ya fueron procesados se sirven desde la caché
+                en lugar de volver a ejecutar el pipeline. Por defecto es None (sin caché).
+            chunk_cache (chunk_cache.ChunkInferenceCache, optional):
+                Caché de anotaciones por bloques de tiempo, para que trabajos con rangos
+                solapados solo ejecuten inferencia en los bloques nuevos. Por defecto es None.
+            store_annotations (bool, optional):
+                Si es True, las anotaciones de cada banda y modelo se guardan en un
+                `AnnotationStore` dentro de la carpeta de resultados de cada archivo
+                (carpeta `anotaciones/`). No se usa en modo incremental. Por defecto es False.
+            store_waveforms (bool, optional):
+                Si es True (y `store_annotations` también), el almacén incluye las formas de
+                onda original y filtradas. Por defecto es False.
+            lazy_render (bool, optional):
+                Si es True, no se generan los gráficos por ventana: el manifiesto los lista y
+                cada imagen se dibuja desde el almacén la primera vez que se pide (ver
+                `render_window_image`). Implica `store_annotations` y `store_waveforms`.
+                No se usa en modo incremental. Por defecto es False.
+            render_policy (str, optional):
+                Una de `RENDER_POLICIES`: "all" dibuja todas las ventanas y "detections" solo las
+                que tienen picks o detecciones (ver `process_file`). No se usa en modo incremental.
+                Por defecto es "all".
+            strip_dpi (int, optional):
+                Con la política "detections", resolución de las imágenes reducidas de las demás
+                ventanas (ej. `STRIP_DPI`); si es None se omiten. Por defecto es None.
         """
+        if render_policy not in RENDER_POLICIES:
+            raise ValueError(f"Política de dibujo desconocida: {render_policy}")
+        self.result_cache = result_cache # Caché de resultados por contenido (opcional)
+        self.chunk_cache = chunk_cache # Caché de anotaciones por bloques (opcional)
+        self.lazy_render = lazy_render # Gráficos bajo demanda en lugar de al procesar (opcional)
+        self.render_policy = render_policy # Ventanas que se dibujan ("all" o "detections")
+        self.strip_dpi = strip_dpi # Resolución de las ventanas sin detecciones (None: se omiten)
+        self.store_annotations = store_annotations or lazy_render # Guardar anotaciones en disco (opcional)
+        self.store_waveforms = store_waveforms or lazy_render # Incluir formas de onda en el almacén (opcional)
         self.pn_model = None  # Modelo PhaseNet
         self.eqt_model = None # Modelo EQTransformer
         self.gpd_model = None # Modelo GPD
@@ -1517,7 +2002,8 @@ class SeismicProcessor:
             self.current_loaded_dataset = None
             return False
 
-    def process_files(self, mseed_files, output_base_dir, window_length_minutes=2, progress_callback=None):
+    def process_files(self, mseed_files, output_base_dir, window_length_minutes=2, progress_callback=None,
+                      incremental=False, checkpoint=None, summary=None, picks_only=False):
         """
         Procesa una lista de archivos MiniSEED (`.mseed`) de manera secuencial.
         Para cada archivo, crea una subcarpeta dentro de `output_base_dir` para
@@ -1535,6 +2021,24 @@ class SeismicProcessor:
             window_length_minutes (int, optional):
                 La duración de la ventana de tiempo en minutos que se utilizará para
                 la generación de gráficos. Por defecto es 2 minutos.
+            incremental (bool, optional):
+                Si es True, cada archivo se procesa con `process_file_incremental`: solo se analizan
+                los datos añadidos desde la ejecución anterior sobre el mismo `output_base_dir`.
+                En este modo no se usa la caché de resultados. Por defecto es False.
+            checkpoint (checkpoint.JobCheckpoint, optional):
+                Checkpoint del trabajo. Los archivos ya terminados en una ejecución anterior se
+                omiten y el archivo interrumpido continúa desde su última banda completa.
+                No se usa en modo incremental. Por defecto es None.
+            summary (summary.SummaryAggregator, optional):
+                Resumen del trabajo, consultable mientras el procesamiento avanza. Si es None,
+                se crea uno interno. Por defecto es None.
+            picks_only (bool, optional):
+                Si es True, solo se cargan y filtran los archivos, se ejecutan los modelos y se
+                escriben los CSV de picks, detecciones y consenso: no se dibuja ningún gráfico ni
+                se construye la pirámide del explorador de señal. Si el procesador guarda las formas
+                de onda (`store_waveforms`), el manifiesto lista las imágenes como en modo diferido
+                y se dibujan al pedirlas; también se pueden generar con `rerender_results`.
+                Por defecto es False.
 
         Returns:
             dict: Un diccionario que resume la información del procesamiento:
@@ -1542,6 +2046,10 @@ class SeismicProcessor:
                   - 'processed_files': Número de archivos que se procesaron con éxito.
                   - 'base_output_directory': La ruta del directorio raíz donde se guardaron los resultados.
                   - 'summary_file': La ruta al archivo CSV que resume los resultados de todos los archivos procesados.
+                  - 'cached_files': Número de archivos servidos desde la caché de resultados.
+                  - 'station_days': Estaciones-día procesadas (sin contar las de la caché).
+                  - 'station_days_per_hour': Rendimiento del procesamiento en estaciones-día por
+                    hora, o None si no se procesó ningún archivo.
 
         Raises:
             Exception: Si los modelos de IA no han sido cargados previamente (`self.models_loaded` es False).
@@ -1552,6 +2060,27 @@ class SeismicProcessor:
 
         total_files = len(mseed_files)
         processed_files = [] # Lista para rastrear los archivos procesados exitosamente.
+        cached_files = 0 # Archivos servidos desde la caché de resultados.
+        if summary is None:
+            summary = SummaryAggregator(output_base_dir)
+        # Manifiesto para la página de resultados, actualizado al terminar cada archivo.
+        manifest = ResultsManifest(output_base_dir, DEFAULT_IMAGE_SET, window_length_minutes)
+        bands = ["original"] + [f['type'] for f in FILTERS]
+        # En modo solo picks con formas de onda guardadas los gráficos se dibujan al pedirlos, como
+        # en modo diferido.
+        lazy = (self.lazy_render or (picks_only and self.store_waveforms)) and not incremental
+        # Estaciones-día procesadas y segundos empleados, para el rendimiento del trabajo.
+        processed_days = 0.0
+        processing_seconds = 0.0
+
+        def add_to_manifest(basename):
+            # En modo diferido las imágenes aún no existen: se listan a partir del almacén.
+            if lazy:
+                kinds, window_count = lazy_window_plan(os.path.join(output_base_dir, basename),
+                                                       window_length_minutes)
+                manifest.add_lazy_file(basename, kinds, window_count, summary)
+            else:
+                manifest.add_file(basename, summary)
 
         # Itera sobre cada archivo en la lista.
         for i, filepath in enumerate(mseed_files):
@@ -1561,34 +2090,119 @@ class SeismicProcessor:
             file_output_dir = os.path.join(output_base_dir, basename)
             os.makedirs(file_output_dir, exist_ok=True)
 
+            # Archivo ya terminado antes de un reinicio del trabajo.
+            if checkpoint is not None and checkpoint.is_file_done(basename):
+                print(f"{basename} ya procesado según el checkpoint, se omite")
+                summary.load_file(basename)
+                add_to_manifest(basename)
+                processed_files.append(filepath)
+                continue
+
             try:
+                # Si hay caché de resultados, intenta servir el archivo desde ella.
+                cache_key = None
+                if self.result_cache is not None and not incremental:
+                    options = {'annotations': self.store_annotations, 'waveforms': self.store_waveforms}
+                    if self.chunk_cache is not None:
+                        # Los picks salen de anotaciones por bloques: no equivalen a los de `classify()`.
+                        options['chunk_inference'] = True
+                    if lazy:
+                        # Sin imágenes: no puede servir ni reemplazar a una entrada con gráficos.
+                        options['lazy_render'] = True
+                    elif picks_only:
+                        options['picks_only'] = True
+                    elif self.render_policy != "all":
+                        options['render_policy'] = self.render_policy
+                        options['strip_dpi'] = self.strip_dpi
+                    cache_key = self.result_cache.make_key(
+                        filepath, self.dataset, window_length_minutes, FILTERS, MODEL_THRESHOLDS,
+                        options=options
+                    )
+                    if self.result_cache.restore(cache_key, file_output_dir):
+                        print(f"Resultados de {basename} recuperados de la caché")
+                        if progress_callback:
+                            progress_callback(i, total_files, f"{os.path.basename(filepath)} recuperado de la caché")
+                        summary.load_file(basename)
+                        add_to_manifest(basename)
+                        processed_files.append(filepath)
+                        cached_files += 1
+                        if checkpoint is not None:
+                            checkpoint.mark_file_done(basename)
+                        continue
+
+                # Un archivo reanudado o incremental parte de lo que ya registró; uno nuevo, de cero.
+                resumed = checkpoint is not None and any(checkpoint.is_stage_done(basename, f"band:{band}")
+                                                         for band in bands)
+                if incremental or resumed:
+                    summary.load_file(basename)
+                else:
+                    summary.reset_file(basename)
+
                 # Llama al callback de progreso si está definido.
                 if progress_callback:
                     progress_callback(i, total_files, f"Procesando {os.path.basename(filepath)}")
 
                 # Delega el procesamiento del archivo individual a `process_single_file`.
-                self.process_single_file(
+                file_start = time.time()
+                days = self.process_single_file(
                     filepath,
                     file_output_dir, # Pasa la ruta de salida específica para este archivo.
-                    window_length_minutes=window_length_minutes
+                    window_length_minutes=window_length_minutes,
+                    incremental=incremental,
+                    checkpoint=None if incremental else checkpoint,
+                    summary=summary,
+                    picks_only=picks_only
                 )
+                # Archivo ilegible: no cuenta como procesado, no se marca en el checkpoint (se
+                # reintenta al reanudar) ni se guarda su carpeta vacía en la caché.
+                if days is None:
+                    print(f"No se pudo cargar {filepath}, se omite")
+                    continue
+
+                # Picks de consenso entre modelos y bandas, antes de guardar el archivo en la caché.
+                write_consensus(os.path.join(file_output_dir, "resultados_detecciones_filtrados"), basename)
+                # Pirámide de mínimos y máximos del almacén para el explorador de señal (también en la caché).
+                # En modo solo picks se construye la primera vez que se abre el explorador.
+                if self.store_annotations and not incremental and not picks_only:
+                    ensure_pyramid(os.path.join(file_output_dir, ANNOTATION_STORE_FOLDER))
+                processed_days += days
+                processing_seconds += time.time() - file_start
 
                 processed_files.append(filepath) # Añade el archivo a la lista de procesados.
+                add_to_manifest(basename)
+                if checkpoint is not None:
+                    checkpoint.mark_file_done(basename)
+
+                # Guarda los resultados recién generados en la caché para futuros trabajos.
+                if cache_key is not None:
+                    self.result_cache.store(cache_key, file_output_dir)
 
             except Exception as e:
                 print(f"Error procesando {filepath}: {e}")
                 # Continúa con el siguiente archivo si ocurre un error en uno.
                 continue
 
+        # Rendimiento del trabajo: estaciones-día analizadas por hora de procesamiento.
+        days_per_hour = None
+        if processing_seconds > 0:
+            days_per_hour = processed_days / (processing_seconds / 3600)
+            print(f"Rendimiento: {processed_days:.2f} estaciones-día en {processing_seconds:.1f} s "
+                  f"({days_per_hour:.1f} estaciones-día/hora{', solo picks' if picks_only else ''})")
+
         # Genera un archivo CSV de resumen que consolida la información de todos los archivos procesados.
         if processed_files:
-            # `create_summary_csv` necesita el directorio base general para buscar los archivos de picks.
-            create_summary_csv(processed_files, output_base_dir)
+            # El resumen se escribe desde lo acumulado en memoria, sin volver a leer los CSV.
+            create_summary_csv(processed_files, output_base_dir, summary)
 
         # Llama al callback de progreso para indicar que el procesamiento ha finalizado.
         if progress_callback:
             progress_callback(total_files, total_files, "Procesamiento completado")
 
+        # Si todos los archivos terminaron, las predicciones intermedias del checkpoint ya no se necesitan;
+        # si alguno falló, se conservan para que un reintento continúe desde su última banda completa.
+        if checkpoint is not None and len(processed_files) == total_files:
+            checkpoint.finish()
+
         # Forzar la recolección de basura después de que todo el batch se procesa para liberar memoria.
         gc.collect()
 
@@ -1596,10 +2210,14 @@ class SeismicProcessor:
             'total_files': total_files,
             'processed_files': len(processed_files),
             'base_output_directory': output_base_dir, # El directorio raíz de los resultados.
-            'summary_file': os.path.join(output_base_dir, "summary_results.csv") # Ruta al archivo resumen.
+            'summary_file': os.path.join(output_base_dir, "summary_results.csv"), # Ruta al archivo resumen.
+            'cached_files': cached_files, # Archivos servidos desde la caché de resultados.
+            'station_days': processed_days, # Estaciones-día procesadas (sin la caché).
+            'station_days_per_hour': days_per_hour # Rendimiento del procesamiento.
         }
 
-    def process_single_file(self, filepath, base_output_dir_for_file, window_length_minutes=2):
+    def process_single_file(self, filepath, base_output_dir_for_file, window_length_minutes=2, incremental=False,
+                            checkpoint=None, summary=None, picks_only=False):
         """
         Esta es una función auxiliar que envuelve la función global `process_file`.
         Su propósito principal es pasar los modelos de IA cargados por la clase
@@ -1615,16 +2233,47 @@ class SeismicProcessor:
             window_length_minutes (int, optional):
                 La duración de la ventana en minutos para la generación de gráficos.
                 Por defecto es 2 minutos.
+            incremental (bool, optional):
+                Si es True, usa `process_file_incremental` en lugar de `process_file`.
+            checkpoint (checkpoint.JobCheckpoint, optional):
+                Checkpoint del trabajo, solo para `process_file`.
+            summary (summary.SummaryAggregator, optional):
+                Resumen del trabajo al que se añaden los picks del archivo.
+            picks_only (bool, optional):
+                Si es True no se generan gráficos (ver `process_files`).
+
+        Returns:
+            float: Estaciones-día procesadas, o None si el archivo no se pudo cargar.
         """
-        # Llama a la función global `process_file` con todos los parámetros necesarios.
-        process_file(
-            filepath,
+        # Llama a la función global `process_file` (o a su variante incremental) con todos los parámetros necesarios.
+        models = (
             self.pn_model,      # Modelo PhaseNet cargado por la clase
             self.eqt_model,     # Modelo EQTransformer cargado por la clase
-            self.gpd_model,     # Modelo GPD cargado por la clase
-            base_output_dir_for_file, # Directorio de salida específico para este archivo
-            window_length_minutes
+            self.gpd_model      # Modelo GPD cargado por la clase
         )
+        if incremental:
+            return process_file_incremental(filepath, *models, base_output_dir_for_file, window_length_minutes,
+                                            chunk_cache=self.chunk_cache, summary=summary,
+                                            render_plots=not picks_only)
+        else:
+            annotation_store = None
+            if self.store_annotations:
+                annotation_store = AnnotationStore(
+                    os.path.join(base_output_dir_for_file, ANNOTATION_STORE_FOLDER),
+                    waveforms=self.store_waveforms
+                )
+            return process_file(
+                filepath, *models,
+                base_output_dir_for_file, # Directorio de salida específico para este archivo
+                window_length_minutes,
+                chunk_cache=self.chunk_cache, # Caché de anotaciones por bloques (puede ser None)
+                checkpoint=checkpoint, # Checkpoint del trabajo (puede ser None)
+                annotation_store=annotation_store, # Almacén de anotaciones (puede ser None)
+                summary=summary, # Resumen del trabajo (puede ser None)
+                render_plots=not (self.lazy_render or picks_only), # En modo diferido se dibujan bajo demanda
+                render_policy=self.render_policy, # Ventanas que se dibujan
+                strip_dpi=self.strip_dpi # Resolución de las ventanas sin detecciones
+            )
 
     def get_image_paths(self, base_output_dir_for_file, basename):
         """
@@ -1685,6 +2334,205 @@ class SeismicProcessor:
 
         return image_paths
 
+def resample_for_models(stream, models):
+    """
+    Remuestrea una sola vez un stream a la frecuencia de los modelos, para que varios modelos
+    (o los mismos modelos de varios datasets) no repitan el remuestreo que `annotate`/`classify`
+    hacen sobre su propia copia del stream.
+
+    Solo se hace si todos los modelos comparten frecuencia de muestreo y ninguno filtra el stream
+    antes de remuestrear; se usa el mismo remuestreo de SeisBench, así que los resultados no cambian.
+
+    Args:
+        stream (obspy.core.stream.Stream): Stream a remuestrear (no se modifica).
+        models (list): Modelos de SeisBench que recibirán el stream.
+
+    Returns:
+        obspy.core.stream.Stream: Copia remuestreada, o el mismo stream si no hace falta o no se puede compartir.
+    """
+    rates = {getattr(model, 'sampling_rate', None) for model in models}
+    if len(rates) != 1 or None in rates or any(getattr(model, 'filter_args', None) for model in models):
+        return stream
+    rate = rates.pop()
+    if all(tr.stats.sampling_rate == rate for tr in stream):
+        return stream
+    resampled = stream.copy()
+    sbm.WaveformModel.resample(resampled, rate, zerophase=True)
+    return resampled
+
+def process_file_datasets(filepath, models_by_dataset, output_base_dir, window_length_minutes, summaries):
+    """
+    Procesa un archivo MiniSEED con los modelos de varios datasets compartiendo la carga, el filtrado
+    y el remuestreo: el archivo se lee una vez, cada banda se filtra y remuestrea una vez y sobre ese
+    stream se ejecutan los modelos de cada dataset. Solo se grafica el primer dataset, así que cada
+    dataset adicional cuesta solo su inferencia (`classify`, sin `annotate`).
+
+    Args:
+        filepath (str): Ruta al archivo MiniSEED.
+        models_by_dataset (dict): Dataset -> (pn_model, eqt_model, gpd_model). El primero es el
+            dataset principal, el único que se grafica.
+        output_base_dir (str): Carpeta del trabajo. Los resultados de cada dataset se guardan en
+            `<output_base_dir>/<dataset>/<basename>/`, con la misma estructura que `process_file`.
+        window_length_minutes (int): Duración de las ventanas de los gráficos en minutos.
+        summaries (dict): Dataset -> `SummaryAggregator` del dataset.
+
+    Returns:
+        bool: False si no se pudo cargar el archivo.
+    """
+    print(f"Procesando {filepath} con los datasets {', '.join(models_by_dataset)}")
+    original_stream = load_mseed_file(filepath)
+    if original_stream is None:
+        return False
+
+    basename = os.path.splitext(os.path.basename(filepath))[0]
+    datasets = list(models_by_dataset)
+    primary = datasets[0]
+    all_models = [model for models in models_by_dataset.values() for model in models]
+
+    results_folders = {}
+    for dataset in datasets:
+        results_folders[dataset] = os.path.join(output_base_dir, dataset, basename, "resultados_detecciones_filtrados")
+        os.makedirs(results_folders[dataset], exist_ok=True)
+        summaries[dataset].set_window_origin(basename, original_stream[0].stats.starttime)
+
+    predictions_dict = {}
+    filtered_streams = {}
+    for filter_type, filter_params in [("original", None)] + [(f['type'], f) for f in FILTERS]:
+        if filter_params is None:
+            stream = original_stream
+        else:
+            stream = apply_filter(original_stream, filter_params)
+            if not stream:
+                continue
+            filtered_streams[filter_type] = stream
+
+        # Una sola copia remuestreada de la banda para todos los modelos de todos los datasets.
+        model_stream = resample_for_models(stream, all_models)
+        for dataset in datasets:
+            print(f"Dataset {dataset}:")
+            predictions = process_stream_with_models(
+                model_stream, *models_by_dataset[dataset], basename, results_folders[dataset], filter_type,
+                summary=summaries[dataset], annotate=dataset == primary
+            )
+            if dataset == primary:
+                predictions_dict[filter_type] = predictions
+        del model_stream
+        gc.collect()
+
+    # Gráficos del dataset principal, con la misma estructura que `process_file`.
+    results_img_folder = os.path.join(output_base_dir, primary, basename, DEFAULT_IMAGE_SET)
+    comparison_folder = os.path.join(results_img_folder, "comparison")
+    os.makedirs(comparison_folder, exist_ok=True)
+    generate_individual_plots(original_stream, filtered_streams, predictions_dict,
+                              basename, results_img_folder, window_length_minutes,
+                              comparison_folder=comparison_folder)
+
+    del original_stream, filtered_streams, predictions_dict
+    gc.collect()
+    print(f"Procesamiento de {basename} con {len(datasets)} datasets completado")
+    return True
+
+def compare_datasets(mseed_files, datasets, output_base_dir, window_length_minutes=2, progress_callback=None,
+                     checkpoint=None, summary=None):
+    """
+    Trabajo de comparación de datasets: procesa los archivos con los modelos preentrenados en
+    cada dataset (ver `process_file_datasets`) y escribe el resumen de cada dataset y una
+    comparación lado a lado (`dataset_comparison.csv`).
+
+    Args:
+        mseed_files (list): Rutas de los archivos MiniSEED.
+        datasets (list): Datasets a comparar (al menos dos); el primero es el principal y es el
+            único que se grafica.
+        output_base_dir (str): Carpeta del trabajo. Cada dataset tiene su subcarpeta con la
+            estructura de un trabajo normal (`<output_base_dir>/<dataset>/<basename>/...`).
+        window_length_minutes (int, optional): Duración de las ventanas en minutos. Por defecto 2.
+        progress_callback (callable, optional): Función `(actual, total, mensaje)` de progreso.
+        checkpoint (checkpoint.JobCheckpoint, optional): Checkpoint del trabajo. Los archivos ya
+            terminados se omiten (su resumen se lee de disco) y cada archivo completo se marca.
+        summary (summary.SummaryAggregator, optional): Resumen del dataset principal (sobre
+            `<output_base_dir>/<dataset principal>`), para consultarlo mientras se procesa. Si es
+            None se crea uno.
+
+    Returns:
+        dict: Igual que `SeismicProcessor.process_files` (con la carpeta del dataset principal como
+            'base_output_directory'), más 'datasets', 'dataset_folders' y 'comparison_file'.
+
+    Raises:
+        ValueError: Si hay menos de dos datasets distintos o no se pueden cargar los modelos de alguno.
+    """
+    datasets = list(dict.fromkeys(datasets))
+    if len(datasets) < 2:
+        raise ValueError("La comparación necesita al menos dos datasets distintos")
+
+    models_by_dataset = {}
+    for dataset in datasets:
+        dataset_processor = SeismicProcessor(dataset=dataset)
+        if not dataset_processor.load_models():
+            raise ValueError(f"No se pudieron cargar los modelos con el dataset: {dataset}")
+        models_by_dataset[dataset] = (dataset_processor.pn_model, dataset_processor.eqt_model,
+                                      dataset_processor.gpd_model)
+
+    dataset_folders = {dataset: os.path.join(output_base_dir, dataset) for dataset in datasets}
+    summaries = {dataset: SummaryAggregator(folder) for dataset, folder in dataset_folders.items()}
+    primary = datasets[0]
+    if summary is not None:
+        summaries[primary] = summary
+    manifest = ResultsManifest(dataset_folders[primary], DEFAULT_IMAGE_SET, window_length_minutes)
+
+    total_files = len(mseed_files)
+    processed_files = []
+    for i, filepath in enumerate(mseed_files):
+        basename = os.path.splitext(os.path.basename(filepath))[0]
+
+        # Archivo ya terminado antes de un reinicio del trabajo.
+        if checkpoint is not None and checkpoint.is_file_done(basename):
+            print(f"{basename} ya procesado según el checkpoint, se omite")
+            for dataset_summary in summaries.values():
+                dataset_summary.load_file(basename)
+            manifest.add_file(basename, summaries[primary])
+            processed_files.append(filepath)
+            continue
+
+        if progress_callback:
+            progress_callback(i, total_files, f"Procesando {os.path.basename(filepath)} ({len(datasets)} datasets)")
+        try:
+            for dataset_summary in summaries.values():
+                dataset_summary.reset_file(basename)
+            if process_file_datasets(filepath, models_by_dataset, output_base_dir, window_length_minutes, summaries):
+                for dataset, folder in dataset_folders.items():
+                    write_consensus(os.path.join(folder, basename, "resultados_detecciones_filtrados"), basename)
+                processed_files.append(filepath)
+                manifest.add_file(basename, summaries[primary])
+                if checkpoint is not None:
+                    checkpoint.mark_file_done(basename)
+        except Exception as e:
+            print(f"Error procesando {filepath}: {e}")
+            continue
+
+    comparison_file = os.path.join(output_base_dir, DATASET_COMPARISON_FILENAME)
+    if processed_files:
+        for dataset in datasets:
+            create_summary_csv(processed_files, dataset_folders[dataset], summaries[dataset])
+        basenames = [os.path.splitext(os.path.basename(f))[0] for f in processed_files]
+        write_dataset_comparison(summaries, basenames, comparison_file)
+
+    if progress_callback:
+        progress_callback(total_files, total_files, "Procesamiento completado")
+    if checkpoint is not None and len(processed_files) == total_files:
+        checkpoint.finish()
+    gc.collect()
+
+    return {
+        'total_files': total_files,
+        'processed_files': len(processed_files),
+        'base_output_directory': dataset_folders[primary],
+        'summary_file': os.path.join(dataset_folders[primary], "summary_results.csv"),
+        'cached_files': 0,
+        'datasets': datasets,
+        'dataset_folders': dataset_folders,
+        'comparison_file': comparison_file
+    }
+
 # Mantener compatibilidad con el script original
 def main():
     """
@@ -1702,18 +2550,62 @@ def main():
     6. Manejar posibles errores durante el procesamiento.
 
     Args:
-        None: Esta función no acepta argumentos directamente.
+        None: Esta función no acepta argumentos directamente. Las opciones se leen de la línea
+              de comandos:
+              - `--incremental`: procesa solo los datos añadidos desde la ejecución anterior
+                (pensado para re-ejecutarse periódicamente sobre el archivo del día en curso).
+              - `--table-formats`: formatos adicionales de las tablas de picks (parquet, arrow).
+              - `--datasets`: datasets de preentrenamiento; con más de uno se ejecuta `compare_datasets`.
+              - `--render-policy`: "all" o "detections" (solo las ventanas con picks o detecciones).
+              - `--strips`: con "detections", dibuja las demás ventanas a `STRIP_DPI`.
+              - `--picks-only`: solo carga, filtrado, inferencia y CSV, sin gráficos; al terminar
+                se imprime el rendimiento en estaciones-día por hora.
+              - `--store`: guarda las formas de onda y anotaciones de cada archivo para poder
+                dibujar los gráficos después (`rerender_results`).
 
     Returns:
         None: La función no retorna ningún valor, pero imprime mensajes de progreso
               y resultados en la consola, y guarda archivos de salida en el sistema de archivos.
     """
-    # Inicializa una instancia de SeismicProcessor con el dataset "stead" por defecto.
+    parser = argparse.ArgumentParser(description="Detección de fases sísmicas sobre archivos MiniSEED")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Procesa solo los datos nuevos de archivos que crecen (archivo del día en curso)")
+    parser.add_argument("--table-formats", default="csv",
+                        help="Formatos de las tablas de picks, separados por comas: csv, parquet, arrow "
+                             "(los dos últimos requieren pyarrow; el CSV se escribe siempre)")
+    parser.add_argument("--datasets", default="stead",
+                        help="Datasets de preentrenamiento separados por comas; con más de uno se compara "
+                             "sus resultados sobre los mismos archivos (ej. stead,instance)")
+    parser.add_argument("--render-policy", choices=RENDER_POLICIES, default="all",
+                        help="Ventanas que se dibujan: todas o solo las que tienen picks o detecciones")
+    parser.add_argument("--strips", action="store_true",
+                        help=f"Con --render-policy detections, dibuja las demás ventanas a {STRIP_DPI} dpi")
+    parser.add_argument("--picks-only", action="store_true",
+                        help="Solo picks y detecciones (CSV): no dibuja gráficos")
+    parser.add_argument("--store", action="store_true",
+                        help="Guarda formas de onda y anotaciones para dibujar los gráficos más tarde")
+    args = parser.parse_args()
+    datasets = [d.strip() for d in args.datasets.split(",") if d.strip()]
+    if len(datasets) > 1 and args.incremental:
+        parser.error("--incremental no se puede combinar con varios datasets")
+    if len(datasets) > 1 and args.picks_only:
+        parser.error("--picks-only no se puede combinar con varios datasets")
+
+    formats = [f.strip() for f in args.table_formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in pick_table.TABLE_FORMATS]
+    if unknown:
+        parser.error(f"Formato de tabla desconocido: {', '.join(unknown)}")
+    PICK_TABLE_FORMATS[:] = ["csv"] + [f for f in formats if f != "csv"]
+
+    # Inicializa una instancia de SeismicProcessor con el dataset indicado ("stead" por defecto).
     # Esta instancia será responsable de cargar los modelos de IA y gestionar el procesamiento.
-    processor = SeismicProcessor(dataset="stead")
+    processor = SeismicProcessor(dataset=datasets[0], render_policy=args.render_policy,
+                                 strip_dpi=STRIP_DPI if args.strips else None,
+                                 store_annotations=args.store, store_waveforms=args.store)
 
     # Intenta cargar los modelos de SeisBench. Si la carga falla, el script termina.
-    if not processor.load_models():
+    # (En la comparación de datasets, `compare_datasets` carga los modelos de cada uno.)
+    if len(datasets) == 1 and not processor.load_models():
         print("No se pudieron cargar los modelos. Saliendo.")
         return
 
@@ -1755,7 +2647,11 @@ def main():
     try:
         # Pasa `unique_output_dir` como el directorio base donde `process_files`
         # creará subcarpetas para cada archivo.
-        results = processor.process_files(mseed_files, unique_output_dir, window_length_minutes=2)
+        if len(datasets) > 1:
+            results = compare_datasets(mseed_files, datasets, unique_output_dir, window_length_minutes=2)
+        else:
+            results = processor.process_files(mseed_files, unique_output_dir, window_length_minutes=2,
+                                              incremental=args.incremental, picks_only=args.picks_only)
         print(f"Procesamiento completado. Resumen de resultados: {results}")
     except Exception as e:
         print(f"Error fatal durante el procesamiento: {e}")
@@ -324,6 +324,214 @@ class DownloadManager {
     }
 }
 
+// Explorador de señal: dibuja en un canvas los mínimos y máximos que devuelve `/waveform` para la
+// vista actual. Cada zoom o desplazamiento pide solo tantos puntos como píxeles tiene el canvas; el
+// servidor elige el nivel de la pirámide, así que acercarse a un pick o ver el día completo cuesta lo mismo.
+class WaveformViewer {
+    constructor(canvas, indexUrl, statusElement = null) {
+        this.canvas = canvas;
+        this.ctx = canvas.getContext('2d');
+        this.indexUrl = indexUrl;  // URL del índice con '__FILE__' en lugar del archivo
+        this.statusElement = statusElement;
+        this.index = null;
+        this.file = null;
+        this.band = null;
+        this.kind = null;
+        this.traces = [];
+        this.recordStart = 0;  // segundos desde la época
+        this.recordEnd = 0;
+        this.viewStart = 0;
+        this.viewEnd = 0;
+        this.controller = null;
+        this.fetchTimer = null;
+        this.drag = null;
+
+        this.axisHeight = 24;
+        this.minSpanSeconds = 0.5;
+        this.fetchDelay = 80;  // ms sin interacción antes de pedir los datos de la vista
+
+        canvas.addEventListener('wheel', e => {
+            e.preventDefault();
+            const rect = canvas.getBoundingClientRect();
+            this.zoom(e.deltaY > 0 ? 1.25 : 0.8, (e.clientX - rect.left) / rect.width);
+        }, { passive: false });
+        canvas.addEventListener('mousedown', e => {
+            this.drag = { x: e.clientX, start: this.viewStart, end: this.viewEnd };
+        });
+        window.addEventListener('mousemove', e => {
+            if (!this.drag) return;
+            const shift = (this.drag.x - e.clientX) / canvas.getBoundingClientRect().width * (this.drag.end - this.drag.start);
+            this.setView(this.drag.start + shift, this.drag.end + shift);
+        });
+        window.addEventListener('mouseup', () => { this.drag = null; });
+        canvas.addEventListener('dblclick', () => this.reset());
+        window.addEventListener('resize', () => {
+            this.resize();
+            this.scheduleFetch();
+        });
+        this.resize();
+    }
+
+    async loadFile(file) {
+        const response = await fetch(this.indexUrl.replace('__FILE__', encodeURIComponent(file)));
+        const index = await response.json();
+        if (!response.ok) throw new Error(index.error || 'No se pudo leer el índice de formas de onda');
+        this.index = index;
+        this.file = file;
+        this.recordStart = Date.parse(index.start) / 1000;
+        this.recordEnd = Date.parse(index.end) / 1000;
+        this.traces = [];
+        this.viewStart = this.recordStart;
+        this.viewEnd = this.recordEnd;
+        return index;
+    }
+
+    show(band, kind) {
+        this.band = band;
+        this.kind = kind;
+        this.traces = [];
+        this.draw();
+        this.scheduleFetch(0);
+    }
+
+    reset() {
+        this.setView(this.recordStart, this.recordEnd);
+    }
+
+    // Acerca (factor < 1) o aleja (factor > 1) la vista manteniendo fijo el punto `anchor` (0 a 1)
+    zoom(factor, anchor = 0.5) {
+        const span = this.viewEnd - this.viewStart;
+        const center = this.viewStart + anchor * span;
+        const newSpan = Math.max(this.minSpanSeconds, span * factor);
+        this.setView(center - anchor * newSpan, center - anchor * newSpan + newSpan);
+    }
+
+    setView(start, end) {
+        const recordSpan = this.recordEnd - this.recordStart;
+        const span = Math.min(end - start, recordSpan);
+        start = Math.min(Math.max(start, this.recordStart), this.recordEnd - span);
+        this.viewStart = start;
+        this.viewEnd = start + span;
+        // Mientras llegan los datos se redibujan los ya recibidos con la nueva escala
+        this.draw();
+        this.scheduleFetch();
+    }
+
+    resize() {
+        const ratio = window.devicePixelRatio || 1;
+        this.canvas.width = Math.max(1, Math.round(this.canvas.clientWidth * ratio));
+        this.canvas.height = Math.max(1, Math.round(this.canvas.clientHeight * ratio));
+        this.draw();
+    }
+
+    scheduleFetch(delay = this.fetchDelay) {
+        clearTimeout(this.fetchTimer);
+        this.fetchTimer = setTimeout(() => this.fetchView(), delay);
+    }
+
+    async fetchView() {
+        if (!this.file || !this.band || !this.kind) return;
+        // Una respuesta que ya no corresponde a la vista se cancela
+        if (this.controller) this.controller.abort();
+        this.controller = new AbortController();
+        const params = new URLSearchParams({
+            start: new Date(this.viewStart * 1000).toISOString(),
+            end: new Date(this.viewEnd * 1000).toISOString(),
+            points: Math.min(this.canvas.width, this.index.max_points)
+        });
+        const url = this.indexUrl.replace('__FILE__', encodeURIComponent(this.file)) +
+            `/${encodeURIComponent(this.band)}/${encodeURIComponent(this.kind)}?${params}`;
+        try {
+            const response = await fetch(url, { signal: this.controller.signal });
+            if (!response.ok) throw new Error('Error al leer las formas de onda');
+            const layout = JSON.parse(response.headers.get('X-Waveform-Layout'));
+            const buffer = await response.arrayBuffer();
+            const values = new Float32Array(buffer);
+            let offset = 0;
+            this.traces = layout.map(trace => {
+                const data = values.subarray(offset, offset + 2 * trace.bins);
+                offset += 2 * trace.bins;
+                return { ...trace, data };
+            });
+            if (this.statusElement) {
+                const levels = [...new Set(layout.map(trace => trace.level))].join(', ');
+                this.statusElement.textContent =
+                    `Nivel ${levels} · ${(buffer.byteLength / 1024).toFixed(1)} KB`;
+            }
+            this.draw();
+        } catch (error) {
+            if (error.name !== 'AbortError') ErrorHandler.handle(error, 'explorador de señal');
+        }
+    }
+
+    draw() {
+        const { ctx, canvas } = this;
+        const ratio = window.devicePixelRatio || 1;
+        const width = canvas.width;
+        const plotHeight = canvas.height - this.axisHeight * ratio;
+        ctx.clearRect(0, 0, width, canvas.height);
+        const span = this.viewEnd - this.viewStart;
+        if (!this.traces.length || span <= 0) return;
+
+        const laneHeight = plotHeight / this.traces.length;
+        const colors = ['#000000', '#dc3545', '#0d6efd'];
+        ctx.lineWidth = ratio;
+        ctx.font = `${11 * ratio}px sans-serif`;
+        this.traces.forEach((trace, lane) => {
+            const top = lane * laneHeight;
+            // Probabilidades entre 0 y 1; formas de onda con el máximo absoluto de lo visible
+            let low = 0;
+            let high = 1;
+            if (this.kind === 'waveform') {
+                let peak = 0;
+                for (let i = 0; i < trace.data.length; i++) {
+                    peak = Math.max(peak, Math.abs(trace.data[i]));
+                }
+                low = -(peak || 1);
+                high = peak || 1;
+            }
+            const scale = laneHeight * 0.9 / (high - low);
+            const y = value => top + laneHeight * 0.05 + (high - value) * scale;
+            // Cada caja es un segmento vertical de su mínimo a su máximo, en el centro de la caja
+            const center = trace.level > 0 ? 0.5 : 0;
+            ctx.strokeStyle = colors[lane % colors.length];
+            ctx.beginPath();
+            for (let i = 0; i < trace.bins; i++) {
+                const x = (trace.start + (i + center) * trace.step - this.viewStart) / span * width;
+                if (i === 0) ctx.moveTo(x, y(trace.data[2 * i]));
+                else ctx.lineTo(x, y(trace.data[2 * i]));
+                ctx.lineTo(x, y(trace.data[2 * i + 1]));
+            }
+            ctx.stroke();
+            ctx.fillStyle = '#495057';
+            ctx.fillText(trace.id, 4 * ratio, top + 12 * ratio);
+        });
+        this.drawAxis(plotHeight, span);
+    }
+
+    drawAxis(plotHeight, span) {
+        const { ctx, canvas } = this;
+        const ratio = window.devicePixelRatio || 1;
+        const steps = [0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 43200, 86400];
+        const step = steps.find(s => span / s <= 8) || steps[steps.length - 1];
+        ctx.strokeStyle = '#adb5bd';
+        ctx.fillStyle = '#495057';
+        ctx.beginPath();
+        ctx.moveTo(0, plotHeight);
+        ctx.lineTo(canvas.width, plotHeight);
+        for (let k = Math.ceil(this.viewStart / step); k * step <= this.viewEnd; k++) {
+            const t = k * step;
+            const x = (t - this.viewStart) / span * canvas.width;
+            ctx.moveTo(x, plotHeight);
+            ctx.lineTo(x, plotHeight + 4 * ratio);
+            // Hora UTC, con milisegundos si el paso es menor que un segundo
+            const label = new Date(Math.round(t * 1000)).toISOString().substring(11, step < 1 ? 23 : 19);
+            ctx.fillText(label, x + 2 * ratio, plotHeight + 16 * ratio);
+        }
+        ctx.stroke();
+    }
+}
+
 // Inicialización cuando el DOM esté listo
 document.addEventListener('DOMContentLoaded', function() {
     // Aplicar animaciones de entrada
@@ -350,12 +558,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
-    // Mostrar notificación de bienvenida
-    setTimeout(() => {
-        NotificationManager.show(
-            'Bienvenido al Detector Sísmico. Sube tus archivos MSEED para comenzar.',
-            'info',
-            3000
-        );
-    }, 1000);
+    // Mostrar notificación de bienvenida (solo en la página de carga)
+    if (document.getElementById('processBtn')) {
+        setTimeout(() => {
+            NotificationManager.show(
+                'Bienvenido al Detector Sísmico. Sube tus archivos MSEED para comenzar.',
+                'info',
+                3000
+            );
+        }, 1000);
+    }
 });
\ No newline at end of file
@@ -0,0 +1,446 @@
+import os
+import csv
+import json
+import glob
+import threading
+import numpy as np
+
+"""
+Resumen de resultados acumulado en memoria mientras se generan los picks.
+
+`create_summary_csv` volvía a abrir y leer todos los CSV de picks y detecciones de cada archivo al
+final del trabajo solo para contar filas P y S, información que el pipeline ya tenía en memoria
+segundos antes. `SummaryAggregator` recibe los picks de cada banda y modelo en el momento en que se
+escriben y acumula conteos y estadísticas de confianza (`peak_value`): número, media, desviación,
+mínimo, máximo e histograma. El resumen parcial está disponible mientras el trabajo avanza y el
+final se escribe sin volver a leer ningún archivo.
+
+El estado de cada archivo se guarda en `<carpeta del archivo>/file_summary.json` después de cada
+banda, así que un archivo recuperado de la caché de resultados o de un checkpoint aporta su resumen
+sin recalcular nada. Solo para carpetas creadas antes de existir este archivo se cuentan los CSV.
+
+Si se conoce el origen de las ventanas de un archivo (`set_window_origin`), los picks también se
+cuentan por minuto desde ese origen. Como las ventanas duran un número entero de minutos, los
+conteos por ventana de cualquier duración (la original o la de un conjunto re-renderizado) salen
+exactos de esos intervalos (`window_counts`) sin volver a leer los picks.
+"""
+
+# Nombre del resumen por archivo dentro de la carpeta de resultados de cada archivo.
+FILE_SUMMARY_FILENAME = "file_summary.json"
+# Resumen del trabajo (mismo formato de siempre) y estadísticas de confianza.
+SUMMARY_FILENAME = "summary_results.csv"
+CONFIDENCE_SUMMARY_FILENAME = "summary_confidence.csv"
+# Comparación lado a lado de los datasets de un trabajo de comparación de datasets.
+DATASET_COMPARISON_FILENAME = "dataset_comparison.csv"
+
+SUMMARY_MODELS = ("PhaseNet", "EQTransformer", "GPD")
+# Clave con la que se guardan las detecciones de EQTransformer junto a las fases P y S.
+DETECTIONS_KEY = "detections"
+# Número de intervalos del histograma de `peak_value` en [0, 1].
+HISTOGRAM_BINS = 10
+# Nanosegundos por minuto (resolución de los conteos de picks en el tiempo).
+MINUTE_NS = 60 * 1000 ** 3
+
+
+def _empty_stats():
+    return {'count': 0, 'sum': 0.0, 'sum_sq': 0.0, 'min': None, 'max': None,
+            'histogram': [0] * HISTOGRAM_BINS}
+
+
+def _stats_from_values(values):
+    """Estadísticas acumulables de un arreglo de valores de confianza."""
+    stats = _empty_stats()
+    values = values[np.isfinite(values)]
+    stats['count'] = int(len(values))
+    if len(values):
+        stats['sum'] = float(values.sum())
+        stats['sum_sq'] = float(np.square(values).sum())
+        stats['min'] = float(values.min())
+        stats['max'] = float(values.max())
+        bins = np.clip((values * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+        stats['histogram'] = np.bincount(bins, minlength=HISTOGRAM_BINS).tolist()
+    return stats
+
+
+def _merge_stats(a, b):
+    """Combina dos estadísticas acumuladas (modo incremental)."""
+    bounds = [v for v in (a['min'], b['min']) if v is not None]
+    upper = [v for v in (a['max'], b['max']) if v is not None]
+    return {
+        'count': a['count'] + b['count'],
+        'sum': a['sum'] + b['sum'],
+        'sum_sq': a['sum_sq'] + b['sum_sq'],
+        'min': min(bounds) if bounds else None,
+        'max': max(upper) if upper else None,
+        'histogram': [x + y for x, y in zip(a['histogram'], b['histogram'])]
+    }
+
+
+def describe_stats(stats):
+    """Estadísticas legibles (media y desviación estándar en lugar de sumas)."""
+    count = stats['count']
+    mean = stats['sum'] / count if count else None
+    std = float(np.sqrt(max(stats['sum_sq'] / count - mean ** 2, 0.0))) if count else None
+    return {'count': count, 'mean': mean, 'std': std, 'min': stats['min'], 'max': stats['max'],
+            'histogram': stats['histogram']}
+
+
+def _peak_values(items):
+    values = [getattr(item, 'peak_value', None) for item in items]
+    return np.array([v if v is not None else np.nan for v in values], dtype=np.float64)
+
+
+def _minute_counts(picks, origin_ns, time_attr='peak_time'):
+    """
+    Conteo de picks (o detecciones, con `time_attr='start_time'`) por minuto desde `origin_ns`
+    (claves en texto, como quedan en JSON).
+    """
+    times = np.array([getattr(p, time_attr).ns for p in picks if getattr(p, time_attr, None) is not None],
+                     dtype=np.int64)
+    if not len(times):
+        return {}
+    minutes, counts = np.unique((times - origin_ns) // MINUTE_NS, return_counts=True)
+    return {str(int(m)): int(c) for m, c in zip(minutes, counts)}
+
+
+class SummaryAggregator:
+    """
+    Conteos y estadísticas de confianza por archivo, banda y modelo de un trabajo.
+
+    La estructura de cada archivo es `{banda: {modelo: {fase: estadísticas}}}`, con las fases
+    "P" y "S" para todos los modelos y además `DETECTIONS_KEY` para EQTransformer. Aparte se
+    guardan el origen de las ventanas y los picks por minuto `{banda: {modelo: {minuto: n}}}` (con las
+    detecciones de EQTransformer por minuto de inicio bajo `DETECTIONS_KEY` en lugar de modelo). Es seguro
+    usarla desde el hilo del procesamiento y desde los hilos del servidor que consultan el
+    resumen parcial.
+    """
+
+    def __init__(self, output_base_dir):
+        """
+        Args:
+            output_base_dir (str): Carpeta de resultados del trabajo (una subcarpeta por archivo).
+        """
+        self.output_base_dir = output_base_dir
+        self._files = {}
+        self._origins = {}  # Origen de las ventanas por archivo, en nanosegundos
+        self._minutes = {}  # Picks por minuto desde el origen
+        self._lock = threading.Lock()
+
+    def _file_path(self, basename):
+        return os.path.join(self.output_base_dir, basename, FILE_SUMMARY_FILENAME)
+
+    def _save_file(self, basename):
+        path = self._file_path(basename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'bands': self._files.get(basename, {}),
+                'window_origin_ns': self._origins.get(basename),
+                'pick_minutes': self._minutes.get(basename, {})
+            }, f)
+        # Reemplazo atómico: si el archivo es un enlace duro a la caché de resultados, esta no cambia.
+        os.replace(tmp_path, path)
+
+    def _update(self, basename, band, model_name, key, stats, append):
+        model_entry = self._files.setdefault(basename, {}).setdefault(band, {}).setdefault(model_name, {})
+        if append and key in model_entry:
+            stats = _merge_stats(model_entry[key], stats)
+        model_entry[key] = stats
+
+    def set_window_origin(self, basename, origin):
+        """
+        Fija el origen de las ventanas de un archivo, a partir del cual se cuentan los picks por minuto.
+
+        Args:
+            basename (str): Nombre base del archivo MiniSEED.
+            origin (obspy.core.utcdatetime.UTCDateTime): Inicio de la primera ventana.
+        """
+        with self._lock:
+            if self._origins.get(basename) != origin.ns:
+                self._origins[basename] = origin.ns
+                self._minutes.pop(basename, None)
+
+    def add_band(self, basename, band, picks_by_model, detections=None, append=False):
+        """
+        Registra los picks (y detecciones de EQTransformer) de una banda recién escritos a CSV.
+
+        Args:
+            basename (str): Nombre base del archivo MiniSEED.
+            band (str): Tipo de filtro.
+            picks_by_model (dict): Listas de picks por nombre de modelo.
+            detections (list, optional): Detecciones de EQTransformer.
+            append (bool, optional): Si es True, se suman a lo ya registrado (modo incremental);
+                si no, reemplazan lo registrado para esta banda. Por defecto False.
+        """
+        updates = []
+        for model_name, picks in picks_by_model.items():
+            phases = np.array([getattr(p, 'phase', None) for p in picks], dtype=object)
+            values = _peak_values(picks)
+            for phase in ("P", "S"):
+                updates.append((model_name, phase, _stats_from_values(values[phases == phase])))
+        if detections is not None:
+            updates.append(("EQTransformer", DETECTIONS_KEY, _stats_from_values(_peak_values(detections))))
+
+        with self._lock:
+            origin_ns = self._origins.get(basename)
+            if not append:
+                self._files.setdefault(basename, {})[band] = {}
+                self._minutes.get(basename, {}).pop(band, None)
+            for model_name, key, stats in updates:
+                self._update(basename, band, model_name, key, stats, append)
+            if origin_ns is not None:
+                band_minutes = self._minutes.setdefault(basename, {}).setdefault(band, {})
+                minute_counts = [(model_name, _minute_counts(picks, origin_ns))
+                                 for model_name, picks in picks_by_model.items()]
+                if detections is not None:
+                    minute_counts.append((DETECTIONS_KEY, _minute_counts(detections, origin_ns, 'start_time')))
+                for model_name, counts in minute_counts:
+                    model_minutes = band_minutes.setdefault(model_name, {})
+                    for minute, count in counts.items():
+                        model_minutes[minute] = model_minutes.get(minute, 0) + count
+            self._save_file(basename)
+
+    def has_file(self, basename):
+        """Indica si hay algo registrado de un archivo."""
+        with self._lock:
+            return basename in self._files
+
+    def reset_file(self, basename):
+        """Olvida lo registrado de un archivo (antes de procesarlo desde cero)."""
+        with self._lock:
+            self._files.pop(basename, None)
+            self._origins.pop(basename, None)
+            self._minutes.pop(basename, None)
+            path = self._file_path(basename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def load_file(self, basename):
+        """
+        Incorpora el resumen guardado de un archivo procesado antes (caché, checkpoint o ejecución
+        incremental anterior). Si la carpeta es anterior a `file_summary.json`, se cuentan sus CSV.
+
+        Returns:
+            bool: True si se encontró un resumen o resultados del archivo.
+        """
+        path = self._file_path(basename)
+        data = None
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Advertencia: resumen ilegible en {path}: {e}")
+        if data is None:
+            data = self._count_from_csv(basename)
+        if data is None:
+            return False
+        if 'bands' not in data:
+            # Formato anterior de `file_summary.json` (y conteo de CSV): solo las bandas.
+            data = {'bands': data}
+        with self._lock:
+            self._files[basename] = data['bands']
+            if data.get('window_origin_ns') is not None:
+                self._origins[basename] = data['window_origin_ns']
+                self._minutes[basename] = data.get('pick_minutes') or {}
+        return True
+
+    def _count_from_csv(self, basename):
+        """Conteos a partir de los CSV de un archivo (solo para resultados sin `file_summary.json`)."""
+        results_folder = os.path.join(self.output_base_dir, basename, "resultados_detecciones_filtrados")
+        if not os.path.isdir(results_folder):
+            return None
+        bands = {}
+        for picks_csv in glob.glob(os.path.join(results_folder, f"{basename}_*_*_picks.csv")):
+            parts = os.path.basename(picks_csv)[len(basename) + 1:].split('_')
+            if len(parts) < 3 or parts[1] not in SUMMARY_MODELS:
+                continue
+            band, model_name = parts[0], parts[1]
+            phases, values = [], []
+            with open(picks_csv, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    phases.append(row.get('phase'))
+                    try:
+                        values.append(float(row.get('peak_value')))
+                    except (TypeError, ValueError):
+                        values.append(np.nan)
+            phases = np.array(phases, dtype=object)
+            values = np.array(values, dtype=np.float64)
+            bands.setdefault(band, {})[model_name] = {
+                phase: _stats_from_values(values[phases == phase]) for phase in ("P", "S")
+            }
+            if model_name == "EQTransformer":
+                detections_csv = os.path.join(results_folder, f"{basename}_{band}_EQTransformer_detections.csv")
+                detection_values = []
+                if os.path.exists(detections_csv):
+                    with open(detections_csv, 'r', newline='') as f:
+                        for row in csv.DictReader(f):
+                            try:
+                                detection_values.append(float(row.get('peak_value')))
+                            except (TypeError, ValueError):
+                                detection_values.append(np.nan)
+                bands[band][model_name][DETECTIONS_KEY] = _stats_from_values(
+                    np.array(detection_values, dtype=np.float64))
+        return bands
+
+    def file_stats(self, basename):
+        """Copia de las estadísticas de un archivo, `{banda: {modelo: {fase: estadísticas}}}` ({} si no hay)."""
+        with self._lock:
+            return json.loads(json.dumps(self._files.get(basename, {})))
+
+    def window_origin_ns(self, basename):
+        """Origen de las ventanas de un archivo en nanosegundos (None si no se conoce)."""
+        with self._lock:
+            return self._origins.get(basename)
+
+    def window_counts(self, basename, window_length_minutes):
+        """
+        Picks por ventana de un archivo, para ventanas de la duración indicada desde su origen.
+
+        Args:
+            basename (str): Nombre base del archivo MiniSEED.
+            window_length_minutes (int): Duración de las ventanas en minutos.
+
+        Returns:
+            dict: `{índice de ventana: {banda: {modelo: n}}}`, solo con las ventanas que tienen
+                picks o detecciones (estas bajo `DETECTIONS_KEY`), o None si no se conoce el
+                origen de las ventanas del archivo.
+        """
+        with self._lock:
+            if basename not in self._origins:
+                return None
+            minutes = json.loads(json.dumps(self._minutes.get(basename, {})))
+        windows = {}
+        for band, models in minutes.items():
+            for model_name, counts in models.items():
+                for minute, count in counts.items():
+                    window = int(minute) // window_length_minutes
+                    if window < 0:
+                        continue
+                    band_counts = windows.setdefault(window, {}).setdefault(band, {})
+                    band_counts[model_name] = band_counts.get(model_name, 0) + count
+        return windows
+
+    def _count(self, band_entry, model_name, key):
+        return band_entry.get(model_name, {}).get(key, {}).get('count', 0)
+
+    def snapshot(self):
+        """
+        Resumen (parcial o final) serializable en JSON.
+
+        Returns:
+            dict: 'files' con los conteos por archivo y banda, y 'confidence' con las estadísticas
+                de `peak_value` por modelo y fase sumadas sobre todos los archivos y bandas.
+        """
+        with self._lock:
+            files = json.loads(json.dumps(self._files))
+        totals = {}
+        result = {}
+        for basename, bands in files.items():
+            result[basename] = {}
+            for band in sorted(bands):
+                result[basename][band] = {}
+                for model_name, keys in bands[band].items():
+                    result[basename][band][model_name] = {key: stats['count'] for key, stats in keys.items()}
+                    for key, stats in keys.items():
+                        model_totals = totals.setdefault(model_name, {})
+                        model_totals[key] = _merge_stats(model_totals[key], stats) if key in model_totals else stats
+        confidence = {model_name: {key: describe_stats(stats) for key, stats in keys.items()}
+                      for model_name, keys in totals.items()}
+        return {'files': result, 'confidence': confidence}
+
+    def write(self, basenames):
+        """
+        Escribe `summary_results.csv` (mismas columnas que antes) y `summary_confidence.csv`.
+
+        Args:
+            basenames (list): Archivos a incluir, en el orden de las filas.
+
+        Returns:
+            str: Ruta de `summary_results.csv`.
+        """
+        summary_file = os.path.join(self.output_base_dir, SUMMARY_FILENAME)
+        confidence_file = os.path.join(self.output_base_dir, CONFIDENCE_SUMMARY_FILENAME)
+        with self._lock:
+            files = {basename: self._files.get(basename) for basename in basenames}
+
+        with open(summary_file, 'w', newline='') as summary_csv, open(confidence_file, 'w', newline='') as confidence_csv:
+            summary_writer = csv.writer(summary_csv)
+            summary_writer.writerow([
+                "filename", "filter_type",
+                "PhaseNet_P_picks", "PhaseNet_S_picks",
+                "EQT_P_picks", "EQT_S_picks",
+                "GPD_P_picks", "GPD_S_picks",
+                "EQT_detections"
+            ])
+            confidence_writer = csv.writer(confidence_csv)
+            confidence_writer.writerow(["filename", "filter_type", "model", "phase",
+                                        "count", "mean", "std", "min", "max"])
+
+            for basename, bands in files.items():
+                if not bands:
+                    print(f"Advertencia: no hay resultados de {basename} para el resumen")
+                    continue
+                for band in sorted(bands):
+                    entry = bands[band]
+                    summary_writer.writerow([
+                        basename, band,
+                        self._count(entry, "PhaseNet", "P"), self._count(entry, "PhaseNet", "S"),
+                        self._count(entry, "EQTransformer", "P"), self._count(entry, "EQTransformer", "S"),
+                        self._count(entry, "GPD", "P"), self._count(entry, "GPD", "S"),
+                        self._count(entry, "EQTransformer", DETECTIONS_KEY)
+                    ])
+                    for model_name in SUMMARY_MODELS:
+                        for key, stats in entry.get(model_name, {}).items():
+                            described = describe_stats(stats)
+                            confidence_writer.writerow([
+                                basename, band, model_name, key, described['count'],
+                                "" if described['mean'] is None else round(described['mean'], 6),
+                                "" if described['std'] is None else round(described['std'], 6),
+                                "" if described['min'] is None else round(described['min'], 6),
+                                "" if described['max'] is None else round(described['max'], 6)
+                            ])
+
+        print(f"Resumen de resultados guardado en: {summary_file}")
+        return summary_file
+
+
+def write_dataset_comparison(summaries, basenames, output_path):
+    """
+    Escribe la comparación lado a lado de varios datasets: una fila por archivo, banda, modelo y
+    fase, con el número de picks (o detecciones) y el `peak_value` medio de cada dataset.
+
+    Args:
+        summaries (dict): Dataset -> `SummaryAggregator` con los resultados de ese dataset.
+        basenames (list): Archivos a incluir, en el orden de las filas.
+        output_path (str): Ruta del CSV de comparación.
+
+    Returns:
+        str: Ruta del CSV escrito.
+    """
+    datasets = list(summaries)
+    header = ["filename", "filter_type", "model", "phase"]
+    for dataset in datasets:
+        header += [f"{dataset}_count", f"{dataset}_mean_peak_value"]
+
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for basename in basenames:
+            stats = {dataset: summary.file_stats(basename) for dataset, summary in summaries.items()}
+            bands = sorted(set().union(*(file_stats.keys() for file_stats in stats.values())))
+            for band in bands:
+                for model_name in SUMMARY_MODELS:
+                    keys = ["P", "S"] + ([DETECTIONS_KEY] if model_name == "EQTransformer" else [])
+                    for key in keys:
+                        row = [basename, band, model_name, key]
+                        for dataset in datasets:
+                            entry = stats[dataset].get(band, {}).get(model_name, {}).get(key)
+                            described = describe_stats(entry) if entry else {'count': 0, 'mean': None}
+                            row += [described['count'],
+                                    "" if described['mean'] is None else round(described['mean'], 6)]
+                        writer.writerow(row)
+
+    print(f"Comparación de datasets guardada en: {output_path}")
+    return output_path
@@ -0,0 +1,244 @@
+import os
+import json
+import math
+import time
+import shutil
+import numpy as np
+from annotation_store import AnnotationStore
+
+"""
+Pirámide multirresolución de mínimos y máximos de las trazas del almacén de anotaciones.
+
+Los PNG por ventana tienen una duración fija: no se puede acercar la vista a un pick ni ver el día
+completo sin volver a dibujar. Para que el navegador dibuje las trazas en un canvas a cualquier
+escala, al terminar cada archivo se calcula, para cada forma de onda y cada probabilidad del
+almacén, una serie de niveles: el nivel k reúne `PYRAMID_FACTOR**k` muestras por caja y guarda el
+mínimo y el máximo de cada caja (float32, forma `(cajas, 2)`), hasta un nivel de como mucho
+`PYRAMID_TOP_BINS` cajas. Cada nivel es un `.npy` que se lee mapeado en memoria.
+
+Una consulta (intervalo de tiempo y número de puntos) usa el nivel más fino con a lo sumo `points`
+cajas en el intervalo y devuelve un corte contiguo de ese nivel, listo para enviarse como Float32:
+el trabajo depende de los puntos pedidos, no de la duración del registro. Con factor 4 la pirámide
+ocupa dos tercios de los datos en float32.
+
+Estructura en disco (dentro de la carpeta del almacén):
+    <almacén>/piramide/index.json
+    <almacén>/piramide/<banda>/<tipo>/<traza>.L<k>.npy
+"""
+
+# Carpeta de la pirámide dentro del almacén de anotaciones.
+PYRAMID_FOLDER = "piramide"
+# Muestras (o cajas del nivel anterior) que reúne cada caja de un nivel.
+PYRAMID_FACTOR = 4
+# La pirámide termina en el primer nivel con a lo sumo este número de cajas.
+PYRAMID_TOP_BINS = 512
+# Puntos por traza de una consulta: por defecto y máximo.
+DEFAULT_POINTS = 2000
+MAX_POINTS = 8192
+
+
+def minmax_levels(data, factor=PYRAMID_FACTOR, top_bins=PYRAMID_TOP_BINS):
+    """
+    Calcula los niveles de mínimos y máximos de una traza.
+
+    Args:
+        data (numpy.ndarray): Muestras de la traza (puede estar mapeada en memoria).
+        factor (int, optional): Cajas del nivel anterior que reúne cada caja.
+        top_bins (int, optional): Número de cajas a partir del cual no se crean más niveles.
+
+    Returns:
+        list: Un arreglo float32 de forma (cajas, 2) con [mínimo, máximo] por nivel, empezando por
+            el nivel 1 (`factor` muestras por caja). La última caja de cada nivel puede ser parcial.
+            Vacía si la traza tiene a lo sumo `top_bins` muestras.
+    """
+    levels = []
+    low = high = np.asarray(data)
+    while len(low) > top_bins:
+        full = len(low) // factor * factor
+        next_low = low[:full].reshape(-1, factor).min(axis=1)
+        next_high = high[:full].reshape(-1, factor).max(axis=1)
+        if full < len(low):
+            next_low = np.append(next_low, low[full:].min())
+            next_high = np.append(next_high, high[full:].max())
+        low = next_low.astype(np.float32, copy=False)
+        high = next_high.astype(np.float32, copy=False)
+        levels.append(np.column_stack((low, high)))
+    return levels
+
+
+class WaveformPyramid:
+    """
+    Pirámide de mínimos y máximos de las trazas de un `AnnotationStore`.
+
+    Las trazas se identifican por el archivo `.npy` que les asigna el almacén; el índice guarda,
+    para cada una, el inicio, la frecuencia y el número de muestras con que se calculó, para
+    detectar que el almacén cambió (un archivo reprocesado) y hay que reconstruirla.
+    """
+
+    def __init__(self, store_dir):
+        """
+        Args:
+            store_dir (str): Carpeta del almacén de anotaciones.
+        """
+        self.store_dir = store_dir
+        self.pyramid_dir = os.path.join(store_dir, PYRAMID_FOLDER)
+        self.index_path = os.path.join(self.pyramid_dir, "index.json")
+        self._index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Advertencia: índice de la pirámide ilegible en {self.index_path}: {e}")
+        return {'factor': PYRAMID_FACTOR, 'traces': {}}
+
+    def is_current(self, store):
+        """Indica si la pirámide corresponde a las trazas actuales de `store`."""
+        traces = self._index['traces']
+        entries = store.entries()
+        if self._index.get('factor') != PYRAMID_FACTOR or len(traces) != len(entries):
+            return False
+        for entry in entries:
+            info = traces.get(entry['file'])
+            if info is None or (info['start_ns'], info['npts'], info['sampling_rate']) != \
+                    (entry['start_ns'], entry['npts'], entry['sampling_rate']):
+                return False
+        return True
+
+    def build(self, store):
+        """
+        Calcula y guarda la pirámide de todas las trazas de `store`, reemplazando la anterior.
+
+        Args:
+            store (annotation_store.AnnotationStore): Almacén del archivo.
+        """
+        shutil.rmtree(self.pyramid_dir, ignore_errors=True)
+        traces = {}
+        for entry in store.entries():
+            data = np.load(os.path.join(store.store_dir, entry['file']), mmap_mode='r')
+            base = os.path.splitext(entry['file'])[0]
+            bins = []
+            for level, minmax in enumerate(minmax_levels(data), start=1):
+                path = os.path.join(self.pyramid_dir, f"{base}.L{level}.npy")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                np.save(path, minmax)
+                bins.append(int(len(minmax)))
+            traces[entry['file']] = {
+                'start_ns': entry['start_ns'],
+                'npts': entry['npts'],
+                'sampling_rate': entry['sampling_rate'],
+                'bins': bins
+            }
+
+        self._index = {'factor': PYRAMID_FACTOR, 'traces': traces}
+        os.makedirs(self.pyramid_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def read(self, store, band, kind, start_ns=None, end_ns=None, points=DEFAULT_POINTS):
+        """
+        Lee un intervalo de las trazas de una banda y tipo con a lo sumo `points` cajas por traza
+        (salvo en el nivel superior, que tiene como mucho `PYRAMID_TOP_BINS`).
+
+        Args:
+            store (annotation_store.AnnotationStore): Almacén del archivo.
+            band (str): Tipo de filtro.
+            kind (str): Nombre del modelo o `annotation_store.WAVEFORM_KIND`.
+            start_ns (int, optional): Inicio del intervalo en nanosegundos desde la época.
+            end_ns (int, optional): Fin del intervalo (incluido).
+            points (int, optional): Número máximo de cajas por traza (normalmente, el ancho del
+                canvas en píxeles).
+
+        Returns:
+            list: Un dict por traza con 'id', 'level' (0: muestras sin agrupar), 'start_ns' (inicio
+                de la primera caja), 'step_seconds' (duración de cada caja) y 'data' (float32 de
+                forma (cajas, 2) con [mínimo, máximo]; en el nivel 0 ambos son la muestra).
+        """
+        factor = self._index.get('factor', PYRAMID_FACTOR)
+        result = []
+        for entry in store.entries(band, kind):
+            sr = entry['sampling_rate']
+            t0 = entry['start_ns']
+            # Intervalo en muestras, con el mismo redondeo que `AnnotationStore.read`.
+            i0, i1 = 0, entry['npts']
+            if start_ns is not None:
+                i0 = max(0, math.ceil((start_ns - t0) * sr / 1e9 - 1e-6))
+            if end_ns is not None:
+                i1 = min(i1, math.floor((end_ns - t0) * sr / 1e9 + 1e-6) + 1)
+            if i1 <= i0:
+                continue
+
+            # Nivel más fino con a lo sumo `points` cajas en el intervalo (o el superior).
+            info = self._index['traces'].get(entry['file'])
+            bins = info['bins'] if info is not None else []
+            level = 0
+            while level < len(bins) and math.ceil((i1 - i0) / factor ** level) > points:
+                level += 1
+            bin_samples = factor ** level
+
+            if level == 0:
+                samples = np.load(os.path.join(store.store_dir, entry['file']), mmap_mode='r')[i0:i1]
+                data = np.repeat(np.asarray(samples, dtype=np.float32), 2).reshape(-1, 2)
+                first_bin = i0
+            else:
+                first_bin = i0 // bin_samples
+                last_bin = min(bins[level - 1], -(-i1 // bin_samples))
+                path = os.path.join(self.pyramid_dir, f"{os.path.splitext(entry['file'])[0]}.L{level}.npy")
+                data = np.load(path, mmap_mode='r')[first_bin:last_bin]
+
+            result.append({
+                'id': f"{entry['network']}.{entry['station']}.{entry['location']}.{entry['channel']}",
+                'level': level,
+                'start_ns': t0 + round(first_bin * bin_samples * 1e9 / sr),
+                'step_seconds': bin_samples / sr,
+                'data': data
+            })
+        return result
+
+
+def encode_traces(traces):
+    """
+    Codifica el resultado de `WaveformPyramid.read` para enviarlo al navegador.
+
+    Args:
+        traces (list): Trazas retornadas por `WaveformPyramid.read`.
+
+    Returns:
+        tuple: (lista con 'id', 'level', 'start' (segundos desde la época), 'step' (segundos) y
+            'bins' de cada traza, bytes con los pares [mínimo, máximo] de todas las trazas seguidas
+            como Float32 little-endian).
+    """
+    layout = [{
+        'id': trace['id'],
+        'level': trace['level'],
+        'start': trace['start_ns'] / 1e9,
+        'step': trace['step_seconds'],
+        'bins': len(trace['data'])
+    } for trace in traces]
+    payload = b"".join(np.ascontiguousarray(trace['data'], dtype='<f4').tobytes() for trace in traces)
+    return layout, payload
+
+
+def ensure_pyramid(store_dir):
+    """
+    Construye la pirámide de un almacén si no existe o no corresponde a sus trazas.
+
+    Args:
+        store_dir (str): Carpeta del almacén de anotaciones.
+
+    Returns:
+        tuple: (AnnotationStore, WaveformPyramid), o None si el almacén no existe o está vacío.
+    """
+    store = AnnotationStore(store_dir)
+    if not store.exists():
+        return None
+    pyramid = WaveformPyramid(store_dir)
+    if not pyramid.is_current(store):
+        start = time.time()
+        pyramid.build(store)
+        print(f"Pirámide de {store_dir}: {len(store.entries())} trazas en {time.time() - start:.1f} s")
+    return store, pyramid
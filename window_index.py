@@ -0,0 +1,160 @@
+import math
+from collections import namedtuple
+
+"""
+Índice de muestras por ventana de un stream, calculado una sola vez.
+
+Para dibujar cada ventana se llamaba a `stream.slice(t0, t1)` sobre la señal de cada banda y sobre
+cada stream de predicciones: cada llamada crea un Stream nuevo y, por traza, un Trace y una copia
+profunda de sus Stats, y recalcula los desplazamientos. Con ventanas de 2 minutos en 24 horas son
+720 ventanas × 5 bandas × 4 streams, decenas de miles de recortes por archivo para quedarse, al
+final, con un intervalo de muestras de cada traza.
+
+`WindowIndex` calcula esos intervalos para todas las ventanas al construirse, con las mismas reglas
+que `Stream.slice` (extremos ajustados a la muestra más cercana de la primera traza, trazas vacías
+descartadas) pero con aritmética entera en nanosegundos, y `window` retorna vistas numpy de las
+muestras (`TraceWindow`), sin copiar datos ni crear objetos de ObsPy. Las líneas que resultan son
+las mismas que con `slice`, así que las imágenes no cambian.
+"""
+
+# Una traza recortada a una ventana: vista de sus muestras, inicio en nanosegundos desde la época,
+# frecuencia de muestreo y canal.
+TraceWindow = namedtuple("TraceWindow", ["data", "start_ns", "sampling_rate", "channel"])
+
+# Decimales con que `UTCDateTime` redondea la diferencia entre dos tiempos.
+_UTC_PRECISION = 6
+
+
+def _round_away(number):
+    """Entero más cercano, con los empates hacia fuera del cero (como `obspy.core.compatibility.round_away`)."""
+    floor, ceil = math.floor(number), math.ceil(number)
+    if floor != ceil and number - floor == ceil - number:
+        return int(number) + (1 if number > 0 else -1)
+    return int(round(number))
+
+
+def seconds_between(a_ns, b_ns):
+    """Segundos de `b_ns` a `a_ns` (nanosegundos), como `UTCDateTime(ns=a_ns) - UTCDateTime(ns=b_ns)`."""
+    return round((a_ns - b_ns) / 1e9, _UTC_PRECISION)
+
+
+def _shift(ns, seconds):
+    """Tiempo en nanosegundos `seconds` segundos después de `ns`, como `UTCDateTime(ns=ns) + seconds`."""
+    return ns + int(round(float(seconds) * 1e9))
+
+
+def window_bounds(origin, window_seconds, window_numbers):
+    """
+    Límites de ventanas consecutivas alineadas a `origin`.
+
+    Args:
+        origin (obspy.core.utcdatetime.UTCDateTime): Inicio de la ventana 0.
+        window_seconds (int): Duración de cada ventana en segundos.
+        window_numbers (iterable): Números de las ventanas.
+
+    Returns:
+        dict: (t0, t1) en nanosegundos de cada ventana, los mismos que `origin + k * window_seconds`
+            y `t0 + window_seconds` con `UTCDateTime`.
+    """
+    bounds = {}
+    for number in window_numbers:
+        t0 = _shift(origin.ns, number * window_seconds)
+        bounds[number] = (t0, _shift(t0, window_seconds))
+    return bounds
+
+
+def trace_windows(stream):
+    """`TraceWindow` de cada traza de un stream ya recortado, con vistas de sus muestras."""
+    return [TraceWindow(tr.data, tr.stats.starttime.ns, tr.stats.sampling_rate, tr.stats.channel)
+            for tr in stream]
+
+
+class WindowIndex:
+    """
+    Intervalos de muestras de cada traza de un stream en cada ventana.
+    """
+
+    def __init__(self, stream, bounds):
+        """
+        Args:
+            stream (obspy.core.stream.Stream): Stream completo (la señal de una banda o las
+                predicciones de un modelo).
+            bounds (dict): (t0, t1) en nanosegundos de cada ventana (ver `window_bounds`).
+        """
+        self._traces = [(tr.data, tr.stats.channel, tr.stats.sampling_rate) for tr in stream]
+        # Inicio, frecuencia, intervalo, muestras y fin de cada traza, en el formato de `UTCDateTime`.
+        timing = [(tr.stats.starttime.ns, tr.stats.sampling_rate, tr.stats.delta, tr.stats.npts,
+                   tr.stats.endtime.ns) for tr in stream]
+        self._windows = {number: self._ranges(timing, t0, t1) for number, (t0, t1) in bounds.items()}
+
+    @staticmethod
+    def _ranges(timing, t0, t1):
+        """
+        Intervalos `(traza, i0, i1, inicio)` que conserva `Stream.slice(t0, t1)` (muestra más cercana).
+
+        Replica `Stream.slice`, `Trace._ltrim` y `Trace._rtrim`: los extremos se ajustan a la
+        muestra más cercana de la primera traza y luego cada traza se recorta a ellos.
+        """
+        if not timing:
+            return []
+        s0, sr0, delta0, _, e0 = timing[0]
+        start = _shift(s0, _round_away(seconds_between(t0, s0) * sr0) * delta0)
+        end = _shift(e0, _round_away(seconds_between(t1, e0) * sr0) * delta0)
+        if start > end:
+            return []
+
+        ranges = []
+        for trace, (s, sr, delta, npts, _) in enumerate(timing):
+            first, count, trace_start = 0, npts, s
+            # Recorte por la izquierda: el inicio avanza hasta la muestra más cercana a `start`.
+            shift = _round_away(seconds_between(start, s) * sr)
+            if shift > 0:
+                trace_start = _shift(s, shift * delta)
+                last = trace_start if npts == 0 else _shift(trace_start, float(npts - 1) * delta)
+                if start > last:
+                    continue
+                first = min(shift, npts)
+                count = npts - first
+            # Recorte por la derecha: se descartan las muestras posteriores a `end`.
+            excess = _round_away(seconds_between(end, trace_start) * sr) - count + 1
+            if excess < 0:
+                if end < trace_start:
+                    continue
+                count = 1 if end == trace_start else count + excess
+            if count > 0:
+                ranges.append((trace, first, first + count, trace_start))
+        return ranges
+
+    def window(self, number):
+        """
+        Trazas de una ventana.
+
+        Args:
+            number (int): Número de la ventana (una de las de `bounds`).
+
+        Returns:
+            list: `TraceWindow` de cada traza con muestras en la ventana, en el orden del stream.
+                Vacía si ninguna traza tiene datos en ella.
+        """
+        windows = []
+        for trace, first, stop, start_ns in self._windows[number]:
+            data, channel, sampling_rate = self._traces[trace]
+            windows.append(TraceWindow(data[first:stop], start_ns, sampling_rate, channel))
+        return windows
+
+
+def band_window_indexes(stream, predictions, bounds, prediction_keys=("eqt_preds", "pn_preds", "gpd_preds")):
+    """
+    Índices de la señal de una banda y de sus predicciones, para las mismas ventanas.
+
+    Args:
+        stream (obspy.core.stream.Stream): Señal de la banda.
+        predictions (dict): Predicciones de la banda (`'eqt_preds'`, `'pn_preds'`, `'gpd_preds'`).
+        bounds (dict): Límites de las ventanas (ver `window_bounds`).
+        prediction_keys (tuple, optional): Streams de `predictions` que se indexan.
+
+    Returns:
+        tuple: (`WindowIndex` de la señal, dict con el `WindowIndex` de cada stream de predicciones).
+    """
+    return (WindowIndex(stream, bounds),
+            {key: WindowIndex(predictions[key], bounds) for key in prediction_keys})
@@ -0,0 +1,647 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import matplotlib.image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.ticker import FuncFormatter
+from PIL import Image
+from window_index import seconds_between
+
+"""
+Renderizado de los gráficos por ventana (individuales y comparativos).
+
+`generate_individual_plots` creaba una figura nueva (`plt.subplots(4, 1, figsize=(15, 7))`) para cada
+ventana y cada banda, dibujaba líneas nuevas, la guardaba y la destruía con `plt.close`/`clf`/`cla`
+y `gc.collect()`. Con ventanas de 2 minutos en 24 horas son 720 figuras × 5 bandas por archivo, y
+construir la figura (ejes, ticks, textos) costaba más que dibujar los datos. `IndividualWindowRenderer`
+construye la figura una vez por banda y en cada ventana solo actualiza los datos de las líneas
+(`set_data`), las etiquetas, la leyenda, los límites y el formateador de tiempo antes de guardar.
+Las líneas que sobran en una ventana se ocultan y se reutilizan en las siguientes. El resultado es
+el mismo PNG que con una figura nueva por ventana.
+
+Además, las trazas y las probabilidades se reducen antes de dibujarse (`trace_envelope`): una
+ventana de 1440 minutos a 100 Hz son 8.6 millones de muestras por canal para una imagen de 2250 px
+de ancho. Cada traza se divide en columnas (dos por píxel del PNG) y de cada columna se conservan
+solo la muestra mínima y la máxima, en su orden original. La línea resultante cubre en cada píxel
+el mismo rango vertical que la traza completa, así que la imagen no cambia a simple vista, pero se
+dibujan unos miles de puntos en lugar de millones. Las ventanas cortas, con menos muestras que
+columnas, se dibujan completas.
+
+Las figuras se construyen con `Figure`/`FigureCanvasAgg`, sin el estado global de `pyplot`, y las
+ventanas se reparten en lotes entre procesos (`RenderPool`). Cada lote lleva solo lo que sus
+ventanas necesitan: la descripción de cada imagen (`individual_window_spec`,
+`comparison_window_spec`) con las líneas ya recortadas y reducidas, nunca los streams completos.
+Las trazas de cada ventana llegan a `window_lines` como vistas de las muestras
+(`window_index.WindowIndex`), sin recortar los streams con `slice` en cada ventana.
+Dentro de cada proceso la codificación PNG de una ventana (Pillow libera el GIL al comprimir) se
+hace en un hilo aparte mientras se dibuja la siguiente. Con un solo núcleo los lotes se dibujan en
+el propio proceso, con el mismo solapamiento.
+
+El gráfico comparativo de una ventana repetía todo lo que ya mostraban los individuales de esa
+ventana (la señal y las predicciones de cada banda) en una figura de 20 filas que se recortaba,
+reducía y dibujaba de nuevo. Con `window_group_spec` los paneles de todas las bandas de una ventana
+viajan juntos: cada uno se dibuja una vez, se guarda como imagen individual y el comparativo es la
+pila de esos mismos rasters (`np.concatenate`), sin dibujar nada más.
+
+La página de resultados no descarga estos PNG para navegar: muestra miniaturas (`save_thumbnail`,
+WebP de 360 px de ancho, unas decenas de KB frente a los cientos de KB del PNG) y pide la imagen
+completa solo al abrirla.
+"""
+
+# Ancho en píxeles de los PNG (15 pulgadas a 150 dpi), cota superior del ancho de los ejes.
+PLOT_WIDTH_PX = 15 * 150
+# Columnas del envolvente por píxel de ancho.
+ENVELOPE_COLUMNS_PER_PIXEL = 2
+# Resolución de los PNG.
+PLOT_DPI = 150
+# Procesos de renderizado por defecto (uno por núcleo).
+RENDER_WORKERS = os.cpu_count() or 1
+# Ventanas por lote enviado a un proceso.
+RENDER_BATCH_WINDOWS = 8
+# Imágenes dibujadas que pueden esperar a ser codificadas en cada proceso.
+_MAX_PENDING_ENCODES = 2
+# Figuras individuales reutilizables que conserva cada proceso de renderizado.
+_MAX_RENDERERS = 8
+# Ancho en píxeles, formato y calidad de las miniaturas de la página de resultados.
+THUMBNAIL_WIDTH_PX = 360
+THUMBNAIL_FORMAT = "webp"
+THUMBNAIL_QUALITY = 80
+
+# Etiqueta de las líneas ocultas (las que empiezan por "_" no aparecen en la leyenda).
+_HIDDEN_LABEL = "_oculta"
+# Colores de las trazas sísmicas (se rotan por canal) y desplazamiento vertical entre ellas.
+TRACE_COLORS = ['k', 'r', 'b']
+TRACE_OFFSET_FACTOR = 1.2
+# Stream de predicciones de cada modelo en los diccionarios de `process_stream_with_models`.
+_PREDICTION_KEYS = {"EQTransformer": "eqt_preds", "PhaseNet": "pn_preds", "GPD": "gpd_preds"}
+
+
+def minmax_envelope(data, columns):
+    """
+    Índices de las muestras mínima y máxima de cada columna de `data`, en orden creciente.
+
+    Args:
+        data (numpy.ndarray): Muestras de la traza.
+        columns (int): Número de columnas en que se divide la traza.
+
+    Returns:
+        numpy.ndarray: Índices de las muestras a dibujar (incluye la primera y la última). Si la
+            traza no tiene más de dos muestras por columna, son todos los índices.
+    """
+    count = len(data)
+    if columns <= 0 or count <= 2 * columns:
+        return np.arange(count)
+    size = -(-count // columns)  # Muestras por columna
+    full = count // size
+    starts = np.arange(full) * size
+    blocks = data[:full * size].reshape(full, size)
+    low = blocks.argmin(axis=1) + starts
+    high = blocks.argmax(axis=1) + starts
+    parts = [[0], np.column_stack((np.minimum(low, high), np.maximum(low, high))).ravel()]
+    if full * size < count:
+        tail = data[full * size:]
+        tail_low, tail_high = full * size + tail.argmin(), full * size + tail.argmax()
+        parts.append([min(tail_low, tail_high), max(tail_low, tail_high)])
+    parts.append([count - 1])
+    return np.concatenate(parts)
+
+
+def trace_envelope(trace, window_seconds, width_px=PLOT_WIDTH_PX):
+    """
+    Puntos (x, y) a dibujar de una traza en una ventana de `window_seconds` segundos.
+
+    Args:
+        trace (window_index.TraceWindow): Traza (sísmica o de probabilidad) recortada a la ventana.
+        window_seconds (float): Duración de la ventana, que ocupa todo el ancho de los ejes.
+        width_px (int, optional): Ancho en píxeles de la imagen.
+
+    Returns:
+        tuple: (x, y), con x en segundos desde el inicio de la traza (como `Trace.times()`) e y
+            las muestras seleccionadas por `minmax_envelope`.
+    """
+    duration = len(trace.data) / trace.sampling_rate
+    columns = int(np.ceil(width_px * ENVELOPE_COLUMNS_PER_PIXEL * duration / window_seconds))
+    indices = minmax_envelope(trace.data, columns)
+    return indices / trace.sampling_rate, trace.data[indices]
+
+
+def window_lines(traces, predictions, t0, t1, color_dict, model_names=("EQTransformer", "PhaseNet", "GPD"),
+                 width_px=PLOT_WIDTH_PX):
+    """
+    Líneas a dibujar de las trazas de una ventana y de las predicciones de cada modelo en ella.
+
+    Las trazas sísmicas se normalizan por su máximo absoluto y se desplazan verticalmente para no
+    solaparse; las trazas de probabilidad de ruido ("N") se omiten. Todas se reducen con
+    `trace_envelope`.
+
+    Args:
+        traces (list): `window_index.TraceWindow` de la señal en `[t0, t1]` (no vacía), normalmente
+            de `WindowIndex.window`.
+        predictions (dict): `TraceWindow` de las predicciones de cada modelo en la misma ventana
+            (`'eqt_preds'`, `'pn_preds'`, `'gpd_preds'`).
+        t0 (obspy.core.utcdatetime.UTCDateTime): Inicio de la ventana.
+        t1 (obspy.core.utcdatetime.UTCDateTime): Fin de la ventana.
+        color_dict (dict): Color de cada clase de fase (ej., {"P": "C0", "S": "C1"}).
+        model_names (tuple, optional): Modelos en el orden de los ejes.
+        width_px (int, optional): Ancho en píxeles de la imagen (menor en las imágenes reducidas).
+
+    Returns:
+        tuple: (`trace_lines`, `model_lines`): tuplas (x, y, etiqueta, color) de las trazas sísmicas
+            y, por cada modelo, lista de tuplas de sus probabilidades.
+    """
+    window_seconds = t1 - t0
+    model_lines = []
+    for model_name in model_names:
+        subpreds = predictions[_PREDICTION_KEYS[model_name]]
+        lines = []
+        if len(subpreds) > 0:
+            # Offset de tiempo para alinear las predicciones con la traza sísmica.
+            offset = seconds_between(subpreds[0].start_ns, traces[0].start_ns)
+            for pred_trace in subpreds:
+                try:
+                    # Extrae el modelo y la clase (P, S, N) del nombre del canal.
+                    pred_model, pred_class = pred_trace.channel.split("_")
+                except Exception:
+                    pred_model = pred_trace.channel
+                    pred_class = ""
+                if pred_class == "N":
+                    continue
+                x, y = trace_envelope(pred_trace, window_seconds, width_px)
+                lines.append((offset + x, y, pred_class, color_dict.get(pred_class, "C0")))
+        model_lines.append(lines)
+
+    trace_lines = []
+    for i, tr in enumerate(traces):
+        # El envolvente conserva el mínimo y el máximo de cada columna, así que su máximo
+        # absoluto es el de la traza completa.
+        x, y = trace_envelope(tr, window_seconds, width_px)
+        max_abs = np.max(np.abs(y))
+        norm_data = y / max_abs if max_abs > 0 else y
+        offset = (len(traces) - 1 - i) * TRACE_OFFSET_FACTOR
+        trace_lines.append((x, norm_data + offset, tr.channel, TRACE_COLORS[i % len(TRACE_COLORS)]))
+    return trace_lines, model_lines
+
+
+def create_time_formatter(t0_ref):
+    """
+    Crea y retorna una función de formateo personalizada para el eje X (tiempo) de los gráficos
+    de Matplotlib. Esta función es esencial para presentar los tiempos sísmicos de manera
+    legible y relativa a un punto de inicio específico (`t0_ref`), mostrando solo la hora,
+    minutos y segundos.
+
+    Args:
+        t0_ref (obspy.core.utcdatetime.UTCDateTime):
+            El tiempo de referencia UTC (punto de inicio) para el eje X del gráfico.
+            El formateador calculará el tiempo absoluto sumando el valor `x` (que
+            representa segundos desde el inicio del eje) a este tiempo de referencia.
+
+    Returns:
+        function: Una función (`time_formatter`) que toma dos argumentos (`x`, `pos`)
+                  y retorna una cadena de texto formateada como "HH:MM:SS".
+
+    Notas:
+        - **Cierre de Clousure:** La función `create_time_formatter` es una fábrica de funciones.
+          Retorna una función interna (`time_formatter`) que "cierra" sobre el valor de `t0_ref`.
+          Esto significa que `time_formatter` siempre tendrá acceso al `t0_ref` con el que fue creada,
+          incluso después de que `create_time_formatter` haya terminado su ejecución. Los cierres
+          no se pueden enviar a otro proceso, así que las descripciones de ventana llevan `t0` y
+          el formateador se crea en el proceso que dibuja.
+        - **Argumentos de `time_formatter` (`x`, `pos`):**
+            - `x`: Es el valor numérico de la posición del tick en el eje (generalmente en segundos
+              relativos al inicio del eje, o 0).
+            - `pos`: Es la posición de la marca, que a menudo no se usa para el formateo.
+        - **Conversión a `UTCDateTime`:** El valor `x` se suma a `t0_ref` para obtener un objeto
+          `UTCDateTime` que representa el tiempo absoluto en ese punto del eje.
+        - **Formato `"%H:%M:%S"`:** El método `strftime` del objeto `UTCDateTime` se utiliza para
+          formatear el tiempo como una cadena que muestra solo las horas, minutos y segundos.
+          Este formato es conciso y relevante para la mayoría de las visualizaciones de ventanas
+          sísmicas.
+    """
+    def time_formatter(x, pos):
+        """
+        Función interna que formatea un valor numérico de tiempo (en segundos relativos)
+        a una cadena de tiempo HH:MM:SS, usando t0_ref como punto de inicio.
+        """
+        # Convierte el valor 'x' (segundos desde el inicio del gráfico) a un objeto UTCDateTime.
+        time = t0_ref + x
+        # Formatea el objeto UTCDateTime a una cadena HH:MM:SS.
+        return time.strftime("%H:%M:%S")
+
+    # Retorna la función interna que será usada por Matplotlib.
+    return time_formatter
+
+
+def individual_window_spec(path, t0, title, window_seconds, trace_lines, model_lines,
+                           model_names=("EQTransformer", "PhaseNet", "GPD"), dpi=PLOT_DPI):
+    """Descripción (enviable a otro proceso) de la imagen individual de una ventana y una banda."""
+    return {'kind': 'individual', 'path': path, 't0': t0, 'title': title, 'window_seconds': window_seconds,
+            'model_names': tuple(model_names), 'trace_lines': trace_lines, 'model_lines': model_lines,
+            'dpi': dpi}
+
+
+def comparison_window_spec(path, t0, window_seconds, sections, model_names=("EQTransformer", "PhaseNet", "GPD"),
+                           dpi=PLOT_DPI):
+    """
+    Descripción (enviable a otro proceso) de la imagen comparativa de una ventana.
+
+    `sections` es una lista de tuplas (título, trace_lines, model_lines), una por señal
+    (original y cada banda filtrada), en el orden en que se apilan. Con un `dpi` menor que
+    `PLOT_DPI` la imagen es una versión reducida de la misma figura.
+    """
+    return {'kind': 'comparison', 'path': path, 't0': t0, 'title': 'comparison', 'window_seconds': window_seconds,
+            'model_names': tuple(model_names), 'sections': sections, 'dpi': dpi}
+
+
+def window_group_spec(panels, comparison_path=None):
+    """
+    Descripción de todas las imágenes de una ventana: los paneles individuales de cada banda
+    (`individual_window_spec`, en el orden en que se apilan) y, si se indica `comparison_path`, la
+    imagen comparativa compuesta apilando esos mismos paneles. Un panel con `'path'` None solo se
+    dibuja para la composición.
+    """
+    return {'kind': 'group', 'title': 'comparison', 'panels': panels, 'comparison_path': comparison_path}
+
+
+class IndividualWindowRenderer:
+    """
+    Figura reutilizable para los gráficos individuales de una banda: la señal normalizada arriba
+    y las probabilidades de cada modelo debajo, con la misma disposición que antes.
+    """
+
+    def __init__(self, title, window_seconds, model_names=("EQTransformer", "PhaseNet", "GPD"), dpi=PLOT_DPI):
+        """
+        Args:
+            title (str): Título de la figura (el tipo de filtro).
+            window_seconds (float): Duración de las ventanas en segundos (límite del eje X).
+            model_names (tuple, optional): Modelos de los ejes de predicciones, de arriba abajo.
+            dpi (int, optional): Resolución de los PNG. Por defecto 150.
+        """
+        self.window_seconds = window_seconds
+        self.model_names = model_names
+        self.dpi = dpi
+        self.fig = Figure(figsize=(15, 7), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.axs = self.fig.subplots(len(model_names) + 1, 1, sharex=True,
+                                     gridspec_kw={'hspace': 0.05, 'height_ratios': [2] + [1] * len(model_names)})
+        self.fig.suptitle(f"{title}", fontsize=14, fontweight='bold')
+        self.axs[0].set_ylabel("Amplitud\nNormalizada")
+        for ax, model_name in zip(self.axs[1:], model_names):
+            ax.set_ylabel(model_name)
+        self.axs[-1].set_xlabel("Tiempo (HH:MM:SS)")
+        self._lines = [[] for _ in self.axs]
+
+    def _set_lines(self, ax_index, lines):
+        """Asigna los datos de las líneas de un eje, creando las que falten y ocultando las sobrantes."""
+        ax = self.axs[ax_index]
+        pool = self._lines[ax_index]
+        while len(pool) < len(lines):
+            line, = ax.plot([], [])
+            pool.append(line)
+        for line, (x, y, label, color) in zip(pool, lines):
+            line.set_data(x, y)
+            line.set_label(label)
+            line.set_color(color)
+            line.set_visible(True)
+        for line in pool[len(lines):]:
+            line.set_data([], [])
+            line.set_label(_HIDDEN_LABEL)
+            line.set_visible(False)
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
+        if lines:
+            ax.legend(loc="upper right")
+
+    def draw(self, formatter, trace_lines, model_lines):
+        """
+        Dibuja una ventana y devuelve la imagen.
+
+        Args:
+            formatter (callable): Formateador `(x, pos)` de los ticks del eje X (ver `create_time_formatter`).
+            trace_lines (list): Tuplas (x, y, etiqueta, color) de las trazas sísmicas, ya normalizadas
+                y desplazadas.
+            model_lines (list): Por cada modelo (en el orden de `model_names`), lista de tuplas
+                (x, y, etiqueta, color) de sus probabilidades.
+
+        Returns:
+            numpy.ndarray: Imagen RGBA (alto × ancho × 4, uint8), independiente de la figura.
+        """
+        self._set_lines(0, trace_lines)
+        for i, lines in enumerate(model_lines):
+            self._set_lines(i + 1, lines)
+            self.axs[i + 1].set_ylim(0, 1.1)
+
+        self.axs[0].set_ylim(-1, len(trace_lines) * TRACE_OFFSET_FACTOR)
+        self.axs[0].set_xlim(0, self.window_seconds)
+        for ax in self.axs:
+            ax.xaxis.set_major_formatter(FuncFormatter(formatter))
+
+        self.canvas.draw()
+        return np.array(self.canvas.buffer_rgba())
+
+    def close(self):
+        """Libera la figura."""
+        self.fig.clear()
+        self.fig = None
+        self.canvas = None
+        self.axs = None
+        self._lines = None
+
+
+def draw_comparison(spec, dpi=PLOT_DPI):
+    """
+    Dibuja una imagen comparativa: por cada señal, la traza sísmica y las probabilidades de cada
+    modelo en filas consecutivas que comparten el eje X.
+
+    Args:
+        spec (dict): Descripción de `comparison_window_spec`.
+        dpi (int, optional): Resolución del PNG.
+
+    Returns:
+        numpy.ndarray: Imagen RGBA (alto × ancho × 4, uint8).
+    """
+    sections = spec['sections']
+    model_names = spec['model_names']
+    rows_per_section = len(model_names) + 1
+    # El ajuste (`tight_layout`) se calcula a la resolución por defecto de la figura y se dibuja
+    # a `dpi`, igual que `plt.savefig(..., dpi=150)`.
+    fig = Figure(figsize=(15, len(sections) * 6))
+    canvas = FigureCanvasAgg(fig)
+    axs = fig.subplots(len(sections) * rows_per_section, 1, sharex=True, gridspec_kw={'hspace': 0.05})
+
+    for section_index, (title, trace_lines, model_lines) in enumerate(sections):
+        row = section_index * rows_per_section
+        axs[row].set_title(title, fontsize=12, fontweight='bold')
+        for x, y, label, color in trace_lines:
+            axs[row].plot(x, y, color=color, label=label)
+        axs[row].set_ylim(-1, len(trace_lines) * TRACE_OFFSET_FACTOR)
+        axs[row].set_xlim(0, spec['window_seconds'])
+        axs[row].set_ylabel("Amplitud\nNormalizada")
+        axs[row].legend(loc="upper right")
+        for i, (model_name, lines) in enumerate(zip(model_names, model_lines)):
+            current_ax = axs[row + i + 1]
+            for x, y, label, color in lines:
+                current_ax.plot(x, y, label=label, color=color)
+            current_ax.set_ylabel(model_name)
+            if lines:
+                current_ax.legend(loc="upper right")
+            current_ax.set_ylim(0, 1.1)
+
+    formatter = create_time_formatter(spec['t0'])
+    for ax in axs:
+        ax.xaxis.set_major_formatter(FuncFormatter(formatter))
+    axs[-1].set_xlabel("Tiempo (HH:MM:SS)")
+    fig.tight_layout()
+
+    fig.set_dpi(dpi)
+    canvas.draw()
+    image = np.array(canvas.buffer_rgba())
+    fig.clear()
+    return image
+
+
+def save_png(path, image, dpi=PLOT_DPI):
+    """Codifica y guarda una imagen RGBA como PNG (los mismos bytes que `savefig`)."""
+    matplotlib.image.imsave(path, memoryview(image), format="png", origin="upper", dpi=dpi)
+
+
+def save_thumbnail(source_path, output_path, width_px=THUMBNAIL_WIDTH_PX):
+    """
+    Guarda una miniatura de una imagen de ventana, con el mismo aspecto y `width_px` de ancho.
+
+    Args:
+        source_path (str): Ruta del PNG de la ventana.
+        output_path (str): Ruta de la miniatura (se escribe en `THUMBNAIL_FORMAT`).
+        width_px (int, optional): Ancho de la miniatura. Las imágenes más estrechas no se amplían.
+    """
+    with Image.open(source_path) as image:
+        # Las figuras tienen fondo blanco opaco: el canal alfa no aporta nada a la miniatura.
+        image = image.convert("RGB")
+        if image.width > width_px:
+            height_px = max(1, round(image.height * width_px / image.width))
+            image = image.resize((width_px, height_px), Image.LANCZOS, reducing_gap=2.0)
+        image.save(output_path, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+
+
+def _draw(spec, renderers):
+    """Dibuja una ventana, reutilizando la figura individual de su banda si está en `renderers`."""
+    dpi = spec.get('dpi', PLOT_DPI)
+    if spec['kind'] != 'individual':
+        return draw_comparison(spec, dpi)
+    key = (spec['title'], spec['window_seconds'], spec['model_names'], dpi)
+    renderer = renderers.get(key)
+    if renderer is None:
+        if len(renderers) >= _MAX_RENDERERS:
+            for old in renderers.values():
+                old.close()
+            renderers.clear()
+        renderer = renderers[key] = IndividualWindowRenderer(spec['title'], spec['window_seconds'],
+                                                             spec['model_names'], dpi)
+    return renderer.draw(create_time_formatter(spec['t0']), spec['trace_lines'], spec['model_lines'])
+
+
+def _stats_title(spec):
+    dpi = spec.get('dpi', PLOT_DPI)
+    return spec['title'] if dpi == PLOT_DPI else f"{spec['title']} ({dpi} dpi)"
+
+
+def _render_images(spec, renderers):
+    """
+    Dibuja las imágenes de una descripción y las entrega una a una como (título, segundos de dibujo,
+    ruta, imagen, dpi). En un grupo, la comparativa se compone apilando los paneles ya dibujados
+    (todos tienen el mismo ancho), sin volver a dibujar ninguna señal.
+    """
+    if spec['kind'] != 'group':
+        start = time.perf_counter()
+        image = _draw(spec, renderers)
+        yield _stats_title(spec), time.perf_counter() - start, spec['path'], image, spec.get('dpi', PLOT_DPI)
+        return
+
+    images = []
+    for panel in spec['panels']:
+        start = time.perf_counter()
+        image = _draw(panel, renderers)
+        seconds = time.perf_counter() - start
+        if spec['comparison_path'] is not None:
+            images.append(image)
+        if panel['path'] is not None:
+            yield _stats_title(panel), seconds, panel['path'], image, panel.get('dpi', PLOT_DPI)
+        del image
+    if images:
+        start = time.perf_counter()
+        composite = np.concatenate(images, axis=0)
+        del images
+        dpi = spec['panels'][0].get('dpi', PLOT_DPI)
+        yield (_stats_title({'title': spec['title'], 'dpi': dpi}), time.perf_counter() - start,
+               spec['comparison_path'], composite, dpi)
+
+
+def render_window(spec):
+    """
+    Dibuja y guarda una sola ventana en el hilo actual, sin lotes ni procesos (imágenes pedidas
+    bajo demanda).
+    """
+    renderers = {}
+    try:
+        for _, _, path, image, dpi in _render_images(spec, renderers):
+            save_png(path, image, dpi)
+    finally:
+        for renderer in renderers.values():
+            renderer.close()
+
+
+def render_batch(specs, renderers, encoder):
+    """
+    Dibuja y guarda un lote de ventanas, codificando cada PNG en `encoder` mientras se dibuja la
+    siguiente.
+
+    Args:
+        specs (list): Descripciones de ventana (`individual_window_spec`, `comparison_window_spec`,
+            `window_group_spec`).
+        renderers (dict): Figuras individuales reutilizables por (título, duración, modelos, dpi).
+        encoder (concurrent.futures.ThreadPoolExecutor): Hilo de codificación.
+
+    Returns:
+        list: Tuplas (título, segundos de dibujo) de cada imagen. Las imágenes reducidas se cuentan
+            aparte, con su resolución en el título; las comparativas compuestas cuentan solo el
+            tiempo de apilar los paneles.
+    """
+    stats = []
+    pending = []
+    try:
+        for spec in specs:
+            for title, seconds, path, image, dpi in _render_images(spec, renderers):
+                stats.append((title, seconds))
+                while len(pending) >= _MAX_PENDING_ENCODES:
+                    pending.pop(0).result()
+                pending.append(encoder.submit(save_png, path, image, dpi))
+                del image
+    finally:
+        # El lote termina cuando sus PNG están escritos.
+        for future in pending:
+            future.result()
+    return stats
+
+
+# Estado de cada proceso de renderizado: figuras reutilizables e hilo de codificación.
+_worker_renderers = {}
+_worker_encoder = None
+
+
+def _reset_worker_state():
+    global _worker_encoder
+    # El hilo de codificación y las figuras del proceso padre no existen en el hijo tras `fork`
+    # (los procesos del pool se crean con `fork` desde el servidor de `forkserver`).
+    _worker_renderers.clear()
+    _worker_encoder = None
+
+
+os.register_at_fork(after_in_child=_reset_worker_state)
+
+
+def _render_batch_in_worker(specs):
+    global _worker_encoder
+    if _worker_encoder is None:
+        _worker_encoder = ThreadPoolExecutor(max_workers=1)
+    return render_batch(specs, _worker_renderers, _worker_encoder)
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    """Pool de procesos compartido (por número de procesos) entre trabajos y archivos."""
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            # `forkserver`: el pool se crea desde hilos de trabajos, con los hilos de Flask y de torch
+            # en marcha, y un `fork` desde ahí copiaría cerrojos tomados por otros hilos. Los procesos
+            # salen de un servidor de un solo hilo que importa el programa principal y este módulo
+            # una vez; solo necesitan estas importaciones y reciben datos ya reducidos.
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["__main__", __name__])
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _executors[workers] = executor
+        return executor
+
+
+class RenderPool:
+    """
+    Reparte el dibujo de ventanas en lotes entre procesos y acumula el tiempo de dibujo por título
+    (banda o "comparison").
+
+    Uso: `add(spec)` por cada ventana y `finish()` al final, que espera a que todos los PNG estén
+    escritos. Como mucho hay `2 × workers` lotes en vuelo, así que la memoria de las ventanas
+    pendientes está acotada aunque el archivo tenga miles de ventanas.
+    """
+
+    def __init__(self, workers=None, batch_windows=RENDER_BATCH_WINDOWS):
+        """
+        Args:
+            workers (int, optional): Procesos de renderizado. Por defecto uno por núcleo; con 1 se
+                dibuja en el proceso actual.
+            batch_windows (int, optional): Ventanas por lote.
+        """
+        self.workers = RENDER_WORKERS if workers is None else max(1, workers)
+        self.batch_windows = batch_windows
+        self.stats = {}
+        self.wall_seconds = 0.0
+        self._batch = []
+        self._futures = []
+        self._renderers = {}
+        self._encoder = None
+        self._start = time.perf_counter()
+
+    def _record(self, stats):
+        for title, seconds in stats:
+            entry = self.stats.setdefault(title, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def _flush(self):
+        if not self._batch:
+            return
+        specs, self._batch = self._batch, []
+        if self.workers == 1:
+            if self._encoder is None:
+                self._encoder = ThreadPoolExecutor(max_workers=1)
+            self._record(render_batch(specs, self._renderers, self._encoder))
+            return
+        while len(self._futures) >= 2 * self.workers:
+            done, _ = wait(self._futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._futures.remove(future)
+                self._record(future.result())
+        self._futures.append(_get_executor(self.workers).submit(_render_batch_in_worker, specs))
+
+    def add(self, spec):
+        """Añade una ventana; se envía a dibujar cuando se completa su lote."""
+        self._batch.append(spec)
+        if len(self._batch) >= self.batch_windows:
+            self._flush()
+
+    def finish(self):
+        """
+        Dibuja las ventanas pendientes y espera a que todos los PNG estén escritos.
+
+        Returns:
+            dict: {título: [ventanas, segundos de dibujo]}. El tiempo total queda en `wall_seconds`.
+        """
+        try:
+            self._flush()
+            for future in self._futures:
+                self._record(future.result())
+        finally:
+            self._futures = []
+            for renderer in self._renderers.values():
+                renderer.close()
+            self._renderers = {}
+            if self._encoder is not None:
+                self._encoder.shutdown(wait=True)
+                self._encoder = None
+            self.wall_seconds = time.perf_counter() - self._start
+        return self.stats
@@ -0,0 +1,145 @@
+import os
+import time
+import zipfile
+from checkpoint import CHECKPOINT_DATA_FOLDER
+
+"""
+Generación de archivos ZIP en streaming para la descarga de resultados.
+
+La descarga escribía primero un ZIP completo (`ZIP_DEFLATED`) en disco y solo después lo enviaba:
+el cliente esperaba a que terminara la compresión, los PNG (ya comprimidos) se volvían a comprimir
+sin ganar nada y se necesitaba el doble de espacio en disco. Aquí el ZIP se construye mientras se
+envía: `zipfile` escribe sobre un búfer no posicionable (sin `seek`/`tell`), por lo que usa
+descriptores de datos tras cada entrada, y el generador entrega lo acumulado a medida que se
+leen los archivos. No se crean archivos temporales, así que varias descargas simultáneas no
+compiten por disco.
+"""
+
+# Subconjuntos de resultados que se pueden descargar.
+ZIP_CONTENTS = ("all", "csv", "images", "comparison")
+# Extensiones de las tablas de resultados (CSV y, si se generaron, Parquet/Arrow).
+TABLE_EXTENSIONS = (".csv", ".parquet", ".arrow")
+# Formatos ya comprimidos (o casi incompresibles) que se guardan sin comprimir.
+STORED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".npy", ".parquet", ".zip", ".gz")
+# Tamaño de los bloques leídos de cada archivo.
+CHUNK_SIZE = 1024 * 1024
+
+
+class _StreamBuffer:
+    """Destino no posicionable para `zipfile`: acumula lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def select_result_files(results_folder, contents="all", band=None, file=None):
+    """
+    Lista los archivos de resultados de un trabajo que entran en la descarga.
+
+    Args:
+        results_folder (str): Carpeta de resultados del trabajo.
+        contents (str, optional): "all" (todo), "csv" (tablas de picks, detecciones y resúmenes),
+            "images" (todos los PNG) o "comparison" (solo los gráficos comparativos). Por defecto "all".
+        band (str, optional): Restringe a una banda ("original", "0.5-2Hz", ...): sus tablas, sus
+            imágenes y sus anotaciones. Los gráficos comparativos combinan todas las bandas y se
+            excluyen. Los resúmenes del trabajo se incluyen siempre.
+        file (str, optional): Restringe a los resultados de un archivo (nombre base del MSEED).
+
+    Returns:
+        list: Tuplas (ruta, nombre dentro del ZIP) ordenadas.
+
+    Raises:
+        ValueError: Si `contents` no es válido.
+        FileNotFoundError: Si `file` no corresponde a ningún archivo del trabajo.
+    """
+    if contents not in ZIP_CONTENTS:
+        raise ValueError(f"Contenido no válido: {contents} (opciones: {', '.join(ZIP_CONTENTS)})")
+
+    root_folder = results_folder
+    if file is not None:
+        root_folder = os.path.join(results_folder, file)
+        if os.path.dirname(os.path.normpath(file)) or not os.path.isdir(root_folder):
+            raise FileNotFoundError(f"El trabajo no tiene resultados del archivo {file}")
+
+    entries = []
+    for root, dirs, files in os.walk(root_folder):
+        # Predicciones intermedias del checkpoint: no forman parte de los resultados.
+        dirs[:] = sorted(d for d in dirs if d != CHECKPOINT_DATA_FOLDER)
+        rel_dir = os.path.relpath(root, results_folder)
+        parts = [] if rel_dir == "." else rel_dir.split(os.sep)
+        job_level = not parts
+        for name in sorted(files):
+            if name.endswith(".tmp"):
+                continue
+            extension = os.path.splitext(name)[1].lower()
+            is_comparison = "comparison" in parts
+            if contents == "csv" and extension not in TABLE_EXTENSIONS:
+                continue
+            if contents == "images" and extension != ".png":
+                continue
+            if contents == "comparison" and not (extension == ".png" and is_comparison):
+                continue
+            if band is not None and not job_level:
+                in_band = band in parts or f"_{band}_" in name
+                if not in_band or is_comparison:
+                    continue
+            entries.append((os.path.join(root, name), os.path.join(*parts, name) if parts else name))
+    return entries
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    """
+    Genera un ZIP por partes con los archivos indicados.
+
+    Los PNG y demás formatos comprimidos se guardan (`ZIP_STORED`); el resto se comprime con
+    `ZIP_DEFLATED`. Los archivos que desaparecen durante la descarga se omiten.
+
+    Args:
+        entries (list): Tuplas (ruta, nombre dentro del ZIP), como las de `select_result_files`.
+        chunk_size (int, optional): Tamaño de lectura de cada archivo.
+
+    Yields:
+        bytes: Fragmentos consecutivos del archivo ZIP.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for path, arcname in entries:
+            try:
+                stat = os.stat(path)
+                source = open(path, 'rb')
+            except OSError:
+                continue
+            with source:
+                info = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+                info.external_attr = 0o644 << 16
+                info.file_size = stat.st_size
+                stored = os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+                info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                with zipf.open(info, 'w') as dest:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = buffer.take()
+                        if data:
+                            yield data
+            data = buffer.take()
+            if data:
+                yield data
+    # Directorio central del ZIP.
+    data = buffer.take()
+    if data:
+        yield data